@@ -1,6 +1,205 @@
 import { NextResponse } from "next/server"
-import { spawn } from 'child_process'
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process'
+import readline from 'readline'
 import path from 'path'
+import { bucket, queryInflux } from "@/lib/database"
+
+// 상주 Python 예측 워커 (모델/InfluxDB 연결을 한 번만 로드)
+type PendingRequest = {
+  resolve: (value: any) => void
+  reject: (reason: Error) => void
+}
+
+type SohWorker = {
+  process: ChildProcessWithoutNullStreams
+  pending: Map<number, PendingRequest>
+  nextId: number
+}
+
+// 예측 구간 계산 방식 (상주 워커와 사전 계산 예측이 같은 방식이어야 함)
+const intervalMode = process.env.SOH_INTERVAL_MODE || 'full'
+
+// 요청별 응답 대기 시간 (넘으면 요청을 실패 처리하고 pending에서 제거)
+const requestTimeoutMs = Number(process.env.SOH_PREDICT_TIMEOUT_MS) || 120000
+
+// dev 모드 HMR에서도 워커가 중복 생성되지 않도록 globalThis에 보관
+const globalForSohWorker = globalThis as unknown as { sohWorker?: SohWorker }
+
+function getSohWorker(): SohWorker {
+  if (globalForSohWorker.sohWorker) return globalForSohWorker.sohWorker
+
+  const pythonScript = path.join(process.cwd(), 'models', 'soh_prophet_predict.py')
+  const workers = process.env.SOH_PREDICT_WORKERS || '4'
+  const child = spawn('python3', [
+    pythonScript, '--serve', '--workers', workers, '--interval-mode', intervalMode
+  ])
+
+  const worker: SohWorker = { process: child, pending: new Map(), nextId: 1 }
+  let stderr = ''
+
+  readline.createInterface({ input: child.stdout }).on('line', (line) => {
+    let message: any
+    try {
+      message = JSON.parse(line)
+    } catch {
+      return
+    }
+
+    const pending = worker.pending.get(message.id)
+    if (!pending) return
+    worker.pending.delete(message.id)
+
+    if (message.error) pending.reject(new Error(message.error))
+    else pending.resolve(message.data)
+  })
+
+  child.stderr.on('data', (data) => {
+    stderr = (stderr + data.toString()).slice(-4000)
+  })
+
+  const shutdown = (reason: string) => {
+    if (globalForSohWorker.sohWorker === worker) globalForSohWorker.sohWorker = undefined
+    for (const pending of worker.pending.values()) {
+      pending.reject(new Error(`${reason}: ${stderr}`))
+    }
+    worker.pending.clear()
+  }
+
+  child.on('error', (error) => shutdown(`SOH worker error ${error.message}`))
+  // 워커가 종료된 뒤 쓰면 EPIPE가 stdin 'error'로 오므로 처리하지 않으면 서버 프로세스가 종료됨
+  child.stdin.on('error', (error) => shutdown(`SOH worker stdin error ${error.message}`))
+  child.on('close', (code) => shutdown(`SOH worker exited with code ${code}`))
+
+  globalForSohWorker.sohWorker = worker
+  return worker
+}
+
+function requestSohPrediction(deviceNo: string, startDate: string, endDate: string): Promise<any> {
+  const worker = getSohWorker()
+  const id = worker.nextId++
+
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      if (worker.pending.delete(id)) {
+        reject(new Error(`SOH worker timed out after ${requestTimeoutMs}ms`))
+      }
+    }, requestTimeoutMs)
+
+    worker.pending.set(id, {
+      resolve: (value) => {
+        clearTimeout(timer)
+        resolve(value)
+      },
+      reject: (reason) => {
+        clearTimeout(timer)
+        reject(reason)
+      }
+    })
+    worker.process.stdin.write(
+      JSON.stringify({ id, device_no: deviceNo, start_date: startDate, end_date: endDate }) + '\n'
+    )
+  })
+}
+
+// 배치 모드(soh_prophet_predict.py --batch)로 미리 계산된 예측 조회
+// (현재 구간 계산 방식으로, 마지막 SOH 데이터 이후에 생성된 경우만 사용하고 아니면 null -> 상주 워커)
+async function getPrecomputedForecast(deviceNo: string, startDate: string, endDate: string) {
+  const days = Math.round((new Date(endDate).getTime() - new Date(startDate).getTime()) / 86400000)
+  if (!(days > 0)) return null
+
+  const summaryQuery = `
+    from(bucket: "${bucket}")
+      |> range(start: 0)
+      |> filter(fn: (r) => r._measurement == "soh_forecast_summary")
+      |> filter(fn: (r) => r.device_no == "${deviceNo}")
+      |> last()
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> group()
+      |> sort(columns: ["_time"], desc: true)
+  `
+  // 차량의 마지막 SOH 데이터 시각 (soh_prophet_predict.py get_last_soh_time 과 같은 조회)
+  const lastSohQuery = `
+    from(bucket: "${bucket}")
+      |> range(start: 2022-01-01T00:00:00Z, stop: 2024-01-01T00:00:00Z)
+      |> filter(fn: (r) => r._measurement == "aicar_bms")
+      |> filter(fn: (r) => r.device_no == "${deviceNo}")
+      |> filter(fn: (r) => r._field == "soh")
+      |> filter(fn: (r) => exists r._value)
+      |> group()
+      |> last()
+  `
+  const [summaries, lastSoh] = (await Promise.all([
+    queryInflux(summaryQuery),
+    queryInflux(lastSohQuery)
+  ])) as any[][]
+  // 필드별 last()라 이전 실행에만 있는 필드는 별도 행이 되므로 가장 최근 실행 행만 사용
+  const summary = summaries[0]
+  if (!summary || Number(summary.prediction_days) < days) return null
+
+  // 다른 구간 계산 방식으로 만든 예측이나, 생성 이후 SOH 데이터가 더 들어온 예측은 사용하지 않음
+  // (generated_at / interval_mode 가 없는 이전 형식 요약도 제외)
+  if (summary.interval_mode !== intervalMode || !summary.generated_at) return null
+  const generatedAt = new Date(summary.generated_at).getTime()
+  if (!(generatedAt > 0)) return null
+  if (lastSoh[0] && new Date(lastSoh[0]._time).getTime() > generatedAt) return null
+
+  const forecastStart = new Date(`${summary.forecast_start}T00:00:00Z`)
+  const forecastStop = new Date(forecastStart.getTime() + days * 86400000)
+  const forecastQuery = `
+    from(bucket: "${bucket}")
+      |> range(start: ${forecastStart.toISOString()}, stop: ${forecastStop.toISOString()})
+      |> filter(fn: (r) => r._measurement == "soh_forecast")
+      |> filter(fn: (r) => r.device_no == "${deviceNo}")
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> sort(columns: ["_time"])
+  `
+  const rows = (await queryInflux(forecastQuery)) as any[]
+  if (rows.length < days) return null
+
+  const predictions = rows.map((row) => ({
+    date: String(row._time).slice(0, 10),
+    predicted_soh: Number(row.predicted_soh),
+    lower_bound: Number(row.lower_bound),
+    upper_bound: Number(row.upper_bound),
+    days_from_now: Number(row.days_from_now)
+  }))
+
+  // 권장사항 (soh_prophet_predict.py 와 동일한 기준)
+  const finalPredictedSoh = predictions[predictions.length - 1].predicted_soh
+  let message = "현재 배터리 상태는 양호합니다. 정기 점검을 유지하세요."
+  let priority = "low"
+  if (finalPredictedSoh < 70) {
+    message = "배터리 교체가 필요할 것으로 예상됩니다. 정비 센터 방문을 권장합니다."
+    priority = "high"
+  } else if (finalPredictedSoh < 80) {
+    message = "배터리 성능 저하가 예상됩니다. 정기 점검을 권장합니다."
+    priority = "medium"
+  }
+
+  // 요약에 없는 필드(구간을 계산할 수 없는 쪽)는 soh_prophet_predict.py 와 같이 null
+  const optionalNumber = (value: any) => (value === undefined || value === null ? null : Number(value))
+
+  return {
+    device_no: deviceNo,
+    current_soh: Number(summary.current_soh),
+    prediction_days: days,
+    predictions,
+    degradation_rate: Number(summary.degradation_rate),
+    degradation_rate_interval: [
+      optionalNumber(summary.degradation_rate_lower),
+      optionalNumber(summary.degradation_rate_upper)
+    ],
+    prediction_model: summary.prediction_model,
+    trend_rmse: Number(summary.trend_rmse),
+    prediction_confidence: Number(summary.prediction_confidence),
+    recommendation: {
+      message,
+      priority,
+      predicted_soh_after_30_days: finalPredictedSoh
+    },
+    historical_data_points: Number(summary.historical_data_points)
+  }
+}
 
 export async function GET(request: Request) {
   try {
@@ -16,35 +215,16 @@ export async function GET(request: Request) {
       )
     }
 
-    // Python 스크립트 실행하여 Prophet 모델로 예측
-    const pythonScript = path.join(process.cwd(), 'models', 'soh_prophet_predict.py')
-    
-    const pythonProcess = spawn('python3', [pythonScript, deviceNo, startDate, endDate])
-    
-    let stdout = ''
-    let stderr = ''
-    
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString()
-    })
-    
-    pythonProcess.stderr.on('data', (data) => {
-      stderr += data.toString()
-    })
-    
-    // Python 프로세스 완료 대기
-    await new Promise((resolve, reject) => {
-      pythonProcess.on('close', (code) => {
-        if (code === 0) {
-          resolve(stdout)
-        } else {
-          reject(new Error(`Python script failed with code ${code}: ${stderr}`))
-        }
-      })
-    })
-    
-    // JSON 결과 파싱
-    const result = JSON.parse(stdout)
+    // 미리 계산된 배치 예측이 있으면 사용, 없으면 상주 Python 워커에 예측 요청
+    let result = null
+    try {
+      result = await getPrecomputedForecast(deviceNo, startDate, endDate)
+    } catch (error) {
+      console.error('사전 계산 SOH 예측 조회 오류:', error)
+    }
+    if (!result) {
+      result = await requestSohPrediction(deviceNo, startDate, endDate)
+    }
     
     return NextResponse.json({
       success: true,
@@ -6,71 +6,150 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-import pickle
 import os
-from datetime import datetime
+import sys
+import io
+import time
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import model_registry
+import influx_loader
 import warnings
 warnings.filterwarnings('ignore')
 
-def load_and_prepare_data():
-    """InfluxDB에서 에너지 소비 데이터를 로드하고 XGBoost 형식으로 변환"""
-    print("InfluxDB에서 에너지 소비 데이터 로드 중...")
-    
-    # InfluxDB 연결 설정
-    from influxdb_client import InfluxDBClient, Point
-    from influxdb_client.client.write_api import SYNCHRONOUS
+MODEL_NAME = 'energy_xgboost'
+TRIP_MODEL_NAME = 'energy_trip_xgboost'
+CAR_TYPE_MODEL_NAME = 'energy_xgboost_car_type'
+
+FEATURE_COLUMNS = [
+    'soc', 'soh', 'pack_volt', 'pack_current', 'mod_avg_temp', 'odometer',
+    'hour', 'day_of_week', 'month', 'season', 'car_type_encoded'
+]
+TARGET_COLUMN = 'instant_power_kw'
+
+# 차종 인코딩 (car_type_encoded)
+CAR_TYPE_CODES = {
+    'BONGO3': 0,
+    'GV60': 1,
+    'PORTER2': 2
+}
+
+# 차종별 모델 특성 (모델 안에서 차종이 고정이므로 car_type_encoded 제외)
+CAR_TYPE_FEATURE_COLUMNS = [col for col in FEATURE_COLUMNS if col != 'car_type_encoded']
+
+# 차종별 모델은 한 차종 분포만 학습하므로 얕은 트리 사용
+CAR_TYPE_PARAMS = {'max_depth': 4}
+
+# 청크 학습 시 외부 메모리 캐시 위치 (--external-memory)
+EXTERNAL_MEMORY_CACHE_DIR = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/xgb_cache'
+
+# 학습에 사용하는 BMS 필드
+ENERGY_FIELDS = ['soc', 'soh', 'pack_volt', 'pack_current', 'mod_avg_temp', 'odometer']
+
+def get_influx_client():
+    """InfluxDB 클라이언트 생성"""
+    from influxdb_client import InfluxDBClient
     
     # InfluxDB 설정
     url = "http://localhost:8087"
     token = "aicar123"
     org = "keti"
-    bucket = "aicar-bucket"
     
-    client = InfluxDBClient(url=url, token=token, org=org)
-    query_api = client.get_query_api()
+    return InfluxDBClient(url=url, token=token, org=org)
+
+def _energy_base_query(start, stop):
+    bucket = "aicar-bucket"
+    field_filter = " or ".join(f'r._field == "{field}"' for field in ENERGY_FIELDS)
     
-    # 에너지 소비 관련 데이터 쿼리
-    query = f'''
+    return f'''
     from(bucket: "{bucket}")
-      |> range(start: 2022-01-01T00:00:00Z, stop: 2024-01-01T00:00:00Z)
+      |> range(start: {start}, stop: {stop})
       |> filter(fn: (r) => r._measurement == "aicar_bms")
-      |> filter(fn: (r) => r._field == "soc" or r._field == "soh" or r._field == "pack_volt" or r._field == "pack_current" or r._field == "mod_avg_temp" or r._field == "odometer")
+      |> filter(fn: (r) => {field_filter})
       |> filter(fn: (r) => exists r._value)
-      |> sort(columns: ["_time"])
+      |> keep(columns: ["_time", "_value", "_field", "device_no", "car_type"])
+    '''
+
+def fetch_energy_frame(client, start='2022-01-01T00:00:00Z', stop='2024-01-01T00:00:00Z'):
+    """BMS 필드를 Flux에서 컬럼으로 pivot해 (time, device_no, car_type, 필드...) 형태로 조회
+    
+    같은 차량/시각에 같은 필드 값이 여러 개면 Flux pivot은 마지막 값을 사용한다.
+    """
+    query = _energy_base_query(start, stop) + '''
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> group()
     '''
     
-    # 데이터 조회
-    result = query_api.query(query)
-    
-    # 데이터 변환
-    data_points = []
-    for table in result:
-        for record in table.records:
-            data_points.append({
-                'time': record.get_time(),
-                'field': record.get_field(),
-                'value': float(record.get_value()),
-                'device_no': record.values.get('device_no'),
-                'car_type': record.values.get('car_type')
-            })
-    
-    if not data_points:
-        print("에너지 소비 데이터를 찾을 수 없습니다.")
+    df = influx_loader.query_frame(
+        client, query,
+        tag_columns=('device_no', 'car_type'),
+        value_columns=tuple(ENERGY_FIELDS)
+    )
+    if df is None:
         return None
     
-    # DataFrame으로 변환
-    df = pd.DataFrame(data_points)
+    return df.rename(columns={'_time': 'time'})[['time', 'device_no', 'car_type', *ENERGY_FIELDS]]
+
+def fetch_energy_frame_pandas(client, start='2022-01-01T00:00:00Z', stop='2024-01-01T00:00:00Z'):
+    """원본(long) 형식으로 조회 후 pandas pivot_table로 변환 (Flux pivot 검증용)"""
+    df = influx_loader.query_frame(
+        client, _energy_base_query(start, stop), tag_columns=('_field', 'device_no', 'car_type')
+    )
+    if df is None:
+        return None
+    
+    df = df.rename(columns={'_time': 'time', '_field': 'field', '_value': 'value'})
     
     # 피벗 테이블로 변환 (시간별로 각 필드값을 컬럼으로)
     df_pivot = df.pivot_table(
         index=['time', 'device_no', 'car_type'], 
         columns='field', 
         values='value', 
-        aggfunc='mean'
+        aggfunc='mean',
+        observed=True
     ).reset_index()
     
     # 컬럼명 정리
     df_pivot.columns.name = None
+    return df_pivot[['time', 'device_no', 'car_type', *ENERGY_FIELDS]]
+
+def load_and_prepare_data(pandas_pivot=False, compact=False):
+    """InfluxDB에서 에너지 소비 데이터를 로드하고 XGBoost 형식으로 변환
+    
+    pandas_pivot: True면 Flux pivot 대신 원본을 받아 pandas로 pivot (검증용)
+    compact: True면 메모리 절약 형식으로 특성 생성 (add_energy_features 참고)
+    """
+    print("InfluxDB에서 에너지 소비 데이터 로드 중...")
+    
+    client = get_influx_client()
+    try:
+        if pandas_pivot:
+            df_pivot = fetch_energy_frame_pandas(client)
+        else:
+            df_pivot = fetch_energy_frame(client)
+    finally:
+        client.close()
+    
+    if df_pivot is None:
+        print("에너지 소비 데이터를 찾을 수 없습니다.")
+        return None
+    
+    df_pivot = add_energy_features(df_pivot, compact)
+    
+    print(f"데이터 준비 완료: {len(df_pivot)}개 데이터 포인트")
+    print(f"전력 범위: {df_pivot['instant_power_kw'].min():.3f}kW ~ {df_pivot['instant_power_kw'].max():.3f}kW")
+    
+    return df_pivot
+
+def add_energy_features(df_pivot, compact=False):
+    """pivot된 BMS 데이터에 전력/시간대/차종 특성 추가 후 결측 행 제거
+    
+    compact: True면 측정값 float32, 태그 category, 달력 특성 int8로 만들고
+             중간 컬럼(instant_power_w) 없이 같은 배열에서 바로 계산한다.
+    """
+    if compact:
+        return _add_energy_features_compact(df_pivot)
     
     # 에너지 소비량 계산 (kWh)
     # 에너지 = 전압 * 전류 * 시간 (여기서는 순간 전력으로 근사)
@@ -90,47 +169,121 @@ def load_and_prepare_data():
     })
     
     # 차종별 인코딩
-    df_pivot['car_type_encoded'] = df_pivot['car_type'].map({
-        'BONGO3': 0,
-        'GV60': 1,
-        'PORTER2': 2
-    })
+    df_pivot['car_type_encoded'] = df_pivot['car_type'].map(CAR_TYPE_CODES).astype('float64')
     
     # 결측값 처리
-    df_pivot = df_pivot.dropna()
-    
-    print(f"데이터 준비 완료: {len(df_pivot)}개 데이터 포인트")
-    print(f"전력 범위: {df_pivot['instant_power_kw'].min():.3f}kW ~ {df_pivot['instant_power_kw'].max():.3f}kW")
-    
-    client.close()
+    return df_pivot.dropna()
+
+def _add_energy_features_compact(df_pivot):
+    # 측정값 float32, 태그 category (Flux 로더 결과는 이미 이 형식이라 복사 없음)
+    for col in ENERGY_FIELDS:
+        if df_pivot[col].dtype != np.float32:
+            df_pivot[col] = df_pivot[col].astype(np.float32)
+    for col in ['device_no', 'car_type']:
+        if not isinstance(df_pivot[col].dtype, pd.CategoricalDtype):
+            df_pivot[col] = df_pivot[col].astype('category')
+    
+    # 순간 전력 (kW): 전압 배열에 바로 곱하고 나눔 (W 컬럼 생략)
+    power = df_pivot['pack_volt'].to_numpy(dtype=np.float32, copy=True)
+    power *= df_pivot['pack_current'].to_numpy(dtype=np.float32)
+    power /= 1000
+    df_pivot['instant_power_kw'] = power
+    
+    # 달력 특성 int8 (계절: 12~2월 0, 3~5월 1, 6~8월 2, 9~11월 3)
+    times = pd.to_datetime(df_pivot['time']).dt
+    df_pivot['hour'] = times.hour.to_numpy(dtype=np.int8)
+    df_pivot['day_of_week'] = times.dayofweek.to_numpy(dtype=np.int8)
+    month = times.month.to_numpy(dtype=np.int8)
+    df_pivot['month'] = month
+    df_pivot['season'] = (month % 12) // 3
+    
+    # 차종별 인코딩 (미등록 차종은 NaN으로 남겨 아래에서 제거)
+    df_pivot['car_type_encoded'] = df_pivot['car_type'].map(CAR_TYPE_CODES).astype(np.float32)
+    
+    # 결측값 처리 (결측 행이 없으면 복사하지 않음)
+    missing = df_pivot.isna().any(axis=1).to_numpy()
+    if missing.any():
+        df_pivot = df_pivot.loc[~missing].reset_index(drop=True)
     return df_pivot
 
-def train_xgboost_model(df):
-    """XGBoost 모델 학습"""
+def memory_report(df):
+    """DataFrame 메모리 사용량 (문자열 포함 실제 크기)"""
+    total = int(df.memory_usage(index=True, deep=True).sum())
+    return {
+        'rows': len(df),
+        'bytes': total,
+        'bytes_per_row': round(total / len(df), 1) if len(df) else 0.0,
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()}
+    }
+
+def compare_memory(df_raw):
+    """기존 형식(float64 / object / int64)과 compact 형식의 행당 메모리 비교
+    
+    df_raw: fetch_energy_frame() 결과 (pivot된 원본)
+    """
+    legacy = df_raw.astype({col: 'float64' for col in ENERGY_FIELDS})
+    legacy['device_no'] = legacy['device_no'].astype(str).astype(object)
+    legacy['car_type'] = legacy['car_type'].astype(str).astype(object)
+    legacy = add_energy_features(legacy)
+    
+    compact = add_energy_features(df_raw.copy(), compact=True)
+    
+    before, after = memory_report(legacy), memory_report(compact)
+    return {
+        'before': before,
+        'after': after,
+        'reduction': round(1 - after['bytes_per_row'] / before['bytes_per_row'], 3) if before['rows'] else 0.0
+    }
+
+def validate_flux_pivot():
+    """Flux pivot 경로와 pandas pivot_table 경로의 학습 데이터 비교"""
+    flux = load_and_prepare_data()
+    pandas_df = load_and_prepare_data(pandas_pivot=True)
+    
+    keys = ['time', 'device_no', 'car_type']
+    for df in (flux, pandas_df):
+        df['device_no'] = df['device_no'].astype(str)
+        df['car_type'] = df['car_type'].astype(str)
+    merged = flux.merge(pandas_df, on=keys, suffixes=('_flux', '_pandas'))
+    
+    max_diff = max(
+        (merged[f'{field}_flux'] - merged[f'{field}_pandas']).abs().max()
+        for field in ENERGY_FIELDS
+    )
+    
+    print(f"행 수: Flux {len(flux)} / pandas {len(pandas_df)} / 공통 {len(merged)}")
+    print(f"필드 값 최대 차이: {max_diff:.6f} (같은 시각 중복 값이 있으면 Flux는 마지막 값, pandas는 평균)")
+    return max_diff, len(flux) == len(pandas_df) == len(merged)
+
+# 기본 하이퍼파라미터 (학습 함수의 params로 덮어씀, energy_tuning.py --save-best는 탐색 최적 설정을 넘김)
+DEFAULT_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+}
+
+def train_xgboost_model(df, feature_columns=None, target_column=TARGET_COLUMN, params=None, sample_weight=None):
+    """XGBoost 모델 학습 (기본: 순간 전력 특성/타겟, params: 기본 하이퍼파라미터 덮어쓰기,
+    sample_weight: 층화 표본의 행 가중치)"""
     print("XGBoost 모델 학습 중...")
     
     # 특성과 타겟 분리
-    feature_columns = [
-        'soc', 'soh', 'pack_volt', 'pack_current', 'mod_avg_temp', 'odometer',
-        'hour', 'day_of_week', 'month', 'season', 'car_type_encoded'
-    ]
+    feature_columns = feature_columns or FEATURE_COLUMNS
     
     X = df[feature_columns]
-    y = df['instant_power_kw']
+    y = df[target_column]
     
     # XGBoost 모델 설정
     model = xgb.XGBRegressor(
-        n_estimators=100,
-        max_depth=6,
-        learning_rate=0.1,
-        subsample=0.8,
-        colsample_bytree=0.8,
+        **{**DEFAULT_PARAMS, **(params or {})},
         random_state=42,
         n_jobs=-1
     )
     
     # 모델 학습
-    model.fit(X, y)
+    model.fit(X, y, sample_weight=sample_weight)
     
     # 특성 중요도 출력
     feature_importance = pd.DataFrame({
@@ -144,32 +297,221 @@ def train_xgboost_model(df):
     print("모델 학습 완료")
     return model, feature_columns
 
-def save_model(model, feature_columns, model_path):
-    """학습된 모델과 특성 정보 저장"""
-    print(f"모델 저장 중: {model_path}")
+def _fit_car_type_model(task):
+    car_type, X, y, weight, params, nthread = task
+    model = xgb.XGBRegressor(**params, random_state=42, n_jobs=nthread)
+    start = time.perf_counter()
+    model.fit(X, y, sample_weight=weight)
+    return car_type, model, time.perf_counter() - start
+
+def train_car_type_models(df, params=None, threads=None, sample_weight=None):
+    """차종별 XGBoost 모델 동시 학습 -> ({차종: 모델}, 특성 컬럼)
+    
+    차종마다 스레드 풀 작업 1개로 학습한다 (XGBoost는 학습 중 GIL을 놓음).
+    전체 스레드(threads, 기본 CPU 수)를 차종별 행 수에 비례해 나눠 각 모델의 n_jobs로 준다.
+    sample_weight: 층화 표본의 행 가중치 (df와 같은 순서)
+    """
+    print("차종별 XGBoost 모델 학습 중...")
+    
+    params = {**DEFAULT_PARAMS, **CAR_TYPE_PARAMS, **(params or {})}
+    threads = threads or os.cpu_count()
+    codes = df['car_type_encoded'].to_numpy()
+    
+    tasks = []
+    for car_type, code in CAR_TYPE_CODES.items():
+        mask = codes == code
+        if mask.any():
+            weight = None if sample_weight is None else np.asarray(sample_weight)[mask]
+            tasks.append([car_type, df.loc[mask, CAR_TYPE_FEATURE_COLUMNS], df.loc[mask, TARGET_COLUMN], weight, params])
+    if not tasks:
+        raise ValueError("학습할 차종 데이터가 없습니다.")
+    
+    total_rows = sum(len(task[2]) for task in tasks)
+    for task in tasks:
+        task.append(max(1, int(threads * len(task[2]) / total_rows)))
+    
+    models = {}
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        for task, (car_type, model, fit_s) in zip(tasks, executor.map(_fit_car_type_model, tasks)):
+            models[car_type] = model
+            print(f"  - {car_type}: {len(task[2])}개 데이터 포인트, 스레드 {task[5]}개, 학습 {fit_s:.1f}초")
     
-    # 디렉토리 생성
-    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    print("모델 학습 완료")
+    return models, CAR_TYPE_FEATURE_COLUMNS
+
+def get_time_slices(start='2022-01-01', stop='2024-01-01', months=1):
+    """학습 기간을 months개월 단위 (start, stop) Flux range 인자로 분할"""
+    bounds = list(pd.date_range(start, stop, freq=f'{months}MS', tz='UTC'))
+    if bounds[-1] < pd.Timestamp(stop, tz='UTC'):
+        bounds.append(pd.Timestamp(stop, tz='UTC'))
+    return [
+        (left.strftime('%Y-%m-%dT%H:%M:%SZ'), right.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        for left, right in zip(bounds[:-1], bounds[1:])
+    ]
+
+def list_chunk_files(chunk_dir):
+    """로컬 컬럼 파일(Parquet) 청크 목록 (하위 디렉토리 포함, 경로순)"""
+    paths = []
+    for root, _, files in os.walk(chunk_dir):
+        paths.extend(os.path.join(root, name) for name in files if name.endswith('.parquet'))
+    return sorted(paths)
+
+class EnergyChunkIter(xgb.DataIter):
+    """학습 데이터를 청크 단위로 XGBoost에 전달하는 반복자
+    
+    sources의 항목(시간 구간 또는 파일 경로)마다 load_chunk를 호출해 특성이 추가된 DataFrame을 받는다.
+    한 번에 청크 하나만 메모리에 올리며, XGBoost가 여러 번 reset() 후 다시 순회한다.
+    """
+    
+    def __init__(self, load_chunk, sources, cache_prefix=None):
+        self._load_chunk = load_chunk
+        self._sources = sources
+        self._position = 0
+        self._counted = 0
+        self.rows = 0
+        self.time_min = None
+        self.time_max = None
+        super().__init__(cache_prefix=cache_prefix)
+    
+    def next(self, input_data):
+        while self._position < len(self._sources):
+            df = self._load_chunk(self._sources[self._position])
+            self._position += 1
+            if df is None or df.empty:
+                continue
+            
+            # 첫 순회에서만 행 수/기간 집계
+            if self._position > self._counted:
+                self._counted = self._position
+                self.rows += len(df)
+                chunk_min, chunk_max = df['time'].min(), df['time'].max()
+                self.time_min = chunk_min if self.time_min is None else min(self.time_min, chunk_min)
+                self.time_max = chunk_max if self.time_max is None else max(self.time_max, chunk_max)
+            
+            input_data(data=df[FEATURE_COLUMNS], label=df[TARGET_COLUMN])
+            return 1
+        return 0
+    
+    def reset(self):
+        self._position = 0
+
+def load_influx_chunk(client, window):
+    """Flux pivot으로 시간 구간 1개 조회 후 특성 추가"""
+    df = fetch_energy_frame(client, *window)
+    if df is None:
+        return None
+    return add_energy_features(df)
+
+def get_partition_values(path):
+    """Hive 파티션 경로(.../car_type=GV60/device_no=.../month=2023-08/...)의 key=value 값
+    
+    경로 구분자는 pathlib 기준(Windows에서는 / 와 \\ 모두)이고, 같은 키가 여러 번 나오면 파일에 가장 가까운 값을 쓴다.
+    """
+    values = {}
+    for part in Path(path).parent.parts:
+        key, sep, value = part.partition('=')
+        if sep:
+            values[key] = value
+    return values
+
+def load_file_chunk(path, compact=False):
+    """Parquet 파일 1개 로드 후 특성 추가
+    
+    전처리기 파티션 출력처럼 car_type/device_no가 디렉토리 이름에만 있으면 경로 값으로 채우고
+    파일에서는 필요한 컬럼만 읽는다.
+    """
+    partition = get_partition_values(path)
+    columns = ['time', 'device_no', 'car_type', *ENERGY_FIELDS]
+    df = pd.read_parquet(path, columns=[col for col in columns if col not in partition])
+    for col in ['device_no', 'car_type']:
+        if col in partition:
+            df[col] = partition[col]
+    return add_energy_features(df[columns], compact=compact)
+
+def train_xgboost_chunked(iterator, external_memory=False, params=None):
+    """청크 반복자로 XGBoost 학습 (hist)
+    
+    기본은 QuantileDMatrix로 청크를 순회하며 분위수 구간(bin)으로 압축해 메모리에 둔다.
+    external_memory=True면 압축된 페이지를 디스크 캐시에 두어 메모리 사용량이 청크 크기로 제한된다.
+    params: train_xgboost_model()과 같이 DEFAULT_PARAMS 덮어쓰기 (n_estimators는 부스팅 라운드 수)
+    """
+    print(f"XGBoost 청크 학습 중... ({'외부 메모리' if external_memory else 'QuantileDMatrix'})")
+    
+    if external_memory:
+        dtrain = xgb.DMatrix(iterator)
+    else:
+        dtrain = xgb.QuantileDMatrix(iterator, max_bin=256)
+    
+    # train_xgboost_model()과 같은 하이퍼파라미터 (DEFAULT_PARAMS 기준)
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    num_boost_round = params.pop('n_estimators')
+    params.update({
+        'objective': 'reg:squarederror',
+        'tree_method': 'hist',
+        'seed': 42,
+        'nthread': -1
+    })
+    booster = xgb.train(params, dtrain, num_boost_round=num_boost_round)
     
-    # 모델과 메타데이터 저장
-    model_data = {
-        'model': model,
-        'feature_columns': feature_columns,
-        'trained_at': datetime.now(),
-        'model_type': 'XGBoost'
-    }
+    # 특성 중요도 출력 (gain)
+    scores = booster.get_score(importance_type='gain')
+    feature_importance = pd.DataFrame({
+        'feature': FEATURE_COLUMNS,
+        'importance': [scores.get(col, 0.0) for col in FEATURE_COLUMNS]
+    }).sort_values('importance', ascending=False)
+    
+    print("특성 중요도:")
+    print(feature_importance)
+    
+    print(f"모델 학습 완료: {iterator.rows}개 데이터 포인트")
+    return booster, FEATURE_COLUMNS
+
+def save_model(model, feature_columns, training_window=None, name=MODEL_NAME):
+    """학습된 모델과 특성 정보 저장 (레지스트리 새 버전, XGBoost UBJSON)"""
+    print(f"모델 저장 중: {name}")
+    
+    manifest = model_registry.save_xgboost_model(name, model, feature_columns, training_window)
+    
+    print(f"모델 저장 완료: {manifest['version']}")
+    return manifest
+
+def save_car_type_models(models, training_window=None, name=CAR_TYPE_MODEL_NAME):
+    """차종별 모델을 묶음 하나로 저장 (레지스트리 새 버전, 차종마다 UBJSON)"""
+    print(f"모델 저장 중: {name} ({', '.join(models)})")
     
-    with open(model_path, 'wb') as f:
-        pickle.dump(model_data, f)
+    manifest = model_registry.save_xgboost_bundle(
+        name, models, CAR_TYPE_FEATURE_COLUMNS, training_window,
+        extra={'input_features': FEATURE_COLUMNS, 'car_type_codes': CAR_TYPE_CODES}
+    )
     
-    print("모델 저장 완료")
+    print(f"모델 저장 완료: {manifest['version']}")
+    return manifest
 
-def load_model(model_path):
-    """저장된 모델 로드"""
-    print(f"모델 로드 중: {model_path}")
+def load_model(version=None, name=MODEL_NAME):
+    """저장된 모델 로드 (기본값: 레지스트리 현재 버전)
+    
+    차종별 묶음 모델이면 model_data['models']에 {차종: 모델}을 담고, feature_columns는
+    라우팅에 쓰는 car_type_encoded를 포함한 입력 특성, model_feature_columns는 하위 모델 특성이다.
+    """
+    print(f"모델 로드 중: {name}")
     
-    with open(model_path, 'rb') as f:
-        model_data = pickle.load(f)
+    model, manifest = model_registry.load_model(name, version)
+    model_data = {
+        'model': model,
+        'feature_columns': manifest['features'],
+        'trained_at': manifest['created_at'],
+        'model_type': 'XGBoost',
+        'version': manifest['version']
+    }
+    if manifest['format'] == 'xgboost-bundle':
+        model_data.update(
+            model=None,
+            models=model,
+            feature_columns=manifest['input_features'],
+            model_feature_columns=manifest['features'],
+            car_type_codes=manifest['car_type_codes'],
+            model_type='XGBoost (차종별)'
+        )
     
     print("모델 로드 완료")
     return model_data
@@ -181,6 +523,11 @@ def predict_energy_consumption(model_data, features):
     model = model_data['model']
     feature_columns = model_data['feature_columns']
     
+    # 차종별 묶음 모델이면 car_type_encoded로 하위 모델 선택
+    if 'models' in model_data:
+        model = model_data['models'][_route_car_type(model_data, features['car_type_encoded'])]
+        feature_columns = model_data['model_feature_columns']
+    
     # 특성 데이터 준비
     X = pd.DataFrame([features], columns=feature_columns)
     
@@ -190,22 +537,372 @@ def predict_energy_consumption(model_data, features):
     print("예측 완료")
     return prediction
 
+def load_feature_store_data(car_types=None, start_month=None, end_month=None):
+    """특성 저장소에서 학습에 필요한 컬럼만 로드 (원본 조회/특성 계산 생략)"""
+    import energy_feature_store
+    
+    print("특성 저장소에서 학습 데이터 로드 중...")
+    df = energy_feature_store.read_features(
+        ['time', *FEATURE_COLUMNS, TARGET_COLUMN], car_types, start_month, end_month
+    )
+    if df.empty:
+        print("특성 저장소에 데이터가 없습니다.")
+        return None
+    
+    print(f"데이터 준비 완료: {len(df)}개 데이터 포인트")
+    return df
+
+def predict_energy_from_store(model_data, car_types=None, start_month=None, end_month=None, nthread=None):
+    """특성 저장소 파티션 단위 일괄 예측 -> DataFrame[time, device_no, car_type, predicted_kw]"""
+    import energy_feature_store
+    
+    columns = ['time', 'device_no', *model_data['feature_columns']]
+    results = []
+    for path in energy_feature_store.list_partition_files(car_types, start_month, end_month):
+        df = energy_feature_store.read_partition(path, columns)
+        car_type = get_partition_values(path)['car_type']
+        df['car_type'] = car_type
+        df['predicted_kw'] = predict_energy_batch(model_data, df, nthread, car_type)
+        results.append(df[['time', 'device_no', 'car_type', 'predicted_kw']])
+    
+    if not results:
+        return None
+    return pd.concat(results, ignore_index=True)
+
+def _route_car_type(model_data, code):
+    """car_type_encoded 값 -> 묶음 모델의 차종 키"""
+    for car_type, car_type_code in model_data['car_type_codes'].items():
+        if car_type_code == code and car_type in model_data['models']:
+            return car_type
+    raise ValueError(f"차종 모델이 없습니다: car_type_encoded={code}")
+
+def _predict_car_type_batch(model_data, X, nthread=None, car_type=None):
+    """차종별 묶음 모델 일괄 예측 (car_type이 있으면 전체 행을 해당 모델로, 없으면 행별 라우팅)"""
+    feature_columns = model_data['feature_columns']
+    model_columns = [feature_columns.index(col) for col in model_data['model_feature_columns']]
+    
+    def booster_of(name):
+        if name not in model_data['models']:
+            raise ValueError(f"차종 모델이 없습니다: {name}")
+        booster = model_data['models'][name].get_booster()
+        if nthread:
+            booster.set_param({'nthread': nthread})
+        return booster
+    
+    # 파티션 단위 라우팅 (특성 저장소 등 차종이 정해진 입력)
+    if car_type is not None:
+        return booster_of(car_type).inplace_predict(X[:, model_columns], validate_features=False)
+    
+    # 행 단위 라우팅: 차종별로 행을 모아 한 번씩 예측
+    codes = X[:, feature_columns.index('car_type_encoded')]
+    predictions = np.full(len(X), np.nan, dtype=np.float32)
+    for code in np.unique(codes):
+        mask = codes == code
+        name = _route_car_type(model_data, code)
+        predictions[mask] = booster_of(name).inplace_predict(X[np.ix_(mask, model_columns)], validate_features=False)
+    return predictions
+
+def predict_energy_batch(model_data, features, nthread=None, car_type=None):
+    """여러 행 에너지 소비 일괄 예측 (Booster.inplace_predict)
+    
+    features: feature_columns 순서의 (행 수, 특성 수) NumPy 배열, 또는 feature_columns를 포함한 DataFrame
+    nthread: 예측 스레드 수 (없으면 모델 설정 유지)
+    car_type: 차종별 묶음 모델에서 입력 전체가 한 차종일 때 지정 (없으면 car_type_encoded로 행별 라우팅)
+    반환값: 행별 예측 전력(kW) float32 배열
+    """
+    feature_columns = model_data['feature_columns']
+    
+    # 열 구성은 호출당 한 번만 검증
+    if isinstance(features, pd.DataFrame):
+        missing = [col for col in feature_columns if col not in features.columns]
+        if missing:
+            raise ValueError(f"특성 컬럼이 없습니다: {missing}")
+        X = features[feature_columns].to_numpy(dtype=np.float32)
+    else:
+        X = np.asarray(features, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(feature_columns):
+            raise ValueError(f"특성 배열 형태가 맞지 않습니다: {X.shape} (특성 {len(feature_columns)}개 필요)")
+    
+    if 'models' in model_data:
+        return _predict_car_type_batch(model_data, X, nthread, car_type)
+    
+    booster = model_data['model'].get_booster()
+    if nthread:
+        booster.set_param({'nthread': nthread})
+    
+    return booster.inplace_predict(X, validate_features=False)
+
+def benchmark_inference(model_data, rows=10000, nthread=None, per_row_sample=500):
+    """행 단위 예측(predict_energy_consumption)과 일괄 예측 처리량 비교 (행/초)"""
+    rng = np.random.default_rng(42)
+    feature_columns = model_data['feature_columns']
+    
+    # 학습 데이터 범위와 비슷한 임의 입력
+    ranges = {
+        'soc': (0, 100), 'soh': (70, 100), 'pack_volt': (250, 450), 'pack_current': (-200, 100),
+        'mod_avg_temp': (-10, 45), 'odometer': (0, 200000), 'hour': (0, 24), 'day_of_week': (0, 7),
+        'month': (1, 13), 'season': (0, 4), 'car_type_encoded': (0, 3)
+    }
+    X = np.column_stack([
+        rng.uniform(*ranges.get(col, (0, 1)), size=rows) for col in feature_columns
+    ]).astype(np.float32)
+    X[:, [feature_columns.index(col) for col in ['hour', 'day_of_week', 'month', 'season', 'car_type_encoded']
+          if col in feature_columns]] //= 1
+    
+    # 행 단위 예측 (출력 메시지는 측정에서 제외)
+    sample = min(per_row_sample, rows)
+    per_row = np.empty(sample, dtype=np.float32)
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for i in range(sample):
+            per_row[i] = predict_energy_consumption(model_data, dict(zip(feature_columns, X[i])))
+        per_row_s = time.perf_counter() - start
+    
+    # 일괄 예측 (첫 호출 준비 비용 제외)
+    predict_energy_batch(model_data, X[:10], nthread)
+    start = time.perf_counter()
+    batch = predict_energy_batch(model_data, X, nthread)
+    batch_s = time.perf_counter() - start
+    
+    return {
+        'rows': rows,
+        'nthread': nthread,
+        'per_row_rows_per_s': round(sample / per_row_s, 1),
+        'batch_rows_per_s': round(rows / batch_s, 1),
+        'speedup': round((rows / batch_s) / (sample / per_row_s), 1),
+        'max_abs_diff': float(np.abs(batch[:sample] - per_row).max())
+    }
+
+def compare_car_type_models(df, validation_ratio=0.2, nthread=None):
+    """공통 모델과 차종별 모델을 같은 시간순 학습/검증 분할로 비교 (검증 RMSE, 일괄 예측 처리량)"""
+    df = df.sort_values('time')
+    split = int(len(df) * (1 - validation_ratio))
+    df_train, df_val = df.iloc[:split], df.iloc[split:]
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        shared, _ = train_xgboost_model(df_train)
+        models, model_feature_columns = train_car_type_models(df_train)
+    candidates = {
+        'shared': {'model': shared, 'feature_columns': FEATURE_COLUMNS},
+        'car_type': {
+            'model': None,
+            'models': models,
+            'feature_columns': FEATURE_COLUMNS,
+            'model_feature_columns': model_feature_columns,
+            'car_type_codes': CAR_TYPE_CODES
+        }
+    }
+    
+    X = df_val[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    y = df_val[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    codes = df_val['car_type_encoded'].to_numpy()
+    
+    report = {'train_rows': len(df_train), 'validation_rows': len(df_val)}
+    for label, model_data in candidates.items():
+        predict_energy_batch(model_data, X[:10], nthread)
+        start = time.perf_counter()
+        predictions = predict_energy_batch(model_data, X, nthread)
+        batch_s = time.perf_counter() - start
+        
+        errors = predictions - y
+        report[label] = {
+            'val_rmse': float(np.sqrt(np.mean(errors ** 2))),
+            'val_rmse_by_car_type': {
+                car_type: float(np.sqrt(np.mean(errors[codes == code] ** 2)))
+                for car_type, code in CAR_TYPE_CODES.items() if (codes == code).any()
+            },
+            'batch_rows_per_s': round(len(X) / batch_s, 1)
+        }
+    return report
+
+def main_out_of_core():
+    """청크 학습 실행 (--feature-store: 특성 저장소 파티션, --chunks-from DIR: 로컬 Parquet, 기본: InfluxDB 시간 구간)"""
+    external_memory = '--external-memory' in sys.argv
+    cache_prefix = None
+    if external_memory:
+        os.makedirs(EXTERNAL_MEMORY_CACHE_DIR, exist_ok=True)
+        cache_prefix = os.path.join(EXTERNAL_MEMORY_CACHE_DIR, f"energy-{os.getpid()}")
+    
+    chunk_dir = get_option(sys.argv, '--chunks-from')
+    client = None
+    if '--feature-store' in sys.argv:
+        import energy_feature_store
+        sources = energy_feature_store.list_partition_files(*get_store_filter())
+        columns = ['time', *FEATURE_COLUMNS, TARGET_COLUMN]
+        iterator = EnergyChunkIter(
+            lambda path: energy_feature_store.read_partition(path, columns), sources, cache_prefix
+        )
+    elif chunk_dir:
+        sources = list_chunk_files(chunk_dir)
+        iterator = EnergyChunkIter(load_file_chunk, sources, cache_prefix)
+    else:
+        months = int(get_option(sys.argv, '--chunk-months', 1))
+        sources = get_time_slices(months=months)
+        client = get_influx_client()
+        iterator = EnergyChunkIter(lambda window: load_influx_chunk(client, window), sources, cache_prefix)
+    
+    print(f"학습 청크: {len(sources)}개")
+    if not sources:
+        print("데이터 로드 실패")
+        return
+    
+    try:
+        model, feature_columns = train_xgboost_chunked(iterator, external_memory)
+    finally:
+        if client is not None:
+            client.close()
+    
+    if iterator.rows == 0:
+        print("데이터 로드 실패")
+        return
+    
+    training_window = {
+        'start': iterator.time_min.isoformat(),
+        'end': iterator.time_max.isoformat()
+    }
+    save_model(model, feature_columns, training_window)
+
+def main_trip_model():
+    """주행 단위 에너지(kWh) 모델 학습 (energy_integration 주행 집계를 타겟으로 사용)"""
+    import energy_integration
+    
+    client = get_influx_client()
+    try:
+        df = fetch_energy_frame(client)
+    finally:
+        client.close()
+    
+    trips, _ = energy_integration.integrate_energy(df)
+    if trips is None:
+        print("데이터 로드 실패")
+        return
+    
+    df_trips = energy_integration.build_trip_training_frame(trips)
+    print(f"주행 데이터 준비 완료: {len(df_trips)}건 (전체 {len(trips)}건)")
+    
+    model, feature_columns = train_xgboost_model(
+        df_trips, energy_integration.TRIP_FEATURE_COLUMNS, energy_integration.TRIP_TARGET_COLUMN
+    )
+    training_window = {
+        'start': df_trips['start_time'].min().isoformat(),
+        'end': df_trips['start_time'].max().isoformat()
+    }
+    save_model(model, feature_columns, training_window, TRIP_MODEL_NAME)
+
+def get_store_filter():
+    """특성 저장소 조회 조건 (--car-types A,B --start-month YYYY-MM --end-month YYYY-MM)"""
+    car_types = get_option(sys.argv, '--car-types')
+    return (
+        car_types.split(',') if car_types else None,
+        get_option(sys.argv, '--start-month'),
+        get_option(sys.argv, '--end-month')
+    )
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
 def main():
     """메인 실행 함수"""
     print("=== 에너지 소비 XGBoost 모델 학습 시작 ===")
     
-    # 1. 데이터 로드
-    df = load_and_prepare_data()
+    if '--validate-pivot' in sys.argv:
+        validate_flux_pivot()
+        return
+    
+    if '--benchmark-inference' in sys.argv:
+        threads = get_option(sys.argv, '--threads')
+        result = benchmark_inference(
+            load_model(name=CAR_TYPE_MODEL_NAME if '--by-car-type' in sys.argv else MODEL_NAME),
+            rows=int(get_option(sys.argv, '--rows', 10000)),
+            nthread=int(threads) if threads else None
+        )
+        print(f"행 단위: {result['per_row_rows_per_s']}행/초, 일괄: {result['batch_rows_per_s']}행/초 "
+              f"({result['speedup']}배, 최대 차이 {result['max_abs_diff']:.6f})")
+        return
+    
+    # 기존 / compact 형식 행당 메모리 비교
+    if '--memory-report' in sys.argv:
+        client = get_influx_client()
+        try:
+            df_raw = fetch_energy_frame(client)
+        finally:
+            client.close()
+        if df_raw is None:
+            print("데이터 로드 실패")
+            return
+        
+        report = compare_memory(df_raw)
+        print(f"행 수: {report['after']['rows']}")
+        print(f"기존: {report['before']['bytes_per_row']}바이트/행, "
+              f"compact: {report['after']['bytes_per_row']}바이트/행 ({report['reduction'] * 100:.1f}% 감소)")
+        return
+    
+    # 공통 모델 / 차종별 모델 검증 정확도, 예측 처리량 비교
+    if '--compare-car-type' in sys.argv:
+        if '--feature-store' in sys.argv:
+            df = load_feature_store_data(*get_store_filter())
+        else:
+            df = load_and_prepare_data(compact=True)
+        if df is None:
+            print("데이터 로드 실패")
+            return
+        
+        report = compare_car_type_models(df)
+        for label in ['shared', 'car_type']:
+            result = report[label]
+            print(f"{label}: 검증 RMSE {result['val_rmse']:.4f}kW, 일괄 {result['batch_rows_per_s']}행/초")
+            for car_type, rmse in result['val_rmse_by_car_type'].items():
+                print(f"  - {car_type}: {rmse:.4f}kW")
+        return
+    
+    # 주행 단위 kWh 타겟 모델
+    if '--trip-target' in sys.argv:
+        main_trip_model()
+        return
+    
+    # 청크 학습: 전체 데이터를 메모리에 올리지 않고 시간 구간/파일 단위로 학습
+    if '--out-of-core' in sys.argv:
+        main_out_of_core()
+        return
+    
+    # 1. 데이터 로드 (기본: Flux pivot, --pandas-pivot: pandas pivot_table, --feature-store: 특성 저장소,
+    #    --sample: 청크 단위 층화 표본, 층별 --sample-size행)
+    if '--sample' in sys.argv:
+        import energy_sampling
+        df = energy_sampling.load_sampled_data(
+            size=int(get_option(sys.argv, '--sample-size', energy_sampling.DEFAULT_SAMPLE_SIZE)),
+            chunk_dir=get_option(sys.argv, '--chunks-from'),
+            feature_store='--feature-store' in sys.argv,
+            store_filter=get_store_filter(),
+            chunk_days=int(get_option(sys.argv, '--chunk-days', energy_sampling.DEFAULT_CHUNK_DAYS))
+        )
+    elif '--feature-store' in sys.argv:
+        df = load_feature_store_data(*get_store_filter())
+    else:
+        df = load_and_prepare_data(pandas_pivot='--pandas-pivot' in sys.argv, compact='--compact' in sys.argv)
     if df is None:
         print("데이터 로드 실패")
         return
     
-    # 2. 모델 학습
-    model, feature_columns = train_xgboost_model(df)
-    
-    # 3. 모델 저장
-    model_path = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/energy_consumption_xgboost.pkl'
-    save_model(model, feature_columns, model_path)
+    # 2. 모델 학습 / 3. 모델 저장 (--by-car-type: 차종별 모델 동시 학습 후 묶음 저장)
+    training_window = {
+        'start': df['time'].min().isoformat(),
+        'end': df['time'].max().isoformat()
+    }
+    sample_weight = df['sample_weight'] if 'sample_weight' in df.columns else None
+    by_car_type = '--by-car-type' in sys.argv
+    if by_car_type:
+        threads = get_option(sys.argv, '--threads')
+        models, _ = train_car_type_models(df, threads=int(threads) if threads else None, sample_weight=sample_weight)
+        save_car_type_models(models, training_window)
+    else:
+        model, feature_columns = train_xgboost_model(df, sample_weight=sample_weight)
+        save_model(model, feature_columns, training_window)
     
     # 4. 예측 테스트
     test_features = {
@@ -222,7 +919,7 @@ def main():
         'car_type_encoded': 1
     }
     
-    model_data = load_model(model_path)
+    model_data = load_model(name=CAR_TYPE_MODEL_NAME if by_car_type else MODEL_NAME)
     prediction = predict_energy_consumption(model_data, test_features)
     print(f"\n=== 예측 결과 ===")
     print(f"예상 전력 소비: {prediction:.3f}kW")
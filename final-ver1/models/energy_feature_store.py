@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+에너지 소비 모델 특성 저장소 (Parquet, 차종/월 파티션)
+
+디렉토리 구조:
+    energy_features/car_type=<차종>/year_month=<YYYY-MM>/part-0.parquet
+    energy_features/_state.json     적재가 끝난(완료된) 월 목록
+
+월 단위로 InfluxDB에서 BMS 필드를 받아 특성을 계산한 뒤 해당 월 파티션만 쓴다.
+이미 완료된 월은 다시 쓰지 않고, 진행 중인 월은 실행할 때마다 그 월 파티션만 교체한다.
+"""
+
+import os
+import sys
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from datetime import datetime, timezone
+import energy_consumption_xgboost as energy
+
+FEATURE_STORE_ROOT = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/energy_features'
+STATE_FILE = '_state.json'
+
+# 저장 컬럼 타입 (값은 float32, 작은 정수 특성은 int8)
+STORE_DTYPES = {
+    'soc': 'float32',
+    'soh': 'float32',
+    'pack_volt': 'float32',
+    'pack_current': 'float32',
+    'mod_avg_temp': 'float32',
+    'odometer': 'float32',
+    'instant_power_kw': 'float32',
+    'hour': 'int8',
+    'day_of_week': 'int8',
+    'month': 'int8',
+    'season': 'int8',
+    'car_type_encoded': 'int8',
+}
+
+def _state_path(root):
+    return os.path.join(root or FEATURE_STORE_ROOT, STATE_FILE)
+
+def load_built_months(root=None):
+    """적재가 끝난 월 목록 (YYYY-MM)"""
+    try:
+        with open(_state_path(root), 'r') as f:
+            return set(json.load(f)['months'])
+    except FileNotFoundError:
+        return set()
+
+def _save_built_months(months, root):
+    path = _state_path(root)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'months': sorted(months), 'updated_at': datetime.now().isoformat()}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def to_store_frame(df):
+    """add_energy_features() 결과를 저장 형식(컬럼/타입)으로 변환"""
+    columns = ['time', 'device_no', *STORE_DTYPES]
+    df_store = df[columns].astype(STORE_DTYPES)
+    df_store['device_no'] = df_store['device_no'].astype(str).astype('category')
+    return df_store
+
+def write_month(df, month, root=None):
+    """한 달치 특성을 차종별 파티션으로 저장 (같은 월 파티션만 교체)"""
+    root = root or FEATURE_STORE_ROOT
+    written = {}
+    for car_type, df_car in df.groupby(df['car_type'].astype(str), sort=False):
+        partition_dir = os.path.join(root, f"car_type={car_type}", f"year_month={month}")
+        os.makedirs(partition_dir, exist_ok=True)
+
+        table = pa.Table.from_pandas(to_store_frame(df_car), preserve_index=False)
+        path = os.path.join(partition_dir, 'part-0.parquet')
+        tmp_path = os.path.join(partition_dir, '.part-0.parquet.tmp')
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+        written[car_type] = len(df_car)
+    return written
+
+def _utc(value):
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+
+def get_months(start, stop):
+    """[start, stop) 구간의 월 목록 -> [(YYYY-MM, 시작, 끝)] (Flux range 인자 형식)"""
+    start, stop = _utc(start), _utc(stop)
+    months = []
+    left = start.normalize().replace(day=1)
+    while left < stop:
+        right = left + pd.offsets.MonthBegin(1)
+        months.append((
+            left.strftime('%Y-%m'),
+            max(left, start).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            min(right, stop).strftime('%Y-%m-%dT%H:%M:%SZ')
+        ))
+        left = right
+    return months
+
+def update_feature_store(start='2022-01-01', stop=None, root=None, rebuild=False):
+    """특성 저장소 증분 적재
+
+    완료된 월(_state.json)은 건너뛰고 새 월만 조회해 추가한다. stop이 없으면 현재 시각까지이며,
+    진행 중인 월은 쓰되 완료 목록에는 넣지 않아 다음 실행에서 다시 채운다.
+    """
+    root = root or FEATURE_STORE_ROOT
+    now = datetime.now(timezone.utc)
+    stop = stop or now.strftime('%Y-%m-%dT%H:%M:%SZ')
+    os.makedirs(root, exist_ok=True)
+
+    built = set() if rebuild else load_built_months(root)
+    client = energy.get_influx_client()
+
+    summary = {'written': {}, 'skipped': []}
+    try:
+        for month, month_start, month_stop in get_months(start, stop):
+            if month in built:
+                summary['skipped'].append(month)
+                continue
+
+            print(f"{month} 특성 적재 중...")
+            df = energy.fetch_energy_frame(client, month_start, month_stop)
+            if df is not None:
+                df = energy.add_energy_features(df)
+
+            if df is not None and not df.empty:
+                summary['written'][month] = write_month(df, month, root)
+
+            # 월 전체가 지난 경우에만 완료 처리
+            month_end = _utc(f"{month}-01") + pd.offsets.MonthBegin(1)
+            if month_end <= now and month_end <= _utc(stop):
+                built.add(month)
+                _save_built_months(built, root)
+    finally:
+        client.close()
+
+    return summary
+
+def _filter(car_types=None, start_month=None, end_month=None):
+    expression = None
+    conditions = []
+    if car_types:
+        conditions.append(ds.field('car_type').isin(list(car_types)))
+    if start_month:
+        conditions.append(ds.field('year_month') >= start_month)
+    if end_month:
+        conditions.append(ds.field('year_month') <= end_month)
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _dataset(root):
+    partitioning = ds.partitioning(pa.schema([('car_type', pa.string()), ('year_month', pa.string())]), flavor='hive')
+    return ds.dataset(root or FEATURE_STORE_ROOT, format='parquet', partitioning=partitioning, exclude_invalid_files=True)
+
+def list_partition_files(car_types=None, start_month=None, end_month=None, root=None):
+    """조건에 맞는 파티션 파일 경로 목록 (청크 학습용)"""
+    fragments = _dataset(root).get_fragments(filter=_filter(car_types, start_month, end_month))
+    return sorted(fragment.path for fragment in fragments)
+
+def read_partition(path, columns=None):
+    """파티션 파일 1개 로드 (필요한 컬럼만)"""
+    return pd.read_parquet(path, columns=columns)
+
+def read_features(columns=None, car_types=None, start_month=None, end_month=None, root=None):
+    """조건에 맞는 파티션의 필요한 컬럼만 DataFrame으로 로드
+
+    columns에 파티션 키 'car_type' / 'year_month'를 넣으면 해당 값도 함께 반환한다.
+    """
+    dataset = _dataset(root)
+    table = dataset.to_table(columns=columns, filter=_filter(car_types, start_month, end_month))
+    return table.to_pandas()
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def main():
+    """메인 실행 함수 (특성 저장소 증분 적재)"""
+    print("=== 에너지 특성 저장소 적재 시작 ===")
+
+    summary = update_feature_store(
+        start=get_option(sys.argv, '--start', '2022-01-01'),
+        stop=get_option(sys.argv, '--stop'),
+        rebuild='--rebuild' in sys.argv
+    )
+
+    print(f"적재한 월: {len(summary['written'])}개, 건너뛴 월: {len(summary['skipped'])}개")
+    for month, counts in summary['written'].items():
+        print(f"  - {month}: {counts}")
+
+    print("\n=== 특성 저장소 적재 완료 ===")
+
+if __name__ == "__main__":
+    main()
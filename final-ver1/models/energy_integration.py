@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+차량별 주행(trip) / 일별 에너지 적분 (kWh)
+
+순간 전력(pack_volt * pack_current) 샘플을 차량/시간순으로 한 번 정렬한 뒤,
+인접 샘플 간 사다리꼴 적분으로 구간 에너지를 구하고 np.add.reduceat으로
+주행/일 단위 합계를 계산한다. 차량별 반복문 없이 전체 차량을 한 번에 처리한다.
+
+- 샘플 간격이 MAX_STEP_S보다 길면 적분 시간을 MAX_STEP_S로 제한
+- 간격이 TRIP_GAP_S 이상이면 (또는 차량이 바뀌면) 새 주행으로 분리하고 그 구간은 적분하지 않음
+- pack_current < 0 이 방전 (energy_out_kwh), > 0 이 충전/회생 (energy_in_kwh)
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+import energy_consumption_xgboost as energy
+
+MAX_STEP_S = 60
+TRIP_GAP_S = 600
+
+# 주행 단위 학습 데이터 특성
+TRIP_FEATURE_COLUMNS = [
+    'soc_start', 'soh', 'mod_avg_temp', 'distance_km', 'duration_min',
+    'hour', 'day_of_week', 'month', 'season', 'car_type_encoded'
+]
+TRIP_TARGET_COLUMN = 'energy_out_kwh'
+
+def _sorted_arrays(df):
+    """차량/시간순 정렬 인덱스와 차량 코드 (정렬은 한 번만)"""
+    codes, devices = pd.factorize(df['device_no'].astype(str))
+    times = df['time'].to_numpy(dtype='datetime64[ns]').view('int64')
+    order = np.lexsort((times, codes))
+    return order, codes[order], devices, times[order]
+
+def _first_last(breaks, n):
+    """행 단위 새 그룹 시작 여부 -> (그룹 첫 행, 마지막 행) 위치 배열"""
+    starts = np.flatnonzero(breaks)
+    lasts = np.empty_like(starts)
+    lasts[:-1] = starts[1:] - 1
+    lasts[-1] = n - 1
+    return starts, lasts
+
+def integrate_energy(df, max_step_s=MAX_STEP_S, trip_gap_s=TRIP_GAP_S):
+    """전체 차량 주행별 / 일별 에너지 집계
+
+    df: time, device_no, car_type, pack_volt, pack_current 컬럼 필수
+        (odometer가 있으면 주행거리/kWh/km, soc/soh/mod_avg_temp가 있으면 주행 특성 계산)
+    반환값: (trips DataFrame, daily DataFrame)
+    """
+    if df is None or df.empty:
+        return None, None
+
+    order, codes, devices, times = _sorted_arrays(df)
+    n = len(order)
+
+    def column(name):
+        if name not in df.columns:
+            return np.full(n, np.nan)
+        return df[name].to_numpy(dtype='float64')[order]
+
+    power_kw = column('pack_volt') * column('pack_current') / 1000
+    odometer = column('odometer')
+
+    # 인접 샘플 간격 (초)과 주행 분리 지점
+    dt_s = np.diff(times) / 1e9
+    same_device = codes[1:] == codes[:-1]
+    continues = same_device & (dt_s < trip_gap_s)
+
+    trip_breaks = np.ones(n, dtype=bool)
+    trip_breaks[1:] = ~continues
+
+    # 구간 i = (i, i+1) 샘플 사다리꼴 적분 (행 i에 기록, 주행 마지막 행은 0)
+    step_h = np.where(continues, np.minimum(dt_s, max_step_s), 0) / 3600
+    mean_power = np.nan_to_num((power_kw[1:] + power_kw[:-1]) / 2)
+    energy_out = np.zeros(n)
+    energy_in = np.zeros(n)
+    driving_h = np.zeros(n)
+    energy_out[:-1] = np.maximum(-mean_power, 0) * step_h
+    energy_in[:-1] = np.maximum(mean_power, 0) * step_h
+    driving_h[:-1] = step_h
+
+    trips = _aggregate(df, order, codes, devices, times, trip_breaks,
+                       energy_out, energy_in, driving_h, odometer, column)
+
+    # 일별 (UTC 기준, 자정을 넘는 구간은 시작 샘플 날짜에 포함)
+    days = times // (86400 * 10**9)
+    day_breaks = np.ones(n, dtype=bool)
+    day_breaks[1:] = (codes[1:] != codes[:-1]) | (days[1:] != days[:-1])
+    daily = _aggregate(df, order, codes, devices, times, day_breaks,
+                       energy_out, energy_in, driving_h, odometer, column, per_trip=False)
+
+    # 일별 주행 횟수 (주행 시작 날짜 기준)
+    trip_days = pd.DataFrame({'device_no': trips['device_no'], 'date': trips['start_time'].dt.floor('D')})
+    trip_counts = trip_days.groupby(['device_no', 'date'], sort=False).size().rename('trips')
+    daily = daily.join(trip_counts, on=['device_no', 'date'])
+    daily['trips'] = daily['trips'].fillna(0).astype('int32')
+
+    return trips, daily
+
+def _aggregate(df, order, codes, devices, times, breaks, energy_out, energy_in,
+               driving_h, odometer, column, per_trip=True):
+    """연속된 행 그룹(주행 또는 차량-일)별 합계 (np.add.reduceat)"""
+    n = len(order)
+    starts, lasts = _first_last(breaks, n)
+
+    out_kwh = np.add.reduceat(energy_out, starts)
+    in_kwh = np.add.reduceat(energy_in, starts)
+    hours = np.add.reduceat(driving_h, starts)
+
+    # 누적 주행거리 기준 거리 (그룹 내 최대-최소, 결측 무시)
+    valid_odometer = ~np.isnan(odometer)
+    odo_max = np.fmax.reduceat(np.where(valid_odometer, odometer, -np.inf), starts)
+    odo_min = np.fmin.reduceat(np.where(valid_odometer, odometer, np.inf), starts)
+    distance = np.where(np.isfinite(odo_max) & np.isfinite(odo_min), odo_max - odo_min, np.nan)
+
+    car_types = df['car_type'].astype(str).to_numpy()[order]
+
+    result = pd.DataFrame({
+        'device_no': devices[codes[starts]],
+        'car_type': car_types[starts],
+    })
+
+    start_time = pd.to_datetime(times[starts], utc=True)
+    if per_trip:
+        result['trip_id'] = np.arange(len(starts), dtype='int64')
+        result['start_time'] = start_time
+        result['end_time'] = pd.to_datetime(times[lasts], utc=True)
+        result['samples'] = (lasts - starts + 1).astype('int32')
+    else:
+        result['date'] = start_time.floor('D')
+
+    result['duration_min'] = (hours * 60).astype('float32')
+    result['energy_out_kwh'] = out_kwh.astype('float32')
+    result['energy_in_kwh'] = in_kwh.astype('float32')
+    result['net_kwh'] = (out_kwh - in_kwh).astype('float32')
+    result['distance_km'] = distance.astype('float32')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['kwh_per_km'] = np.where(distance > 0, (out_kwh - in_kwh) / distance, np.nan).astype('float32')
+
+    if per_trip:
+        # 주행 단위 학습 특성 (시작 SOC, 평균 SOH/온도, 시작 시각 달력 특성)
+        result['soc_start'] = column('soc')[starts].astype('float32')
+        for name in ['soh', 'mod_avg_temp']:
+            values = column(name)
+            valid = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(valid, values, 0), starts)
+            valid_counts = np.add.reduceat(valid.astype('int64'), starts)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result[name] = (sums / valid_counts).astype('float32')
+        result['hour'] = start_time.hour.astype('int8')
+        result['day_of_week'] = start_time.dayofweek.astype('int8')
+        result['month'] = start_time.month.astype('int8')
+        result['season'] = ((result['month'] % 12) // 3).astype('int8')
+        result['car_type_encoded'] = result['car_type'].map(energy.CAR_TYPE_CODES).astype('float32')
+
+    return result
+
+def build_trip_training_frame(trips, min_distance_km=1.0):
+    """주행 단위 학습 데이터 (주행거리가 너무 짧거나 특성이 비어 있는 주행 제외)"""
+    df = trips[trips['distance_km'] >= min_distance_km]
+    return df.dropna(subset=[*TRIP_FEATURE_COLUMNS, TRIP_TARGET_COLUMN]).reset_index(drop=True)
+
+def write_energy_aggregates(client, trips, daily):
+    """주행별 / 일별 에너지 집계를 energy_trip / energy_daily 측정값으로 기록 (대시보드용)"""
+    from influxdb_client import WriteOptions
+
+    bucket = "aicar-bucket"
+    org = "keti"
+
+    trip_frame = trips.set_index('start_time')[
+        ['device_no', 'car_type', 'duration_min', 'energy_out_kwh',
+         'energy_in_kwh', 'net_kwh', 'distance_km', 'kwh_per_km']
+    ]
+    daily_frame = daily.set_index('date')[
+        ['device_no', 'car_type', 'trips', 'duration_min', 'energy_out_kwh',
+         'energy_in_kwh', 'net_kwh', 'distance_km', 'kwh_per_km']
+    ]
+
+    write_options = WriteOptions(batch_size=5000, flush_interval=10_000)
+    with client.write_api(write_options=write_options) as write_api:
+        write_api.write(bucket=bucket, org=org, record=trip_frame,
+                        data_frame_measurement_name='energy_trip',
+                        data_frame_tag_columns=['device_no', 'car_type'])
+        write_api.write(bucket=bucket, org=org, record=daily_frame,
+                        data_frame_measurement_name='energy_daily',
+                        data_frame_tag_columns=['device_no', 'car_type'])
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def main():
+    """메인 실행 함수 (BMS 데이터 조회 -> 주행/일별 적분 -> InfluxDB 기록)"""
+    print("=== 주행/일별 에너지 적분 시작 ===")
+
+    start = get_option(sys.argv, '--start', '2022-01-01T00:00:00Z')
+    stop = get_option(sys.argv, '--stop', '2024-01-01T00:00:00Z')
+
+    client = energy.get_influx_client()
+    try:
+        df = energy.fetch_energy_frame(client, start, stop)
+        trips, daily = integrate_energy(df)
+        if trips is None:
+            print("BMS 데이터를 찾을 수 없습니다.")
+            return
+
+        print(f"주행 {len(trips)}건, 차량-일 {len(daily)}건")
+        print(f"총 방전 에너지: {trips['energy_out_kwh'].sum():.1f}kWh, "
+              f"평균 전비: {daily['kwh_per_km'].median():.3f}kWh/km (일별 중앙값)")
+
+        if '--dry-run' not in sys.argv:
+            write_energy_aggregates(client, trips, daily)
+            print(f"energy_trip / energy_daily 기록 완료 ({datetime.now(timezone.utc).isoformat()})")
+    finally:
+        client.close()
+
+    print("\n=== 에너지 적분 완료 ===")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+에너지 소비 모델 학습용 층화 저수지(reservoir) 표본 추출
+
+InfluxDB 시간 구간 / 로컬 Parquet 파일 / 특성 저장소 파티션을 청크 단위로 읽으면서
+층(차종, 월, 충방전 상태)마다 최대 size개 행을 균등 무작위로 유지한다.
+메모리에는 저수지와 현재 청크 하나만 올라가므로 전체 데이터 크기와 무관하다.
+
+행마다 균등 난수 키를 붙이고 층별로 키가 작은 size개만 남기는 방식(bottom-k)이라
+청크 순서와 관계없이 전체 데이터에서 비복원 균등 추출한 것과 같다.
+표본에는 층별 (전체 행 수 / 표본 행 수)를 sample_weight로 붙여 모집단 분포를 복원할 수 있게 한다.
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+import energy_consumption_xgboost as energy
+
+DEFAULT_SAMPLE_SIZE = 20000
+DEFAULT_CHUNK_DAYS = 7
+
+# 층 키 컬럼 (표본 반환 시 제거)
+STRATUM_COLUMNS = ['stratum_car_type', 'stratum_month', 'charge_state']
+
+def stratum_frame(df):
+    """층 키 (차종 코드, 연*12+월, 충방전 상태: 전류 부호 -1 방전 / 0 정지 / 1 충전)"""
+    times = pd.to_datetime(df['time']).dt
+    return pd.DataFrame({
+        'stratum_car_type': df['car_type_encoded'].to_numpy(dtype=np.int8),
+        'stratum_month': (times.year * 12 + times.month - 1).to_numpy(dtype=np.int32),
+        'charge_state': np.sign(df['pack_current'].to_numpy()).astype(np.int8)
+    }, index=df.index)
+
+class StratifiedReservoir:
+    """층별 크기 size의 저수지 표본 (청크 단위 갱신)"""
+
+    def __init__(self, size=DEFAULT_SAMPLE_SIZE, columns=None, seed=42):
+        self.size = size
+        self.columns = columns or ['time', 'device_no', *energy.FEATURE_COLUMNS, energy.TARGET_COLUMN]
+        self._rng = np.random.default_rng(seed)
+        self._reservoir = None
+        self._seen = None
+        self.rows = 0
+
+    def update(self, df):
+        """청크 1개 반영 (df: add_energy_features 결과)"""
+        if df is None or df.empty:
+            return
+        self.rows += len(df)
+
+        chunk = pd.concat([df[self.columns].reset_index(drop=True), stratum_frame(df).reset_index(drop=True)], axis=1)
+        chunk['_key'] = self._rng.random(len(chunk))
+
+        # 층별 전체 행 수 누적
+        seen = chunk.groupby(STRATUM_COLUMNS, sort=False).size()
+        self._seen = seen if self._seen is None else self._seen.add(seen, fill_value=0)
+
+        # 이미 가득 찬 층은 현재 최대 키보다 작은 행만 후보 (대부분의 행을 병합 전에 제외)
+        if self._reservoir is not None:
+            full = self._reservoir.groupby(STRATUM_COLUMNS, sort=False)['_key'].agg(['size', 'max'])
+            full = full.loc[full['size'] >= self.size, 'max'].rename('_threshold')
+            if not full.empty:
+                threshold = chunk.join(full, on=STRATUM_COLUMNS)['_threshold'].to_numpy()
+                chunk = chunk[~(chunk['_key'].to_numpy() >= threshold)]
+            chunk = pd.concat([self._reservoir, chunk], ignore_index=True)
+
+        # 층별 키가 가장 작은 size개만 유지
+        chunk = chunk.sort_values('_key', kind='stable')
+        keep = chunk.groupby(STRATUM_COLUMNS, sort=False).cumcount().to_numpy() < self.size
+        self._reservoir = chunk[keep].reset_index(drop=True)
+
+    def summary(self):
+        """층별 전체 행 수 / 표본 행 수 (DataFrame)"""
+        if self._reservoir is None:
+            return None
+        kept = self._reservoir.groupby(STRATUM_COLUMNS, sort=False).size()
+        summary = pd.DataFrame({'seen': self._seen.astype('int64'), 'kept': kept}).sort_index()
+        summary['kept'] = summary['kept'].fillna(0).astype('int64')
+        return summary
+
+    def sample(self):
+        """표본 DataFrame (시간순, 층별 sample_weight 포함)"""
+        if self._reservoir is None:
+            return None
+        summary = self.summary()
+        weights = (summary['seen'] / summary['kept']).rename('sample_weight')
+
+        df = self._reservoir.join(weights, on=STRATUM_COLUMNS)
+        df['sample_weight'] = df['sample_weight'].astype(np.float32)
+        for col in ['device_no', 'car_type']:
+            if col in df.columns:
+                df[col] = df[col].astype(str).astype('category')
+        df = df.drop(columns=['_key', *STRATUM_COLUMNS])
+        return df.sort_values('time').reset_index(drop=True)
+
+def get_day_slices(start='2022-01-01', stop='2024-01-01', days=DEFAULT_CHUNK_DAYS):
+    """[start, stop) 구간을 days일 단위 (start, stop) Flux range 인자로 분할"""
+    bounds = list(pd.date_range(start, stop, freq=f'{days}D', tz='UTC'))
+    if bounds[-1] < pd.Timestamp(stop, tz='UTC'):
+        bounds.append(pd.Timestamp(stop, tz='UTC'))
+    return [
+        (left.strftime('%Y-%m-%dT%H:%M:%SZ'), right.strftime('%Y-%m-%dT%H:%M:%SZ'))
+        for left, right in zip(bounds[:-1], bounds[1:])
+    ]
+
+def sample_chunks(load_chunk, sources, size=DEFAULT_SAMPLE_SIZE, seed=42):
+    """sources 항목마다 load_chunk로 청크를 받아 층화 저수지 표본 추출 -> StratifiedReservoir"""
+    reservoir = StratifiedReservoir(size, seed=seed)
+    for i, source in enumerate(sources, 1):
+        reservoir.update(load_chunk(source))
+        print(f"  - 청크 {i}/{len(sources)}: 누적 {reservoir.rows}행")
+    return reservoir
+
+def load_sampled_data(size=DEFAULT_SAMPLE_SIZE, chunk_dir=None, feature_store=False, store_filter=(),
+                      chunk_days=DEFAULT_CHUNK_DAYS, seed=42):
+    """층화 표본 학습 데이터 로드
+
+    기본: InfluxDB를 chunk_days일 구간으로 조회, chunk_dir: 로컬 Parquet 파일,
+    feature_store: 특성 저장소 파티션 (store_filter = (차종 목록, 시작 월, 끝 월))
+    """
+    print(f"층화 표본 추출 중... (층별 최대 {size}행)")
+
+    client = None
+    if feature_store:
+        import energy_feature_store
+        sources = energy_feature_store.list_partition_files(*store_filter)
+        columns = ['time', 'device_no', *energy.FEATURE_COLUMNS, energy.TARGET_COLUMN]
+        load_chunk = lambda path: energy_feature_store.read_partition(path, columns)
+    elif chunk_dir:
+        sources = energy.list_chunk_files(chunk_dir)
+        load_chunk = lambda path: energy.load_file_chunk(path, compact=True)
+    else:
+        sources = get_day_slices(days=chunk_days)
+        client = energy.get_influx_client()
+
+        def load_chunk(window):
+            df = energy.fetch_energy_frame(client, *window)
+            return None if df is None else energy.add_energy_features(df, compact=True)
+
+    try:
+        reservoir = sample_chunks(load_chunk, sources, size, seed)
+    finally:
+        if client is not None:
+            client.close()
+
+    df = reservoir.sample()
+    if df is None:
+        print("표본을 추출할 데이터가 없습니다.")
+        return None
+
+    summary = reservoir.summary()
+    print(f"표본 추출 완료: 전체 {reservoir.rows}행 -> 표본 {len(df)}행 (층 {len(summary)}개)")
+    return df
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def main():
+    """메인 실행 함수 (층화 표본을 Parquet으로 저장)"""
+    print("=== 에너지 학습 데이터 층화 표본 추출 시작 ===")
+
+    output = get_option(sys.argv, '--output')
+    df = load_sampled_data(
+        size=int(get_option(sys.argv, '--sample-size', DEFAULT_SAMPLE_SIZE)),
+        chunk_dir=get_option(sys.argv, '--chunks-from'),
+        feature_store='--feature-store' in sys.argv,
+        store_filter=energy.get_store_filter(),
+        chunk_days=int(get_option(sys.argv, '--chunk-days', DEFAULT_CHUNK_DAYS))
+    )
+    if df is None:
+        return
+
+    if output:
+        df.to_parquet(output, index=False, compression='zstd')
+        print(f"표본 저장: {output}")
+
+    print("\n=== 층화 표본 추출 완료 ===")
+
+if __name__ == "__main__":
+    main()
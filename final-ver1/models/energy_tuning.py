@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+에너지 소비 XGBoost 하이퍼파라미터 탐색 (시간 제한 + successive halving)
+
+- 시간순으로 학습/검증 분할 (마지막 VALIDATION_RATIO 구간이 검증)
+- 후보 설정을 프로세스 풀에서 병렬 평가, 검증 RMSE 기준 조기 종료
+- 단계(rung)마다 부스팅 라운드를 ETA배 늘리고 상위 1/ETA 후보만 다음 단계로 진행
+- 전체 제한 시간이 지나면 학습 중인 후보도 다음 라운드에서 멈추고, 완료된 결과로 최적 설정 결정
+- 최적 설정은 검증 정확도와 함께 학습 시간, 예측 지연시간(행당)을 기록
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import energy_consumption_xgboost as energy
+
+SEARCH_RESULT_PATH = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/energy_xgboost_search.json'
+
+VALIDATION_RATIO = 0.2
+EARLY_STOPPING_ROUNDS = 20
+ETA = 3
+
+# 탐색 공간
+SEARCH_SPACE = {
+    'max_depth': [4, 6, 8, 10],
+    'learning_rate': [0.03, 0.05, 0.1, 0.2],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'min_child_weight': [1, 5, 10],
+    'reg_lambda': [1.0, 5.0],
+}
+
+# 워커 프로세스별 학습/검증 데이터 (initializer에서 한 번만 설정)
+_search_data = {}
+
+class _DeadlineCallback(xgb.callback.TrainingCallback):
+    """제한 시각이 지나면 부스팅 중단"""
+
+    def __init__(self, deadline):
+        super().__init__()
+        self.deadline = deadline
+
+    def after_iteration(self, model, epoch, evals_log):
+        return time.time() >= self.deadline
+
+def _init_search_worker(X_train, y_train, X_val, y_val, nthread):
+    _search_data.update(X_train=X_train, y_train=y_train, X_val=X_val, y_val=y_val, nthread=nthread)
+
+def _evaluate_candidate(task):
+    """후보 1개를 n_rounds 라운드 한도로 학습/검증 (워커 프로세스)"""
+    candidate_id, params, n_rounds, deadline = task
+    if time.time() >= deadline:
+        return None
+
+    data = _search_data
+    model = xgb.XGBRegressor(
+        **params,
+        n_estimators=n_rounds,
+        tree_method='hist',
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        eval_metric='rmse',
+        callbacks=[_DeadlineCallback(deadline)],
+        random_state=42,
+        n_jobs=data['nthread']
+    )
+
+    start = time.perf_counter()
+    model.fit(data['X_train'], data['y_train'], eval_set=[(data['X_val'], data['y_val'])], verbose=False)
+    fit_s = time.perf_counter() - start
+
+    # 최적 라운드까지만 사용한 검증 예측 (행당 지연시간 측정)
+    booster = model.get_booster()
+    boosted_rounds = booster.num_boosted_rounds()
+    best_iteration = min(int(getattr(model, 'best_iteration', boosted_rounds - 1)), boosted_rounds - 1)
+    start = time.perf_counter()
+    predictions = booster.inplace_predict(data['X_val'], iteration_range=(0, best_iteration + 1))
+    predict_s = time.perf_counter() - start
+
+    errors = predictions - data['y_val']
+    return {
+        'candidate_id': candidate_id,
+        'params': params,
+        'max_rounds': n_rounds,
+        'best_iteration': best_iteration,
+        'val_rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'val_mae': float(np.mean(np.abs(errors))),
+        'fit_s': round(fit_s, 3),
+        'predict_us_per_row': round(predict_s / len(errors) * 1e6, 4),
+        'hit_deadline': time.time() >= deadline
+    }
+
+def sample_candidates(n_candidates, seed=42):
+    """탐색 공간에서 중복 없이 후보 설정 추출"""
+    rng = np.random.default_rng(seed)
+    candidates = []
+    seen = set()
+    total = int(np.prod([len(values) for values in SEARCH_SPACE.values()]))
+    while len(candidates) < min(n_candidates, total):
+        params = {name: values[rng.integers(len(values))] for name, values in SEARCH_SPACE.items()}
+        params = {name: value.item() if hasattr(value, 'item') else value for name, value in params.items()}
+        key = tuple(sorted(params.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+    return candidates
+
+def time_split(df, feature_columns, target_column, validation_ratio=VALIDATION_RATIO):
+    """시간순 학습/검증 분할 -> (X_train, y_train, X_val, y_val) float32 배열"""
+    df = df.sort_values('time')
+    split = int(len(df) * (1 - validation_ratio))
+    X = df[feature_columns].to_numpy(dtype=np.float32)
+    y = df[target_column].to_numpy(dtype=np.float32)
+    return X[:split], y[:split], X[split:], y[split:]
+
+def run_search(df, budget_s=600, n_candidates=27, min_rounds=50, max_rounds=1000, workers=None,
+               feature_columns=None, target_column=None):
+    """시간 제한 successive halving 탐색 -> 결과 보고서(dict)"""
+    feature_columns = feature_columns or energy.FEATURE_COLUMNS
+    target_column = target_column or energy.TARGET_COLUMN
+    workers = workers or min(4, os.cpu_count())
+    nthread = max(1, os.cpu_count() // workers)
+
+    started = time.time()
+    deadline = started + budget_s
+
+    X_train, y_train, X_val, y_val = time_split(df, feature_columns, target_column)
+    candidates = sample_candidates(n_candidates)
+
+    # 단계별 라운드 한도: min_rounds * ETA^k (마지막은 max_rounds)
+    rung_rounds = []
+    rounds = min_rounds
+    while rounds < max_rounds:
+        rung_rounds.append(rounds)
+        rounds *= ETA
+    rung_rounds.append(max_rounds)
+
+    print(f"하이퍼파라미터 탐색 중... (후보 {len(candidates)}개, 단계 {rung_rounds}, "
+          f"제한 {budget_s}초, 워커 {workers}개 x 스레드 {nthread}개)")
+
+    alive = list(range(len(candidates)))
+    rungs = []
+    best = None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker,
+                             initargs=(X_train, y_train, X_val, y_val, nthread)) as executor:
+        for n_rounds in rung_rounds:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not alive:
+                break
+
+            try:
+                futures = {
+                    executor.submit(_evaluate_candidate, (i, candidates[i], n_rounds, deadline)): i
+                    for i in alive
+                }
+            except BrokenProcessPool as e:
+                # 워커 프로세스가 비정상 종료되면 풀을 더 쓸 수 없으므로 완료된 단계 결과로 종료
+                print(f"  - 프로세스 풀 종료로 탐색 중단: {e}")
+                break
+            done, not_done = wait(futures, timeout=remaining + 5)
+            for future in not_done:
+                future.cancel()
+
+            # 워커에서 실패한 후보(잘못된 설정, 메모리 부족, 풀 종료 등)는 제한 시간을 넘긴 후보처럼 탈락
+            results = []
+            for future in done:
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  - 후보 {futures[future]} 평가 실패 ({n_rounds}라운드, {candidates[futures[future]]}): "
+                          f"{type(e).__name__}: {e}")
+                    continue
+                if result is not None:
+                    results.append(result)
+            if not results:
+                break
+
+            results.sort(key=lambda r: r['val_rmse'])
+            rungs.append({
+                'max_rounds': n_rounds,
+                'evaluated': len(results),
+                'best_val_rmse': round(results[0]['val_rmse'], 6),
+                'results': results
+            })
+            # 제한 시간에 걸려 덜 학습된 단계가 이전 단계보다 나쁠 수 있으므로 전체 최저값 유지
+            if best is None or results[0]['val_rmse'] < best['val_rmse']:
+                best = results[0]
+            print(f"  - {n_rounds}라운드: {len(results)}개 평가, 최저 RMSE {results[0]['val_rmse']:.4f}")
+
+            # 상위 1/ETA 후보만 다음 단계로
+            alive = [r['candidate_id'] for r in results[:max(1, len(results) // ETA)]]
+
+    elapsed = time.time() - started
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'budget_s': budget_s,
+        'elapsed_s': round(elapsed, 3),
+        'train_rows': len(y_train),
+        'validation_rows': len(y_val),
+        'feature_columns': list(feature_columns),
+        'target_column': target_column,
+        'search_space': SEARCH_SPACE,
+        'rungs': rungs,
+        'best': best
+    }
+    return report
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def main():
+    """메인 실행 함수"""
+    print("=== 에너지 소비 XGBoost 하이퍼파라미터 탐색 시작 ===")
+
+    if '--feature-store' in sys.argv:
+        df = energy.load_feature_store_data()
+    else:
+        df = energy.load_and_prepare_data(compact=True)
+    if df is None:
+        print("데이터 로드 실패")
+        return
+
+    workers = get_option(sys.argv, '--workers')
+    report = run_search(
+        df,
+        budget_s=float(get_option(sys.argv, '--budget', 600)),
+        n_candidates=int(get_option(sys.argv, '--candidates', 27)),
+        min_rounds=int(get_option(sys.argv, '--min-rounds', 50)),
+        max_rounds=int(get_option(sys.argv, '--max-rounds', 1000)),
+        workers=int(workers) if workers else None
+    )
+
+    best = report['best']
+    if best is None:
+        print("제한 시간 안에 평가를 마친 후보가 없습니다.")
+        return
+
+    output = get_option(sys.argv, '--output', SEARCH_RESULT_PATH)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n최적 설정: {best['params']} (라운드 {best['best_iteration'] + 1})")
+    print(f"검증 RMSE {best['val_rmse']:.4f}kW, MAE {best['val_mae']:.4f}kW, "
+          f"학습 {best['fit_s']}초, 예측 {best['predict_us_per_row']}µs/행")
+    print(f"탐색 결과 저장: {output} (소요 {report['elapsed_s']}초)")
+
+    # 최적 설정으로 전체 데이터 재학습 후 등록
+    if '--save-best' in sys.argv:
+        params = {**best['params'], 'n_estimators': best['best_iteration'] + 1}
+        model, feature_columns = energy.train_xgboost_model(df, params=params)
+        training_window = {
+            'start': df['time'].min().isoformat(),
+            'end': df['time'].max().isoformat()
+        }
+        energy.save_model(model, feature_columns, training_window)
+
+    print("\n=== 하이퍼파라미터 탐색 완료 ===")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+SOH 예측 결과 캐시 (SQLite, TTL + LRU 제거)
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+class ForecastCache:
+    """(모델 버전, device_no, 예측 일수, 마지막 데이터 시각) 키 기반 예측 결과 캐시
+
+    - TTL이 지난 항목은 조회 시 만료 처리
+    - 항목 수가 max_entries를 넘으면 가장 오래 조회되지 않은 항목부터 제거 (LRU)
+    - 적중/미적중 카운터는 파일에 누적되어 단발 실행 간에도 유지
+    """
+
+    def __init__(self, db_path, max_entries=5000, ttl_seconds=24 * 60 * 60):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS forecasts ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_forecasts_accessed ON forecasts (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_version, device_no, days, last_data_time):
+        return json.dumps([model_version, device_no, days, last_data_time])
+
+    def _count(self, name):
+        self._conn.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        """캐시 조회 (없거나 만료되면 None)"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM forecasts WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM forecasts WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self._count('misses')
+                return None
+
+            self._conn.execute(
+                "UPDATE forecasts SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._count('hits')
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """캐시 저장 후 크기 제한 초과분 제거"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO forecasts (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM forecasts WHERE key IN ("
+                "SELECT key FROM forecasts ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """적중/미적중 카운터 및 현재 항목 수"""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM forecasts").fetchone()[0]
+
+        hits = counters.get('hits', 0)
+        misses = counters.get('misses', 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def close(self):
+        self._conn.close()
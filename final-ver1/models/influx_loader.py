@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+InfluxDB Flux 쿼리 결과를 컬럼 단위 DataFrame으로 읽는 공용 로더
+
+query_api.query()는 포인트마다 FluxRecord 객체를 만들고, 스크립트에서 다시 dict 리스트로
+옮긴 뒤에야 DataFrame이 된다. 여기서는 CSV 응답을 그대로 스트리밍하면서 pandas CSV
+파서로 청크 단위 파싱해, 값은 float32, 태그는 category, 시간은 datetime64로 바로 만든다.
+"""
+
+import io
+import pandas as pd
+from pandas.api.types import union_categoricals
+from influxdb_client.domain.dialect import Dialect
+
+# 주석(annotation) 행 없이 헤더만 포함한 CSV
+CSV_DIALECT = Dialect(header=True, delimiter=",", annotations=[], date_time_format="RFC3339")
+
+# 한 번에 파싱할 행 수 (청크당 메모리 상한)
+DEFAULT_CHUNK_ROWS = 500_000
+
+class _FluxCsvStream(io.RawIOBase):
+    """Flux CSV 응답에서 테이블 구분용 빈 줄과 반복 헤더를 걸러 내는 스트림
+
+    스키마가 다른 테이블이 섞이면 (헤더가 달라지면) 오류를 낸다.
+    쿼리에서 keep()으로 컬럼을 고정해 한 가지 스키마만 나오도록 한다.
+    """
+
+    def __init__(self, response, block_size=1 << 20):
+        self._response = response
+        self._block_size = block_size
+        self._pending = b''
+        self._output = bytearray()
+        self._header = None
+        self._error = False
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _filter_lines(self, lines):
+        for line in lines:
+            line = line.rstrip(b'\r')
+            if not line:
+                continue
+            if self._error:
+                raise RuntimeError(f"InfluxDB 쿼리 오류: {line.decode('utf-8', 'replace')}")
+            if line.startswith(b',error,reference'):
+                self._error = True
+                continue
+            if line.startswith(b',result,table,'):
+                if self._header is None:
+                    self._header = line
+                    self._output += line + b'\n'
+                elif line != self._header:
+                    raise ValueError(f"쿼리 결과 스키마가 일정하지 않습니다: {line.decode('utf-8', 'replace')}")
+                continue
+            self._output += line + b'\n'
+
+    def _fill(self, size):
+        while len(self._output) < size and not self._eof:
+            block = self._response.read(self._block_size)
+            if not block:
+                self._eof = True
+                self._filter_lines([self._pending])
+                self._pending = b''
+                break
+            lines = (self._pending + block).split(b'\n')
+            self._pending = lines.pop()
+            self._filter_lines(lines)
+
+    def readinto(self, buffer):
+        self._fill(len(buffer))
+        size = min(len(buffer), len(self._output))
+        buffer[:size] = self._output[:size]
+        del self._output[:size]
+        return size
+
+def query_frame_chunks(client, query, tag_columns=(), value_columns=('_value',),
+                       time_columns=('_time',), chunk_rows=DEFAULT_CHUNK_ROWS, value_dtype='float32'):
+    """Flux 쿼리 결과를 타입이 지정된 DataFrame 청크로 순차 반환
+
+    tag_columns는 category, value_columns는 value_dtype(기본 float32),
+    time_columns는 UTC datetime64로 변환한다.
+    """
+    response = client.query_api().query_raw(query, dialect=CSV_DIALECT)
+    stream = io.BufferedReader(_FluxCsvStream(response))
+
+    dtypes = {col: 'category' for col in tag_columns}
+    dtypes.update({col: value_dtype for col in value_columns})
+    dtypes.update({col: str for col in time_columns})
+
+    try:
+        reader = pd.read_csv(
+            stream,
+            usecols=[*time_columns, *tag_columns, *value_columns],
+            dtype=dtypes,
+            chunksize=chunk_rows
+        )
+        for chunk in reader:
+            for col in time_columns:
+                chunk[col] = pd.to_datetime(chunk[col], utc=True, format='ISO8601')
+            yield chunk
+    except pd.errors.EmptyDataError:
+        return
+    finally:
+        response.close()
+
+def concat_frames(frames, category_columns=()):
+    """청크 DataFrame 결합 (청크마다 다른 category 값을 합쳐 category 타입 유지)"""
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return None
+
+    for col in category_columns:
+        categories = union_categoricals([frame[col] for frame in frames]).categories
+        for frame in frames:
+            frame[col] = frame[col].cat.set_categories(categories)
+
+    return pd.concat(frames, ignore_index=True)
+
+def query_frame(client, query, tag_columns=(), value_columns=('_value',),
+                time_columns=('_time',), chunk_rows=DEFAULT_CHUNK_ROWS, value_dtype='float32'):
+    """Flux 쿼리 결과 전체를 하나의 DataFrame으로 반환 (결과가 없으면 None)"""
+    chunks = query_frame_chunks(client, query, tag_columns, value_columns, time_columns,
+                                chunk_rows, value_dtype)
+    return concat_frames(chunks, tag_columns)
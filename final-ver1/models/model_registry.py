@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+버전 관리 모델 레지스트리 (Prophet JSON / XGBoost UBJSON)
+
+디렉토리 구조:
+    registry/<모델명>/CURRENT                 현재 서비스 버전 (원자적 교체)
+    registry/<모델명>/<버전>/manifest.json    버전, 학습 기간, 특성, 체크섬
+    registry/<모델명>/<버전>/<아티팩트>        model.json, model.ubj 또는 bundle.json
+    registry/<모델명>/<버전>/models/<키>.ubj  묶음(bundle) 모델의 하위 모델
+
+버전 디렉토리는 임시 디렉토리에 모두 쓴 뒤 rename으로 공개하고, 공개된 뒤에는
+수정하지 않으므로 여러 워커 프로세스가 동시에 읽어도 안전하다.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+
+REGISTRY_ROOT = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/registry'
+
+PROPHET_ARTIFACT = 'model.json'
+XGBOOST_ARTIFACT = 'model.ubj'
+XGBOOST_BUNDLE_ARTIFACT = 'bundle.json'
+
+# 프로세스 내 로드 캐시: (모델명, 버전) -> (모델, manifest)
+_loaded = {}
+_load_lock = threading.Lock()
+
+def _model_dir(name):
+    return os.path.join(REGISTRY_ROOT, name)
+
+def get_version_dir(name, version=None):
+    """버전 디렉토리 경로 (version이 없으면 현재 버전)"""
+    version = version or get_current_version(name)
+    if version is None:
+        return None
+    return os.path.join(_model_dir(name), version)
+
+def get_current_version(name):
+    """현재 서비스 중인 버전 (없으면 None)"""
+    pointer = os.path.join(_model_dir(name), 'CURRENT')
+    try:
+        with open(pointer, 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions(name):
+    """등록된 버전 목록 (오래된 순)"""
+    model_dir = _model_dir(name)
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        v for v in os.listdir(model_dir)
+        if os.path.exists(os.path.join(model_dir, v, 'manifest.json'))
+    )
+
+def _file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_version(name):
+    """새 버전을 쓸 임시 디렉토리 생성 -> (버전, 임시 디렉토리)"""
+    base_version = datetime.now().strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}"
+    version = base_version
+    
+    # 같은 프로세스가 1초 안에 여러 번 저장하면 순번을 붙여 구분
+    sequence = 1
+    while (os.path.exists(os.path.join(_model_dir(name), version))
+           or os.path.exists(os.path.join(_model_dir(name), f".staging-{version}"))):
+        version = f"{base_version}-{sequence}"
+        sequence += 1
+    
+    staging_dir = os.path.join(_model_dir(name), f".staging-{version}")
+    os.makedirs(staging_dir)
+    return version, staging_dir
+
+def commit_version(name, version, staging_dir, artifact, model_format,
+                   training_window=None, features=None, extra=None, promote=True):
+    """임시 디렉토리에 manifest를 쓰고 버전 디렉토리로 공개 (필요시 현재 버전으로 승격)"""
+    manifest = {
+        'name': name,
+        'version': version,
+        'created_at': datetime.now().isoformat(),
+        'format': model_format,
+        'artifact': artifact,
+        'checksum': _file_checksum(os.path.join(staging_dir, artifact)),
+        'training_window': training_window,
+        'features': features,
+    }
+    if extra:
+        manifest.update(extra)
+
+    with open(os.path.join(staging_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    version_dir = os.path.join(_model_dir(name), version)
+    os.rename(staging_dir, version_dir)
+
+    if promote:
+        promote_version(name, version)
+
+    return manifest
+
+def discard_version(staging_dir):
+    """실패한 임시 디렉토리 정리"""
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+def promote_version(name, version):
+    """CURRENT 포인터를 원자적으로 교체"""
+    if not os.path.exists(os.path.join(_model_dir(name), version, 'manifest.json')):
+        raise ValueError(f"등록되지 않은 버전입니다: {name}/{version}")
+
+    pointer = os.path.join(_model_dir(name), 'CURRENT')
+    tmp_pointer = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_pointer, 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    print(f"모델 승격 완료: {name} -> {version}")
+
+def load_manifest(name, version=None):
+    """버전 manifest 로드"""
+    version_dir = get_version_dir(name, version)
+    if version_dir is None:
+        raise FileNotFoundError(f"등록된 모델이 없습니다: {name}")
+    with open(os.path.join(version_dir, 'manifest.json'), 'r') as f:
+        return json.load(f)
+
+def write_prophet(model, path):
+    """Prophet 모델을 JSON으로 저장"""
+    from prophet.serialize import model_to_json
+    with open(path, 'w') as f:
+        f.write(model_to_json(model))
+
+def read_prophet(path):
+    """JSON으로 저장된 Prophet 모델 로드"""
+    from prophet.serialize import model_from_json
+    with open(path, 'r') as f:
+        return model_from_json(f.read())
+
+def _read_artifact(version_dir, manifest):
+    path = os.path.join(version_dir, manifest['artifact'])
+
+    if _file_checksum(path) != manifest['checksum']:
+        raise ValueError(f"모델 체크섬이 일치하지 않습니다: {path}")
+
+    if manifest['format'] == 'prophet-json':
+        return read_prophet(path)
+
+    if manifest['format'] == 'xgboost-ubj':
+        import xgboost as xgb
+        model = xgb.XGBRegressor()
+        model.load_model(path)
+        return model
+
+    if manifest['format'] == 'xgboost-bundle':
+        return _read_bundle(version_dir, path)
+
+    raise ValueError(f"지원하지 않는 모델 형식입니다: {manifest['format']}")
+
+def _read_bundle(version_dir, path):
+    """묶음 목록(bundle.json)의 하위 모델을 체크섬 확인 후 로드 -> {키: 모델}"""
+    import xgboost as xgb
+    with open(path, 'r') as f:
+        entries = json.load(f)['models']
+
+    models = {}
+    for key, entry in entries.items():
+        model_path = os.path.join(version_dir, entry['artifact'])
+        if _file_checksum(model_path) != entry['checksum']:
+            raise ValueError(f"모델 체크섬이 일치하지 않습니다: {model_path}")
+        model = xgb.XGBRegressor()
+        model.load_model(model_path)
+        models[key] = model
+    return models
+
+def load_model(name, version=None):
+    """모델 로드 (프로세스 내 메모이즈) -> (모델, manifest)
+
+    version이 없으면 호출 시점의 CURRENT 버전을 사용하므로, 승격된 새 버전은
+    상주 프로세스에서도 다음 호출부터 반영된다.
+    """
+    version = version or get_current_version(name)
+    if version is None:
+        raise FileNotFoundError(f"등록된 모델이 없습니다: {name}")
+
+    key = (name, version)
+    with _load_lock:
+        if key not in _loaded:
+            manifest = load_manifest(name, version)
+            _loaded[key] = (_read_artifact(get_version_dir(name, version), manifest), manifest)
+        return _loaded[key]
+
+def save_prophet_model(name, model, training_window=None, features=None, promote=True):
+    """Prophet 모델을 새 버전으로 등록"""
+    version, staging_dir = stage_version(name)
+    try:
+        write_prophet(model, os.path.join(staging_dir, PROPHET_ARTIFACT))
+        return commit_version(name, version, staging_dir, PROPHET_ARTIFACT, 'prophet-json',
+                              training_window, features, promote=promote)
+    except Exception:
+        discard_version(staging_dir)
+        raise
+
+def save_xgboost_model(name, model, feature_columns, training_window=None, promote=True):
+    """XGBoost(sklearn 래퍼) 모델을 UBJSON으로 새 버전 등록"""
+    version, staging_dir = stage_version(name)
+    try:
+        model.save_model(os.path.join(staging_dir, XGBOOST_ARTIFACT))
+        return commit_version(name, version, staging_dir, XGBOOST_ARTIFACT, 'xgboost-ubj',
+                              training_window, feature_columns, promote=promote)
+    except Exception:
+        discard_version(staging_dir)
+        raise
+
+def save_xgboost_bundle(name, models, feature_columns, training_window=None, extra=None, promote=True):
+    """여러 XGBoost 모델({키: 모델})을 한 버전으로 등록 (하위 모델은 models/<키>.ubj)"""
+    version, staging_dir = stage_version(name)
+    try:
+        os.makedirs(os.path.join(staging_dir, 'models'))
+        entries = {}
+        for key, model in models.items():
+            artifact = os.path.join('models', f"{key}.ubj")
+            path = os.path.join(staging_dir, artifact)
+            model.save_model(path)
+            entries[key] = {'artifact': artifact, 'checksum': _file_checksum(path)}
+
+        with open(os.path.join(staging_dir, XGBOOST_BUNDLE_ARTIFACT), 'w') as f:
+            json.dump({'models': entries}, f, indent=2, ensure_ascii=False)
+        return commit_version(name, version, staging_dir, XGBOOST_BUNDLE_ARTIFACT, 'xgboost-bundle',
+                              training_window, feature_columns, extra, promote)
+    except Exception:
+        discard_version(staging_dir)
+        raise
+
+def benchmark_load(name, version=None, repeat=5, pickle_path=None):
+    """최초 로드(역직렬화+체크섬)와 메모이즈된 로드 시간 비교 (초)
+
+    pickle_path를 주면 기존 pickle 파일 로드 시간도 함께 측정한다.
+    """
+    version = version or get_current_version(name)
+    manifest = load_manifest(name, version)
+    version_dir = get_version_dir(name, version)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _read_artifact(version_dir, manifest)
+    cold = (time.perf_counter() - start) / repeat
+
+    load_model(name, version)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load_model(name, version)
+    warm = (time.perf_counter() - start) / repeat
+
+    result = {'name': name, 'version': version, 'cold_load_s': cold, 'memoized_load_s': warm}
+
+    if pickle_path:
+        import pickle
+        start = time.perf_counter()
+        for _ in range(repeat):
+            with open(pickle_path, 'rb') as f:
+                pickle.load(f)
+        result['pickle_load_s'] = (time.perf_counter() - start) / repeat
+
+    return result
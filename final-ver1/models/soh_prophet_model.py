@@ -6,28 +6,42 @@ SOH 예측을 위한 Prophet 모델 학습 및 저장
 import pandas as pd
 import numpy as np
 from prophet import Prophet
-import pickle
 import os
+import sys
+import copy
+import json
+import time
+import shutil
+import resource
+import model_registry
+import influx_loader
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
 
-def load_and_prepare_data():
-    """InfluxDB에서 SOH 데이터를 로드하고 Prophet 형식으로 변환"""
-    print("InfluxDB에서 SOH 데이터 로드 중...")
-    
+MODEL_NAME = 'soh_prophet'
+
+# 증분 학습 상태 (마지막 수집 시각 + 차량별 일별 집계 테이블)
+TRAINING_STATE_DIR = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/soh_training_state'
+
+def get_influx_client():
+    """InfluxDB 클라이언트 생성"""
     # InfluxDB 연결 설정
-    from influxdb_client import InfluxDBClient, Point
-    from influxdb_client.client.write_api import SYNCHRONOUS
+    from influxdb_client import InfluxDBClient
     
     # InfluxDB 설정
     url = "http://localhost:8087"
     token = "aicar123"
     org = "keti"
+    
+    return InfluxDBClient(url=url, token=token, org=org)
+
+def fetch_soh_record_chunks():
+    """InfluxDB에서 원본 SOH 데이터를 청크 단위로 조회 (검증용 원본 경로)"""
     bucket = "aicar-bucket"
     
-    client = InfluxDBClient(url=url, token=token, org=org)
-    query_api = client.get_query_api()
+    client = get_influx_client()
     
     # SOH 데이터 쿼리
     query = f'''
@@ -36,39 +50,201 @@ def load_and_prepare_data():
       |> filter(fn: (r) => r._measurement == "aicar_bms")
       |> filter(fn: (r) => r._field == "soh")
       |> filter(fn: (r) => exists r._value)
-      |> sort(columns: ["_time"])
+      |> keep(columns: ["_time", "_value", "device_no", "car_type"])
     '''
     
-    # 데이터 조회
-    result = query_api.query(query)
-    
-    # 데이터 변환
-    data_points = []
-    for table in result:
-        for record in table.records:
-            data_points.append({
-                'ds': record.get_time(),
-                'y': float(record.get_value()),
-                'device_no': record.values.get('device_no'),
-                'car_type': record.values.get('car_type')
-            })
-    
-    if not data_points:
-        print("SOH 데이터를 찾을 수 없습니다.")
+    try:
+        for chunk in influx_loader.query_frame_chunks(client, query, tag_columns=('device_no', 'car_type')):
+            yield chunk.rename(columns={'_time': 'ds', '_value': 'y'})
+    finally:
+        client.close()
+
+def fetch_soh_records():
+    """InfluxDB에서 원본 SOH 데이터 전체 조회"""
+    df = influx_loader.concat_frames(fetch_soh_record_chunks(), ('device_no', 'car_type'))
+    if df is None:
+        return None
+    return df.sort_values('ds', ignore_index=True)
+
+def aggregate_soh_records(chunks):
+    """원본 SOH 데이터를 차량별 일별 합계/개수로 집계 (서버 집계 결과와 같은 형식)
+    
+    DataFrame 하나 또는 청크 iterable을 받아 청크별로 집계하므로 메모리는 청크 크기로 제한된다.
+    """
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    
+    partials = []
+    for chunk in chunks:
+        values = chunk.assign(y=chunk['y'].astype('float64'), ds=chunk['ds'].dt.floor('D'))
+        partials.append(values.groupby(['device_no', 'car_type', 'ds'], observed=True).agg(
+            y_sum=('y', 'sum'),
+            data_count=('y', 'count')
+        ))
+    
+    if not partials:
+        return None
+    
+    df_agg = pd.concat(partials).groupby(level=[0, 1, 2], observed=True).sum().reset_index()
+    df_agg['device_no'] = df_agg['device_no'].astype(str)
+    df_agg['car_type'] = df_agg['car_type'].astype(str)
+    return df_agg
+
+def fetch_soh_daily_aggregates(start='2022-01-01T00:00:00Z', stop='2024-01-01T00:00:00Z'):
+    """InfluxDB에서 차량별 일별 SOH 합계/개수를 서버 측에서 집계해 조회
+    
+    원본 포인트 대신 (차량 수 x 일수) 행만 전송된다. 평균 대신 합계와 개수를 받아
+    전체 차량 일별 평균이 원본 포인트 평균과 정확히 같도록 한다.
+    start/stop은 Flux range 인자 그대로 사용한다 (예: now()).
+    """
+    bucket = "aicar-bucket"
+    
+    client = get_influx_client()
+    
+    # 차량별 1일 단위 합계/개수 쿼리 (_time = 해당 일 00:00 UTC, aggregateWindow에 필요한 _start/_stop 유지)
+    query = f'''
+    data = from(bucket: "{bucket}")
+      |> range(start: {start}, stop: {stop})
+      |> filter(fn: (r) => r._measurement == "aicar_bms")
+      |> filter(fn: (r) => r._field == "soh")
+      |> filter(fn: (r) => exists r._value)
+      |> keep(columns: ["_start", "_stop", "_time", "_value", "device_no", "car_type"])
+      |> group(columns: ["device_no", "car_type"])
+    
+    sums = data
+      |> aggregateWindow(every: 1d, fn: sum, timeSrc: "_start", createEmpty: false)
+      |> set(key: "_field", value: "y_sum")
+    
+    counts = data
+      |> aggregateWindow(every: 1d, fn: count, timeSrc: "_start", createEmpty: false)
+      |> map(fn: (r) => ({{r with _value: float(v: r._value)}}))
+      |> set(key: "_field", value: "data_count")
+    
+    union(tables: [sums, counts])
+      |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+      |> group()
+    '''
+    
+    df_agg = influx_loader.query_frame(
+        client, query,
+        tag_columns=('device_no', 'car_type'),
+        value_columns=('y_sum', 'data_count'),
+        value_dtype='float64'
+    )
+    
+    client.close()
+    
+    if df_agg is None:
         return None
     
-    # DataFrame으로 변환
-    df = pd.DataFrame(data_points)
+    df_agg = df_agg.rename(columns={'_time': 'ds'})
+    df_agg['device_no'] = df_agg['device_no'].astype(str)
+    df_agg['car_type'] = df_agg['car_type'].astype(str)
+    df_agg['data_count'] = df_agg['data_count'].astype('int64')
+    return df_agg
+
+def load_training_state():
+    """저장된 일별 집계 테이블과 워터마크 로드 -> (DataFrame, 워터마크) 또는 (None, None)"""
+    state_path = os.path.join(TRAINING_STATE_DIR, 'state.json')
+    table_path = os.path.join(TRAINING_STATE_DIR, 'daily_aggregates.csv')
+    
+    if not (os.path.exists(state_path) and os.path.exists(table_path)):
+        return None, None
+    
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+    
+    df_agg = pd.read_csv(table_path, dtype={'device_no': str, 'car_type': str})
+    df_agg['ds'] = pd.to_datetime(df_agg['ds'], utc=True)
+    return df_agg, pd.Timestamp(state['watermark'])
+
+def save_training_state(df_agg):
+    """일별 집계 테이블과 워터마크(마지막 수집 일자) 저장"""
+    os.makedirs(TRAINING_STATE_DIR, exist_ok=True)
+    
+    table_path = os.path.join(TRAINING_STATE_DIR, 'daily_aggregates.csv')
+    df_agg.to_csv(table_path + '.tmp', index=False)
+    os.replace(table_path + '.tmp', table_path)
+    
+    state = {
+        'watermark': df_agg['ds'].max().isoformat(),
+        'rows': len(df_agg),
+        'updated_at': datetime.now().isoformat()
+    }
+    state_path = os.path.join(TRAINING_STATE_DIR, 'state.json')
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+def update_daily_aggregates():
+    """워터마크 이후 데이터만 조회해 저장된 일별 집계와 병합
+    
+    마지막 수집 일자는 하루가 다 차지 않았을 수 있으므로 그 날부터 다시 조회해 덮어쓴다.
+    반환값: (병합된 집계, 새로 추가된 일자 목록, 데이터가 바뀐 차량 집합)
+    상태가 없으면 전체 기간을 조회하고 모든 일자/차량을 새 데이터로 본다.
+    """
+    cached, watermark = load_training_state()
+    
+    if cached is None:
+        print("증분 학습 상태가 없어 전체 기간을 조회합니다.")
+        df_agg = fetch_soh_daily_aggregates()
+        if df_agg is None:
+            return None, [], set()
+        return df_agg, sorted(df_agg['ds'].unique()), set(df_agg['device_no'])
+    
+    refetch_start = watermark.floor('D')
+    print(f"워터마크 이후 데이터 조회: {refetch_start.isoformat()} ~ now")
+    fresh = fetch_soh_daily_aggregates(start=refetch_start.strftime('%Y-%m-%dT%H:%M:%SZ'), stop='now()')
+    
+    if fresh is None:
+        return cached, [], set()
+    
+    previous = cached[cached['ds'] >= refetch_start]
+    merged = pd.concat([cached[cached['ds'] < refetch_start], fresh], ignore_index=True)
+    merged = merged.sort_values(['device_no', 'ds'], ignore_index=True)
+    
+    new_days = sorted(set(fresh['ds']) - set(cached['ds']))
+    
+    # 다시 조회한 구간에서 값이 달라진 차량
+    compare = fresh.merge(previous, on=['device_no', 'car_type', 'ds'], how='outer',
+                          suffixes=('', '_previous'), indicator=True)
+    changed = compare[
+        (compare['_merge'] != 'both') |
+        (compare['data_count'] != compare['data_count_previous']) |
+        (compare['y_sum'] != compare['y_sum_previous'])
+    ]
+    changed_devices = set(changed['device_no'])
+    
+    print(f"새 일자 {len(new_days)}일, 변경 차량 {len(changed_devices)}대")
+    return merged, new_days, changed_devices
+
+def load_and_prepare_data(df_agg=None, raw=False):
+    """InfluxDB에서 SOH 데이터를 로드하고 Prophet 형식으로 변환
+    
+    df_agg: 차량별 일별 합계/개수 (없으면 조회)
+    raw: True면 서버 집계 대신 원본 포인트를 받아 pandas로 집계 (검증용)
+    """
+    print("InfluxDB에서 SOH 데이터 로드 중...")
+    
+    if df_agg is None:
+        if raw:
+            df_agg = aggregate_soh_records(fetch_soh_record_chunks())
+        else:
+            df_agg = fetch_soh_daily_aggregates()
+    
+    if df_agg is None:
+        print("SOH 데이터를 찾을 수 없습니다.")
+        return None
     
     # 날짜별로 그룹화하여 평균 SOH 계산 (여러 차량의 평균)
-    df['ds'] = pd.to_datetime(df['ds'])
-    df_daily = df.groupby(df['ds'].dt.date).agg({
-        'y': 'mean',
-        'device_no': 'count'
+    df_daily = df_agg.groupby('ds').agg({
+        'y_sum': 'sum',
+        'data_count': 'sum'
     }).reset_index()
     
-    df_daily.columns = ['ds', 'y', 'data_count']
-    df_daily['ds'] = pd.to_datetime(df_daily['ds'])
+    df_daily['y'] = df_daily['y_sum'] / df_daily['data_count']
+    df_daily = df_daily[['ds', 'y', 'data_count']].copy()
+    df_daily['ds'] = pd.to_datetime(df_daily['ds']).dt.tz_localize(None)
     
     # 데이터 품질 필터링 (너무 적은 데이터 포인트 제거)
     df_daily = df_daily[df_daily['data_count'] >= 5]  # 최소 5개 차량 데이터
@@ -76,15 +252,31 @@ def load_and_prepare_data():
     print(f"데이터 준비 완료: {len(df_daily)}개 일별 데이터 포인트")
     print(f"SOH 범위: {df_daily['y'].min():.2f}% ~ {df_daily['y'].max():.2f}%")
     
-    client.close()
     return df_daily
 
-def train_prophet_model(df):
-    """Prophet 모델 학습"""
-    print("Prophet 모델 학습 중...")
+def prepare_vehicle_daily_data(df_agg):
+    """차량(device_no)별 일별 평균 SOH 계산"""
+    df_vehicle = df_agg[['device_no', 'car_type', 'ds']].copy()
+    df_vehicle['y'] = df_agg['y_sum'] / df_agg['data_count']
+    df_vehicle['ds'] = pd.to_datetime(df_vehicle['ds']).dt.tz_localize(None)
+    return df_vehicle
+
+def validate_daily_aggregation():
+    """서버 집계 경로와 원본 경로의 전체 차량 일별 데이터 비교"""
+    server = load_and_prepare_data().set_index('ds')
+    raw = load_and_prepare_data(raw=True).set_index('ds')
     
-    # Prophet 모델 설정
-    model = Prophet(
+    common = server.index.intersection(raw.index)
+    max_diff = (server.loc[common, 'y'] - raw.loc[common, 'y']).abs().max()
+    count_match = (server.loc[common, 'data_count'] == raw.loc[common, 'data_count']).all()
+    
+    print(f"일수: 서버 {len(server)} / 원본 {len(raw)} / 공통 {len(common)}")
+    print(f"SOH 최대 차이: {max_diff:.6f}, 개수 일치: {count_match}")
+    return max_diff, count_match
+
+def create_prophet_model():
+    """Prophet 모델 설정"""
+    return Prophet(
         yearly_seasonality=True,    # 연간 계절성
         weekly_seasonality=False,   # 주간 계절성 (배터리는 주간 패턴이 적음)
         daily_seasonality=False,    # 일간 계절성
@@ -96,23 +288,57 @@ def train_prophet_model(df):
         interval_width=0.80,         # 예측 구간
         uncertainty_samples=1000     # 불확실성 샘플 수
     )
+
+def warm_start_params(model):
+    """학습된 Prophet 모델의 파라미터를 다음 학습의 초기값으로 추출"""
+    params = {}
+    for name in ['k', 'm', 'sigma_obs']:
+        params[name] = model.params[name][0][0]
+    for name in ['delta', 'beta']:
+        params[name] = model.params[name][0]
+    return params
+
+def train_prophet_model(df, init=None):
+    """Prophet 모델 학습 (init: 이전 모델에서 추출한 초기 파라미터)"""
+    print("Prophet 모델 학습 중...")
+    
+    # Prophet 모델 설정
+    model = create_prophet_model()
     
     # 모델 학습
-    model.fit(df)
+    if init is not None:
+        model.fit(df, init=init)
+    else:
+        model.fit(df)
     
     print("모델 학습 완료")
     return model
 
+def compute_residual_quantiles(model, df):
+    """학습 데이터 잔차 분위수 (점 예측 모드에서 예측 구간으로 사용)
+    
+    interval_width=0.80 이면 잔차의 10% / 90% 분위수를 yhat에 더해 하한/상한을 만든다.
+    """
+    point_model = copy.copy(model)
+    point_model.uncertainty_samples = 0
+    fitted = point_model.predict(df[['ds']])
+    
+    residuals = df['y'].to_numpy() - fitted['yhat'].to_numpy()
+    alpha = (1 - model.interval_width) / 2
+    return {
+        'lower': float(np.quantile(residuals, alpha)),
+        'upper': float(np.quantile(residuals, 1 - alpha))
+    }
+
 def save_model(model, model_path):
-    """학습된 모델 저장"""
+    """학습된 모델 저장 (Prophet JSON)"""
     print(f"모델 저장 중: {model_path}")
     
     # 디렉토리 생성
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
     
     # 모델 저장
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
+    model_registry.write_prophet(model, model_path)
     
     print("모델 저장 완료")
 
@@ -120,12 +346,76 @@ def load_model(model_path):
     """저장된 모델 로드"""
     print(f"모델 로드 중: {model_path}")
     
-    with open(model_path, 'rb') as f:
-        model = pickle.load(f)
+    model = model_registry.read_prophet(model_path)
     
     print("모델 로드 완료")
     return model
 
+def _fit_vehicle_shard(task):
+    """차량 1대의 Prophet 모델을 학습하고 샤드 파일로 저장 (워커 프로세스)"""
+    device_no, df_device, shard_path = task
+    
+    model = create_prophet_model()
+    model.fit(df_device[['ds', 'y']])
+    
+    model_registry.write_prophet(model, shard_path)
+    
+    return device_no, compute_residual_quantiles(model, df_device)
+
+def train_vehicle_models(df_vehicle, model_dir, workers=None, min_days=30,
+                         previous_dir=None, changed_devices=None):
+    """차량별 Prophet 모델 병렬 학습 및 샤드 저장
+    
+    일별 데이터가 min_days 미만인 차량은 학습하지 않고 인덱스에서 전체 차량 모델로 연결한다.
+    previous_dir/changed_devices가 주어지면 (증분 학습) 데이터가 바뀌지 않은 차량은
+    이전 버전의 샤드를 그대로 복사한다.
+    """
+    print(f"차량별 Prophet 모델 학습 중... (워커: {workers or os.cpu_count()}개)")
+    
+    shard_dir = os.path.join(model_dir, 'shards')
+    os.makedirs(shard_dir, exist_ok=True)
+    
+    index = {'vehicles': {}}
+    tasks = []
+    reused = 0
+    
+    previous_index = {}
+    if previous_dir and os.path.exists(os.path.join(previous_dir, 'index.json')):
+        with open(os.path.join(previous_dir, 'index.json'), 'r') as f:
+            previous_index = json.load(f)['vehicles']
+    
+    for (device_no, car_type), df_device in df_vehicle.groupby(['device_no', 'car_type']):
+        entry = {'car_type': car_type, 'days': len(df_device), 'shard': None}
+        if len(df_device) >= min_days:
+            entry['shard'] = os.path.join('shards', f"{device_no}.json")
+            shard_path = os.path.join(model_dir, entry['shard'])
+            previous_shard = os.path.join(previous_dir, entry['shard']) if previous_dir else None
+            
+            if (changed_devices is not None and device_no not in changed_devices
+                    and previous_shard and os.path.exists(previous_shard)):
+                shutil.copyfile(previous_shard, shard_path)
+                entry['residual_quantiles'] = previous_index.get(device_no, {}).get('residual_quantiles')
+                reused += 1
+            else:
+                tasks.append((device_no, df_device, shard_path))
+        index['vehicles'][device_no] = entry
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for device_no, residual_quantiles in executor.map(_fit_vehicle_shard, tasks):
+            index['vehicles'][device_no]['residual_quantiles'] = residual_quantiles
+            print(f"  - {device_no} 학습 완료")
+    
+    # 인덱스는 모든 샤드 저장 후 교체
+    index_path = os.path.join(model_dir, 'index.json')
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    
+    fallback_count = len(index['vehicles']) - len(tasks) - reused
+    print(f"차량별 모델 학습 완료: {len(tasks)}대 학습, {reused}대 이전 모델 재사용, {fallback_count}대 전체 모델 사용")
+    return index
+
 def predict_soh(model, days=30):
     """SOH 예측"""
     print(f"{days}일 후 SOH 예측 중...")
@@ -143,19 +433,219 @@ def predict_soh(model, days=30):
     print("예측 완료")
     return predictions
 
+def _backtest_fold(task):
+    """백테스트 fold 1개: cutoff까지 학습 후 예측 기간별 오차 계산 (워커 프로세스)"""
+    cutoff, df_train, df_test, horizons = task
+    
+    start = time.perf_counter()
+    model = create_prophet_model()
+    model.fit(df_train[['ds', 'y']])
+    fit_s = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    forecast = model.predict(df_test[['ds']])
+    predict_s = time.perf_counter() - start
+    
+    lead_days = ((df_test['ds'] - cutoff) / pd.Timedelta(days=1)).to_numpy()
+    actual = df_test['y'].to_numpy()
+    yhat = forecast['yhat'].to_numpy()
+    inside = (actual >= forecast['yhat_lower'].to_numpy()) & (actual <= forecast['yhat_upper'].to_numpy())
+    
+    # 예측 기간 h: cutoff 이후 1~h일 예측값 기준
+    metrics = {}
+    for h in horizons:
+        mask = lead_days <= h
+        if not mask.any():
+            continue
+        errors = np.abs(actual[mask] - yhat[mask])
+        metrics[str(h)] = {
+            'points': int(mask.sum()),
+            'mae': round(float(errors.mean()), 4),
+            'mape': round(float((errors / np.abs(actual[mask])).mean() * 100), 4),
+            'coverage': round(float(inside[mask].mean()), 4)
+        }
+    
+    return {
+        'cutoff': cutoff.strftime('%Y-%m-%d'),
+        'train_days': len(df_train),
+        'fit_s': round(fit_s, 3),
+        'predict_s': round(predict_s, 3),
+        # Linux ru_maxrss 단위는 KB (fold마다 새 프로세스이므로 fold별 최대값)
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'metrics': metrics
+    }
+
+def run_backtest(df, horizons=(7, 30, 90), n_cutoffs=10, initial_days=180, workers=None):
+    """rolling-origin 백테스트 (cutoff별 fold를 프로세스 풀에 분산)
+    
+    처음 initial_days일 이후부터 (마지막 날짜 - 최대 예측 기간)까지 n_cutoffs개의 cutoff를
+    고르게 배치하고, fold마다 create_prophet_model() 설정으로 학습/예측한다.
+    """
+    df = df.sort_values('ds').reset_index(drop=True)
+    max_horizon = max(horizons)
+    
+    first_cutoff = df['ds'].min() + timedelta(days=initial_days)
+    last_cutoff = df['ds'].max() - timedelta(days=max_horizon)
+    if last_cutoff < first_cutoff:
+        raise ValueError(f"백테스트에 필요한 기간이 부족합니다: 최소 {initial_days + max_horizon}일 필요")
+    
+    cutoffs = pd.date_range(first_cutoff, last_cutoff, periods=n_cutoffs).normalize().unique()
+    
+    tasks = []
+    for cutoff in cutoffs:
+        df_train = df[df['ds'] <= cutoff]
+        df_test = df[(df['ds'] > cutoff) & (df['ds'] <= cutoff + timedelta(days=max_horizon))]
+        tasks.append((cutoff, df_train, df_test, tuple(horizons)))
+    
+    print(f"백테스트 실행 중... (fold: {len(tasks)}개, 예측 기간: {list(horizons)}일)")
+    
+    # fold마다 새 워커 프로세스를 써서 peak RSS가 fold 단위로 측정되도록 함
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        folds = list(executor.map(_backtest_fold, tasks))
+    wall_s = time.perf_counter() - start
+    
+    summary = {}
+    for h in horizons:
+        fold_metrics = [fold['metrics'][str(h)] for fold in folds if str(h) in fold['metrics']]
+        if not fold_metrics:
+            continue
+        summary[str(h)] = {
+            'folds': len(fold_metrics),
+            'mae': round(float(np.mean([m['mae'] for m in fold_metrics])), 4),
+            'mape': round(float(np.mean([m['mape'] for m in fold_metrics])), 4),
+            'coverage': round(float(np.mean([m['coverage'] for m in fold_metrics])), 4)
+        }
+    
+    model = create_prophet_model()
+    config = {
+        name: getattr(model, name)
+        for name in ['growth', 'yearly_seasonality', 'weekly_seasonality', 'daily_seasonality',
+                     'seasonality_mode', 'changepoint_prior_scale', 'seasonality_prior_scale',
+                     'mcmc_samples', 'interval_width', 'uncertainty_samples']
+    }
+    
+    return {
+        'created_at': datetime.now().isoformat(),
+        'config': config,
+        'data_window': {
+            'start': df['ds'].min().strftime('%Y-%m-%d'),
+            'end': df['ds'].max().strftime('%Y-%m-%d'),
+            'days': len(df)
+        },
+        'horizons': list(horizons),
+        'initial_days': initial_days,
+        'wall_s': round(wall_s, 3),
+        'fit_s_mean': round(float(np.mean([f['fit_s'] for f in folds])), 3),
+        'predict_s_mean': round(float(np.mean([f['predict_s'] for f in folds])), 3),
+        'peak_rss_mb_max': max(f['peak_rss_mb'] for f in folds),
+        'summary': summary,
+        'folds': folds
+    }
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
 def main():
     """메인 실행 함수"""
     print("=== SOH Prophet 모델 학습 시작 ===")
     
-    # 1. 데이터 로드
-    df = load_and_prepare_data()
+    if '--validate-aggregation' in sys.argv:
+        validate_daily_aggregation()
+        return
+    
+    # 백테스트: 학습/저장 없이 현재 설정의 예측 정확도와 비용 측정
+    if '--backtest' in sys.argv:
+        df = load_and_prepare_data()
+        if df is None:
+            return
+        
+        horizons = [int(h) for h in get_option(sys.argv, '--horizons', '7,30,90').split(',')]
+        workers = get_option(sys.argv, '--workers')
+        report = run_backtest(
+            df, horizons,
+            n_cutoffs=int(get_option(sys.argv, '--cutoffs', 10)),
+            initial_days=int(get_option(sys.argv, '--initial-days', 180)),
+            workers=int(workers) if workers else None
+        )
+        
+        output = get_option(sys.argv, '--output')
+        if output:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"백테스트 결과 저장: {output}")
+        
+        print(json.dumps(report['summary'], indent=2, ensure_ascii=False))
+        return
+    
+    per_vehicle = '--per-vehicle' in sys.argv
+    incremental = '--incremental' in sys.argv
+    changed_devices = None
+    init = None
+    previous_version_dir = None
+    
+    # 1. 데이터 로드 (기본: 서버 측 일별 집계, --raw: 원본 포인트, --incremental: 워터마크 이후만)
+    if incremental:
+        daily_aggregates, new_days, changed_devices = update_daily_aggregates()
+        if not new_days:
+            if daily_aggregates is not None:
+                save_training_state(daily_aggregates)
+            print("새로 수집된 일자가 없어 재학습을 건너뜁니다.")
+            return
+        
+        # 이전 모델 파라미터로 warm start
+        if model_registry.get_current_version(MODEL_NAME) is not None:
+            previous_model, _ = model_registry.load_model(MODEL_NAME)
+            init = warm_start_params(previous_model)
+            previous_version_dir = model_registry.get_version_dir(MODEL_NAME)
+    elif '--raw' in sys.argv:
+        daily_aggregates = aggregate_soh_records(fetch_soh_record_chunks())
+    else:
+        daily_aggregates = fetch_soh_daily_aggregates()
+    df = load_and_prepare_data(daily_aggregates)
     
     # 2. 모델 학습
-    model = train_prophet_model(df)
+    model = train_prophet_model(df, init)
+    
+    # 3. 모델 저장 (레지스트리 새 버전, 차량별 모델도 같은 버전에 포함)
+    version, staging_dir = model_registry.stage_version(MODEL_NAME)
+    try:
+        save_model(model, os.path.join(staging_dir, model_registry.PROPHET_ARTIFACT))
+        
+        # 3-1. 차량별 모델 학습 (전체 차량 모델은 데이터가 부족한 차량의 대체 모델)
+        if per_vehicle:
+            workers = get_option(sys.argv, '--workers')
+            min_days = int(get_option(sys.argv, '--min-days', 30))
+            train_vehicle_models(
+                prepare_vehicle_daily_data(daily_aggregates), os.path.join(staging_dir, 'vehicles'),
+                int(workers) if workers else None, min_days,
+                os.path.join(previous_version_dir, 'vehicles') if previous_version_dir else None,
+                changed_devices
+            )
+        
+        training_window = {
+            'start': df['ds'].min().strftime('%Y-%m-%d'),
+            'end': df['ds'].max().strftime('%Y-%m-%d')
+        }
+        model_registry.commit_version(
+            MODEL_NAME, version, staging_dir, model_registry.PROPHET_ARTIFACT, 'prophet-json',
+            training_window, ['ds'],
+            extra={
+                'vehicle_models': per_vehicle,
+                'residual_quantiles': compute_residual_quantiles(model, df)
+            }
+        )
+    except Exception:
+        model_registry.discard_version(staging_dir)
+        raise
     
-    # 3. 모델 저장
-    model_path = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/soh_prophet_model.pkl'
-    save_model(model, model_path)
+    # 3-2. 다음 증분 학습을 위한 집계 테이블/워터마크 저장 (모델 등록 성공 후)
+    save_training_state(daily_aggregates)
     
     # 4. 예측 테스트
     predictions = predict_soh(model, days=30)
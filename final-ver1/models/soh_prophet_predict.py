@@ -1,37 +1,142 @@
 #!/usr/bin/env python3
 """
 학습된 Prophet 모델을 사용하여 SOH 예측
+
+일별 SOH 선형 추세(soh_degradation)로 먼저 예측하고, 잔차가 큰 차량만 Prophet 모델을 사용한다.
 """
 
+import os
 import sys
+import copy
 import json
-import pickle
+import time
+import threading
+from functools import lru_cache
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from influxdb_client import InfluxDBClient
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from influxdb_client import InfluxDBClient, Point, WriteOptions
+from forecast_cache import ForecastCache
+import model_registry
+import influx_loader
+import soh_degradation
+
+MODEL_NAME = 'soh_prophet'
+FORECAST_CACHE_PATH = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/soh_forecast_cache.sqlite'
+
+# 예측 구간 계산 방식별 Prophet 불확실성 샘플 수
+# (point: 샘플링 없이 yhat만 계산하고, 모델과 함께 저장된 학습 잔차 분위수로 구간 생성)
+INTERVAL_MODES = {'full': 1000, 'reduced': 100, 'point': 0}
+DEFAULT_INTERVAL_MODE = 'full'
 
 def load_model():
-    """학습된 Prophet 모델 로드"""
-    model_path = '/mnt/hdd1/jihye0e/aicar-preprocessing/v0-battery/models/soh_prophet_model.pkl'
-    
+    """학습된 Prophet 모델 로드 (레지스트리 현재 버전, 프로세스 내 메모이즈)"""
     try:
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
+        model, _ = model_registry.load_model(MODEL_NAME)
         return model
     except FileNotFoundError:
         print(json.dumps({"error": "모델 파일을 찾을 수 없습니다. 먼저 모델을 학습시켜주세요."}))
         sys.exit(1)
 
-def get_vehicle_soh_history(device_no):
-    """특정 차량의 SOH 히스토리 가져오기"""
+@lru_cache(maxsize=8)
+def _load_vehicle_index(version):
+    """버전별 차량 모델 인덱스 (버전 디렉토리는 공개 후 불변)"""
+    index_path = os.path.join(model_registry.get_version_dir(MODEL_NAME, version), 'vehicles', 'index.json')
+    
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, 'r') as f:
+        return json.load(f)['vehicles']
+
+def get_vehicle_model_path(device_no, version=None):
+    """차량별 모델 샤드 경로 (샤드가 없으면 None)"""
+    version = version or model_registry.get_current_version(MODEL_NAME)
+    if version is None:
+        return None
+    
+    entry = _load_vehicle_index(version).get(device_no)
+    if entry and entry['shard']:
+        return os.path.join(model_registry.get_version_dir(MODEL_NAME, version), 'vehicles', entry['shard'])
+    
+    return None
+
+@lru_cache(maxsize=256)
+def _load_vehicle_shard(shard_path):
+    return model_registry.read_prophet(shard_path)
+
+def load_vehicle_model(device_no):
+    """차량별 Prophet 모델 로드 (해당 차량 샤드만 읽고, 없으면 전체 차량 모델 사용)"""
+    shard_path = get_vehicle_model_path(device_no)
+    
+    if shard_path is not None:
+        return _load_vehicle_shard(shard_path)
+    
+    return load_model()
+
+def get_model_version(device_no):
+    """예측 캐시 키에 사용할 모델 버전 (레지스트리 버전 + 차량 샤드 여부)"""
+    version = model_registry.get_current_version(MODEL_NAME)
+    shard_path = get_vehicle_model_path(device_no, version)
+    return f"{version}/{device_no if shard_path else 'fleet'}"
+
+def get_residual_quantiles(device_no=None):
+    """예측에 쓰일 모델(차량 샤드 또는 전체 모델)의 학습 잔차 분위수 (없으면 None)"""
+    version = model_registry.get_current_version(MODEL_NAME)
+    if version is None:
+        return None
+    
+    entry = _load_vehicle_index(version).get(device_no) if device_no else None
+    if entry and entry['shard']:
+        return entry.get('residual_quantiles')
+    
+    _, manifest = model_registry.load_model(MODEL_NAME, version)
+    return manifest.get('residual_quantiles')
+
+def prophet_forecast(model, future, interval_mode=DEFAULT_INTERVAL_MODE, residual_quantiles=None):
+    """구간 계산 방식에 따른 Prophet 예측 (yhat, yhat_lower, yhat_upper 포함)
+    
+    모델 객체는 여러 스레드가 공유하므로 샘플 수가 다르면 얕은 복사본에서 바꿔 예측한다.
+    """
+    if interval_mode not in INTERVAL_MODES:
+        raise ValueError(f"지원하지 않는 구간 계산 방식입니다: {interval_mode}")
+    
+    # 잔차 분위수가 없는 이전 버전 모델은 샘플 수를 줄인 방식으로 대체
+    if interval_mode == 'point' and residual_quantiles is None:
+        interval_mode = 'reduced'
+    
+    samples = INTERVAL_MODES[interval_mode]
+    if model.uncertainty_samples != samples:
+        model = copy.copy(model)
+        model.uncertainty_samples = samples
+    
+    forecast = model.predict(future)
+    
+    if samples == 0:
+        forecast['yhat_lower'] = forecast['yhat'] + residual_quantiles['lower']
+        forecast['yhat_upper'] = forecast['yhat'] + residual_quantiles['upper']
+    
+    return forecast
+
+def get_influx_client():
+    """InfluxDB 클라이언트 생성"""
     # InfluxDB 연결 설정
     url = "http://localhost:8087"
     token = "aicar123"
     org = "keti"
+    
+    return InfluxDBClient(url=url, token=token, org=org)
+
+def get_vehicle_soh_history(device_no, client=None):
+    """특정 차량의 SOH 히스토리 가져오기
+    
+    client를 넘기면 해당 연결을 재사용하고 닫지 않음 (서버 모드)
+    """
     bucket = "aicar-bucket"
     
-    client = InfluxDBClient(url=url, token=token, org=org)
-    query_api = client.get_query_api()
+    owns_client = client is None
+    if owns_client:
+        client = get_influx_client()
     
     # 특정 차량의 SOH 데이터 쿼리
     query = f'''
@@ -41,37 +146,131 @@ def get_vehicle_soh_history(device_no):
       |> filter(fn: (r) => r.device_no == "{device_no}")
       |> filter(fn: (r) => r._field == "soh")
       |> filter(fn: (r) => exists r._value)
+      |> keep(columns: ["_time", "_value"])
+      |> group()
       |> sort(columns: ["_time"])
     '''
     
-    # 데이터 조회
-    result = query_api.query(query)
+    # 데이터 조회 (컬럼 단위 로더)
+    try:
+        df = influx_loader.query_frame(client, query)
+    finally:
+        if owns_client:
+            client.close()
+    
+    if df is None:
+        return None
     
-    # 데이터 변환
-    data_points = []
-    for table in result:
+    # Prophet은 timezone이 있는 ds를 받지 않으므로 UTC 기준 naive 시각으로 변환
+    df['_time'] = df['_time'].dt.tz_localize(None)
+    return df.rename(columns={'_time': 'ds', '_value': 'y'})
+
+def get_last_soh_time(device_no, client):
+    """특정 차량의 마지막 SOH 데이터 시각 (캐시 키용, 1개 포인트만 조회)"""
+    bucket = "aicar-bucket"
+    query_api = client.query_api()
+    
+    query = f'''
+    from(bucket: "{bucket}")
+      |> range(start: 2022-01-01T00:00:00Z, stop: 2024-01-01T00:00:00Z)
+      |> filter(fn: (r) => r._measurement == "aicar_bms")
+      |> filter(fn: (r) => r.device_no == "{device_no}")
+      |> filter(fn: (r) => r._field == "soh")
+      |> filter(fn: (r) => exists r._value)
+      |> group()
+      |> last()
+    '''
+    
+    for table in query_api.query(query):
         for record in table.records:
-            data_points.append({
-                'ds': record.get_time(),
-                'y': float(record.get_value())
-            })
+            return record.get_time()
+    return None
+
+def get_fleet_soh_frame(client, car_type=None):
+    """전체 차량(또는 특정 차종)의 SOH 히스토리를 한 번의 그룹 쿼리로 가져오기
     
-    client.close()
+    반환값: DataFrame[device_no, car_type, ds, y] (차량별 시간순) 또는 None
+    """
+    bucket = "aicar-bucket"
+    
+    car_type_filter = f'|> filter(fn: (r) => r.car_type == "{car_type}")' if car_type else ''
     
-    if not data_points:
+    # device_no 단위로 그룹화된 SOH 데이터 쿼리
+    query = f'''
+    from(bucket: "{bucket}")
+      |> range(start: 2022-01-01T00:00:00Z, stop: 2024-01-01T00:00:00Z)
+      |> filter(fn: (r) => r._measurement == "aicar_bms")
+      |> filter(fn: (r) => r._field == "soh")
+      {car_type_filter}
+      |> filter(fn: (r) => exists r._value)
+      |> keep(columns: ["_time", "_value", "device_no", "car_type"])
+      |> group(columns: ["device_no"])
+      |> sort(columns: ["_time"])
+    '''
+    
+    df = influx_loader.query_frame(client, query, tag_columns=('device_no', 'car_type'))
+    if df is None:
         return None
     
-    # DataFrame으로 변환
-    df = pd.DataFrame(data_points)
-    df['ds'] = pd.to_datetime(df['ds'])
+    df['_time'] = df['_time'].dt.tz_localize(None)
+    return df.rename(columns={'_time': 'ds', '_value': 'y'})
+
+def get_fleet_soh_histories(client, car_type=None):
+    """차량별 SOH 히스토리 -> {device_no: (car_type, DataFrame[ds, y])}"""
+    return split_fleet_histories(get_fleet_soh_frame(client, car_type))
+
+def split_fleet_histories(df):
+    """전체 차량 SOH DataFrame을 차량별 히스토리로 분리"""
+    if df is None:
+        return {}
+    
+    histories = {}
+    for device_no, df_device in df.groupby('device_no', observed=True, sort=False):
+        histories[device_no] = (df_device['car_type'].iloc[0], df_device[['ds', 'y']].reset_index(drop=True))
     
-    return df
+    return histories
 
-def predict_soh(model, device_no, days):
-    """SOH 예측 실행"""
+def predict_soh(device_no, days, client=None, interval_mode=DEFAULT_INTERVAL_MODE):
+    """SOH 예측 실행 (선형 추세로 충분하면 Prophet 모델을 로드하지 않음)"""
     # 차량별 SOH 히스토리 가져오기
-    soh_history = get_vehicle_soh_history(device_no)
+    soh_history = get_vehicle_soh_history(device_no, client)
+    
+    return predict_soh_from_history(device_no, soh_history, days, interval_mode=interval_mode)
+
+def predict_soh_cached(device_no, days, client, cache, interval_mode=DEFAULT_INTERVAL_MODE):
+    """캐시를 거치는 SOH 예측
+    
+    마지막 데이터 시각만 조회해 캐시 키를 만들고, 적중하면 히스토리 조회와
+    예측을 모두 건너뛴다.
+    """
+    last_time = get_last_soh_time(device_no, client)
+    if last_time is None:
+        return predict_soh(device_no, days, client, interval_mode)
+    
+    model_version = f"{get_model_version(device_no)}/{interval_mode}"
+    key = cache.make_key(model_version, device_no, days, last_time.isoformat())
+    result = cache.get(key)
+    if result is not None:
+        return result
     
+    result = predict_soh(device_no, days, client, interval_mode)
+    if 'error' not in result:
+        cache.put(key, result)
+    return result
+
+def fit_vehicle_degradation(device_no, soh_history):
+    """단일 차량 SOH 히스토리의 일별 선형 추세 적합 결과 (Series)"""
+    daily = soh_degradation.daily_soh(soh_history.assign(device_no=device_no))
+    return soh_degradation.fit_degradation(daily).iloc[0]
+
+def predict_soh_from_history(device_no, soh_history, days, model=None, fit=None,
+                             interval_mode=DEFAULT_INTERVAL_MODE):
+    """조회된 SOH 히스토리로 예측 결과 생성
+    
+    선형 추세의 잔차가 작으면 그대로 선형 예측을 쓰고, 데이터가 적거나 잔차가 크면
+    Prophet으로 넘긴다 (model이 없으면 차량별 모델을 이때 로드).
+    interval_mode는 Prophet 예측 구간 계산 방식 (full / reduced / point)
+    """
     if soh_history is None or len(soh_history) < 10:
         return {
             "error": "예측을 위한 충분한 SOH 데이터가 없습니다.",
@@ -79,8 +278,23 @@ def predict_soh(model, device_no, days):
             "data_points": len(soh_history) if soh_history is not None else 0
         }
     
-    # 현재 SOH
-    current_soh = soh_history['y'].iloc[-1]
+    if fit is None:
+        fit = fit_vehicle_degradation(device_no, soh_history)
+    
+    if not soh_degradation.needs_prophet(fit):
+        # 선형 예측 (마지막 관측일 다음 날부터)
+        yhat, lower, upper = soh_degradation.project_soh(fit.to_frame().T.infer_objects(), days)
+        future_dates = pd.date_range(
+            start=pd.Timestamp(fit['last_date']) + timedelta(days=1),
+            periods=days,
+            freq='D'
+        )
+        return build_prediction_result(device_no, soh_history, days, fit, 'linear',
+                                       future_dates, yhat[0], lower[0], upper[0])
+    
+    if model is None:
+        model = load_vehicle_model(device_no)
+    
     last_date = soh_history['ds'].iloc[-1]
     
     # 미래 날짜 생성
@@ -92,27 +306,36 @@ def predict_soh(model, device_no, days):
     
     # Prophet 예측
     future = pd.DataFrame({'ds': future_dates})
-    forecast = model.predict(future)
+    residual_quantiles = get_residual_quantiles(device_no) if interval_mode == 'point' else None
+    forecast = prophet_forecast(model, future, interval_mode, residual_quantiles)
+    
+    return build_prediction_result(device_no, soh_history, days, fit, 'prophet',
+                                   forecast['ds'], forecast['yhat'].to_numpy(),
+                                   forecast['yhat_lower'].to_numpy(), forecast['yhat_upper'].to_numpy())
+
+def build_prediction_result(device_no, soh_history, days, fit, model_type, dates, yhat, lower, upper):
+    """예측값 배열과 추세 적합 결과로 응답 형식 구성"""
+    # 현재 SOH
+    current_soh = float(soh_history['y'].iloc[-1])
     
     # 예측 결과 정리
-    predictions = []
-    for i, row in forecast.iterrows():
-        predictions.append({
-            'date': row['ds'].strftime('%Y-%m-%d'),
-            'predicted_soh': round(max(0, min(100, row['yhat'])), 2),
-            'lower_bound': round(max(0, min(100, row['yhat_lower'])), 2),
-            'upper_bound': round(max(0, min(100, row['yhat_upper'])), 2),
+    yhat = np.clip(yhat, 0, 100)
+    lower = np.clip(lower, 0, 100)
+    upper = np.clip(upper, 0, 100)
+    predictions = [
+        {
+            'date': date.strftime('%Y-%m-%d'),
+            'predicted_soh': round(float(yhat[i]), 2),
+            'lower_bound': round(float(lower[i]), 2),
+            'upper_bound': round(float(upper[i]), 2),
             'days_from_now': i + 1
-        })
+        }
+        for i, date in enumerate(dates)
+    ]
     
-    # 저하율 계산
-    if len(soh_history) >= 2:
-        first_soh = soh_history['y'].iloc[0]
-        last_soh = soh_history['y'].iloc[-1]
-        days_diff = (soh_history['ds'].iloc[-1] - soh_history['ds'].iloc[0]).days
-        degradation_rate = (first_soh - last_soh) / days_diff if days_diff > 0 else 0
-    else:
-        degradation_rate = 0
+    # 저하율 (일별 SOH 선형 추세 기울기, 일당 감소량이 양수)
+    degradation_rate = -float(fit['slope'])
+    degradation_interval = [-float(fit['slope_upper']), -float(fit['slope_lower'])]
     
     # 예측 신뢰도 (데이터 포인트 수 기반)
     confidence = min(1.0, len(soh_history) / 100)  # 100개 데이터 포인트 = 100% 신뢰도
@@ -135,6 +358,11 @@ def predict_soh(model, device_no, days):
         "prediction_days": days,
         "predictions": predictions,
         "degradation_rate": round(degradation_rate, 4),
+        "degradation_rate_interval": [
+            round(v, 4) if np.isfinite(v) else None for v in degradation_interval
+        ],
+        "prediction_model": model_type,
+        "trend_rmse": round(float(fit['rmse']), 4),
         "prediction_confidence": round(confidence, 2),
         "recommendation": {
             "message": recommendation,
@@ -144,10 +372,264 @@ def predict_soh(model, device_no, days):
         "historical_data_points": len(soh_history)
     }
 
+# 배치 예측 워커 프로세스별 전체 차량 모델 (프로세스당 한 번만 로드)
+def _init_batch_worker():
+    load_model()
+
+def _forecast_vehicle(task):
+    device_no, car_type, soh_history, days, fit, interval_mode = task
+    try:
+        result = predict_soh_from_history(device_no, soh_history, days, fit=fit, interval_mode=interval_mode)
+    except Exception as e:
+        result = {"error": f"예측 중 오류 발생: {str(e)}", "device_no": device_no}
+    return car_type, result
+
+def write_fleet_forecasts(client, results, run_time, interval_mode=DEFAULT_INTERVAL_MODE):
+    """배치 예측 결과를 soh_forecast / soh_forecast_summary 측정값에 일괄 기록
+    
+    요약에는 생성 시각(generated_at)과 구간 계산 방식(interval_mode)을 함께 기록해
+    조회하는 쪽이 이후 SOH 데이터가 들어왔거나 방식이 다른 예측을 걸러낼 수 있게 한다.
+    """
+    bucket = "aicar-bucket"
+    org = "keti"
+    
+    write_options = WriteOptions(batch_size=5000, flush_interval=10_000)
+    with client.write_api(write_options=write_options) as write_api:
+        for car_type, result in results:
+            device_no = result['device_no']
+            predictions = result['predictions']
+            
+            # 일별 예측값
+            points = [
+                Point("soh_forecast")
+                .tag("device_no", device_no)
+                .tag("car_type", car_type)
+                .field("predicted_soh", float(p['predicted_soh']))
+                .field("lower_bound", float(p['lower_bound']))
+                .field("upper_bound", float(p['upper_bound']))
+                .field("days_from_now", p['days_from_now'])
+                .time(datetime.strptime(p['date'], '%Y-%m-%d').replace(tzinfo=timezone.utc))
+                for p in predictions
+            ]
+            
+            # 차량별 요약 (대시보드가 최신 예측 구간을 찾는 기준, 실시간 예측 응답과 같은 항목)
+            summary = (
+                Point("soh_forecast_summary")
+                .tag("device_no", device_no)
+                .tag("car_type", car_type)
+                .field("current_soh", float(result['current_soh']))
+                .field("degradation_rate", float(result['degradation_rate']))
+                .field("prediction_confidence", float(result['prediction_confidence']))
+                .field("historical_data_points", result['historical_data_points'])
+                .field("prediction_days", result['prediction_days'])
+                .field("forecast_start", predictions[0]['date'])
+                .field("prediction_model", result['prediction_model'])
+                .field("trend_rmse", float(result['trend_rmse']))
+                .field("interval_mode", interval_mode)
+                .field("generated_at", run_time.isoformat())
+                .time(run_time)
+            )
+            # 저하율 구간은 [하한, 상한] 필드 2개로 (계산할 수 없는 쪽은 기록하지 않음)
+            lower, upper = result['degradation_rate_interval']
+            if lower is not None:
+                summary.field("degradation_rate_lower", float(lower))
+            if upper is not None:
+                summary.field("degradation_rate_upper", float(upper))
+            points.append(summary)
+            
+            write_api.write(bucket=bucket, org=org, record=points)
+
+def predict_fleet(days=30, car_type=None, workers=None, interval_mode=DEFAULT_INTERVAL_MODE):
+    """전체 차량 배치 SOH 예측 후 InfluxDB에 결과 기록
+    
+    전체 차량의 선형 추세를 한 번에 적합하고, 잔차가 큰 차량만 Prophet 프로세스 풀로 보낸다.
+    """
+    run_time = datetime.now(timezone.utc)
+    client = get_influx_client()
+    
+    try:
+        df = get_fleet_soh_frame(client, car_type)
+        histories = split_fleet_histories(df)
+        
+        fits = soh_degradation.fit_degradation(soh_degradation.daily_soh(df)) if df is not None else None
+        escalate = soh_degradation.needs_prophet(fits) if fits is not None else None
+        
+        results = []
+        tasks = []
+        for device_no, (vehicle_car_type, soh_history) in histories.items():
+            if escalate[device_no]:
+                tasks.append((device_no, vehicle_car_type, soh_history, days, fits.loc[device_no], interval_mode))
+            else:
+                results.append((vehicle_car_type,
+                                predict_soh_from_history(device_no, soh_history, days, fit=fits.loc[device_no])))
+        
+        # 선형 추세로 부족한 차량만 프로세스 풀에 분산 (워커마다 모델 1회 로드)
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+                results.extend(executor.map(_forecast_vehicle, tasks, chunksize=8))
+        
+        succeeded = [(ct, r) for ct, r in results if 'error' not in r]
+        failed = [r for _, r in results if 'error' in r]
+        
+        write_fleet_forecasts(client, succeeded, run_time, interval_mode)
+    finally:
+        client.close()
+    
+    return {
+        "car_type": car_type,
+        "prediction_days": days,
+        "vehicles": len(histories),
+        "linear": sum(1 for _, r in succeeded if r['prediction_model'] == 'linear'),
+        "prophet": sum(1 for _, r in succeeded if r['prediction_model'] == 'prophet'),
+        "written": len(succeeded),
+        "skipped": [{"device_no": r['device_no'], "error": r['error']} for r in failed]
+    }
+
+def get_prediction_days(start_date, end_date):
+    """시작/종료 날짜로 예측 일수 계산"""
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    return (end - start).days
+
+def serve(workers=4, interval_mode=DEFAULT_INTERVAL_MODE):
+    """상주 예측 서버 모드 (stdin/stdout JSON 라인 프로토콜)
+    
+    모델과 InfluxDB 클라이언트를 한 번만 준비해 두고 (차량별 샤드는 첫 요청 시 캐시),
+    한 줄에 하나씩 들어오는 {"id", "device_no", "start_date", "end_date"} 요청을 스레드 풀에서 처리한 뒤
+    {"id", "data"} 또는 {"id", "error"} 를 한 줄로 응답한다.
+    요청에 "interval_mode"가 있으면 서버 기본 구간 계산 방식 대신 사용한다.
+    {"id", "command": "cache_stats"} 요청에는 예측 캐시 적중/미적중 통계를 돌려준다.
+    처리 중인 요청 수는 workers * 2 로 제한해 호출자가 몰려도 메모리가 늘지 않게 한다.
+    """
+    load_model()
+    client = get_influx_client()
+    cache = ForecastCache(FORECAST_CACHE_PATH)
+    
+    write_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers * 2)
+    
+    def respond(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+    
+    def handle(request):
+        request_id = request.get('id')
+        try:
+            if request.get('command') == 'cache_stats':
+                respond({"id": request_id, "data": cache.stats()})
+                return
+            days = get_prediction_days(request['start_date'], request['end_date'])
+            result = predict_soh_cached(request['device_no'], days, client, cache,
+                                        request.get('interval_mode', interval_mode))
+            respond({"id": request_id, "data": result})
+        except Exception as e:
+            respond({"id": request_id, "error": f"예측 중 오류 발생: {str(e)}"})
+        finally:
+            slots.release()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                respond({"id": None, "error": "잘못된 요청 형식입니다."})
+                continue
+            
+            slots.acquire()
+            executor.submit(handle, request)
+    
+    cache.close()
+    client.close()
+
+def benchmark_interval_modes(days=30, repeat=3, device_no=None):
+    """구간 계산 방식별 예측 지연시간과 구간 정확도 비교
+    
+    - latency_s: 미래 days일 예측 평균 소요 시간
+    - coverage: 학습 데이터 중 예측 구간 안에 들어온 비율 (interval_width=0.80 이 목표)
+    - bound_error: full 방식(1000 샘플) 별도 실행 대비 하한/상한 평균 절대 차이
+    """
+    model = load_vehicle_model(device_no) if device_no else load_model()
+    residual_quantiles = get_residual_quantiles(device_no)
+    
+    history = model.history[['ds', 'y']]
+    future = pd.DataFrame({
+        'ds': pd.date_range(start=history['ds'].max() + timedelta(days=1), periods=days, freq='D')
+    })
+    reference = prophet_forecast(model, future, 'full')
+    
+    results = []
+    for mode in INTERVAL_MODES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            forecast = prophet_forecast(model, future, mode, residual_quantiles)
+        latency = (time.perf_counter() - start) / repeat
+        
+        fitted = prophet_forecast(model, history[['ds']], mode, residual_quantiles)
+        inside = (history['y'].to_numpy() >= fitted['yhat_lower'].to_numpy()) & \
+                 (history['y'].to_numpy() <= fitted['yhat_upper'].to_numpy())
+        bound_error = (
+            np.abs(forecast['yhat_lower'].to_numpy() - reference['yhat_lower'].to_numpy()).mean() +
+            np.abs(forecast['yhat_upper'].to_numpy() - reference['yhat_upper'].to_numpy()).mean()
+        ) / 2
+        
+        results.append({
+            "interval_mode": mode,
+            "uncertainty_samples": INTERVAL_MODES[mode],
+            "latency_s": round(latency, 4),
+            "coverage": round(float(inside.mean()), 4),
+            "bound_error": round(float(bound_error), 4),
+            "mean_interval_width": round(float((forecast['yhat_upper'] - forecast['yhat_lower']).mean()), 4)
+        })
+    
+    return {"device_no": device_no, "prediction_days": days, "repeat": repeat, "modes": results}
+
+def get_option(args, name, default=None):
+    """'--name value' 형태의 옵션 값 조회"""
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
 def main():
     """메인 실행 함수"""
-    if len(sys.argv) != 4:
-        print(json.dumps({"error": "사용법: python soh_prophet_predict.py <device_no> <start_date> <end_date>"}))
+    interval_mode = get_option(sys.argv, '--interval-mode', DEFAULT_INTERVAL_MODE)
+    if interval_mode not in INTERVAL_MODES:
+        print(json.dumps({"error": f"지원하지 않는 구간 계산 방식입니다: {interval_mode} ({', '.join(INTERVAL_MODES)})"}))
+        sys.exit(1)
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == '--serve':
+        workers = max(1, int(get_option(sys.argv, '--workers', 4)))
+        serve(workers, interval_mode)
+        return
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == '--batch':
+        days = int(get_option(sys.argv, '--days', 30))
+        car_type = get_option(sys.argv, '--car-type')
+        workers = get_option(sys.argv, '--workers')
+        summary = predict_fleet(days, car_type, int(workers) if workers else None, interval_mode)
+        print(json.dumps(summary, ensure_ascii=False))
+        return
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == '--benchmark-intervals':
+        days = int(get_option(sys.argv, '--days', 30))
+        repeat = int(get_option(sys.argv, '--repeat', 3))
+        report = benchmark_interval_modes(days, repeat, get_option(sys.argv, '--device'))
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == '--cache-stats':
+        cache = ForecastCache(FORECAST_CACHE_PATH)
+        print(json.dumps(cache.stats(), ensure_ascii=False))
+        cache.close()
+        return
+    
+    if len(sys.argv) not in (4, 6) or sys.argv[1].startswith('--'):
+        print(json.dumps({"error": "사용법: python soh_prophet_predict.py <device_no> <start_date> <end_date> | --serve [--workers N] | --batch [--days N] [--car-type TYPE] [--workers N] | --cache-stats | --benchmark-intervals [--days N] [--repeat N] [--device DEVICE_NO]  (공통: --interval-mode full|reduced|point)"}))
         sys.exit(1)
     
     device_no = sys.argv[1]
@@ -155,16 +637,18 @@ def main():
     end_date = sys.argv[3]
     
     # 날짜 차이 계산
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    days = (end - start).days
+    days = get_prediction_days(start_date, end_date)
     
     try:
-        # 모델 로드
-        model = load_model()
+        client = get_influx_client()
+        cache = ForecastCache(FORECAST_CACHE_PATH)
         
-        # 예측 실행
-        result = predict_soh(model, device_no, days)
+        # 예측 실행 (캐시 적중 시 모델 로드/예측 생략)
+        try:
+            result = predict_soh_cached(device_no, days, client, cache, interval_mode)
+        finally:
+            cache.close()
+            client.close()
         
         # JSON 결과 출력
         print(json.dumps(result, ensure_ascii=False))
@@ -175,4 +659,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -1,17 +1,201 @@
 import os
+import io
+import re
 import sys
+import csv
 import pandas as pd
 import numpy as np
 import json
+import time
 import pickle
+import sqlite3
+import socket
 from pathlib import Path
 
+# 물리적 범위 규칙 (위에서부터 순서대로 적용)
+# - match: 'contains'는 컬럼명(소문자)에 patterns 중 하나가 포함되면, 'exact'는 컬럼명이 patterns와 같으면 적용
+# - lower/upper: None이면 제한 없음, *_inclusive가 True면 경계값은 정상 (기본 True)
+PHYSICAL_RANGE_RULES = [
+    # BMS
+    {'category': 'bms', 'name': 'soc_soh', 'match': 'contains', 'patterns': ('soc', 'soh'), 'lower': 0, 'upper': 100},
+    {'category': 'bms', 'name': 'volt', 'match': 'contains', 'patterns': ('_volt',), 'lower': None, 'upper': 3000},
+    {'category': 'bms', 'name': 'temp', 'match': 'contains', 'patterns': ('_temp',), 'lower': -35, 'upper': 80},
+    {'category': 'bms', 'name': 'current', 'match': 'contains', 'patterns': ('_current',), 'lower': -500, 'upper': 500},
+    {'category': 'bms', 'name': 'emobility_spd', 'match': 'contains', 'patterns': ('emobility_spd',), 'lower': 0, 'upper': 180},
+    {'category': 'bms', 'name': 'cell_volt', 'match': 'contains', 'patterns': ('cell_volt_',), 'lower': 0, 'upper': 6},
+    {'category': 'bms', 'name': 'cumul', 'match': 'contains', 'patterns': ('cumul',), 'lower': None, 'upper': 1000000},
+    {'category': 'bms', 'name': 'odometer', 'match': 'contains', 'patterns': ('odometer',), 'lower': 0, 'upper': 2000000,
+     'lower_inclusive': False},
+    # GPS
+    {'category': 'gps', 'name': 'lat', 'match': 'exact', 'patterns': ('lat',), 'lower': -90, 'upper': 90},
+    {'category': 'gps', 'name': 'lng', 'match': 'exact', 'patterns': ('lng',), 'lower': -180, 'upper': 180},
+    {'category': 'gps', 'name': 'speed', 'match': 'exact', 'patterns': ('speed',), 'lower': 0, 'upper': 300},
+    {'category': 'gps', 'name': 'direction', 'match': 'exact', 'patterns': ('direction',), 'lower': 0, 'upper': 360},
+    {'category': 'gps', 'name': 'fuel_pct', 'match': 'exact', 'patterns': ('fuel_pct',), 'lower': 0, 'upper': 100},
+    {'category': 'gps', 'name': 'hdop', 'match': 'exact', 'patterns': ('hdop',), 'lower': 0, 'upper': 50},
+]
+
+def _out_of_range(values: np.ndarray, rule: dict) -> np.ndarray:
+    """규칙 범위를 벗어난 값 마스크 (NaN은 False)"""
+    mask = np.zeros(values.shape, dtype=bool)
+    if rule['lower'] is not None:
+        mask |= (values < rule['lower']) if rule.get('lower_inclusive', True) else (values <= rule['lower'])
+    if rule['upper'] is not None:
+        mask |= (values > rule['upper']) if rule.get('upper_inclusive', True) else (values >= rule['upper'])
+    return mask
+
+def _is_out_of_range(val, rule: dict) -> bool:
+    """값 1개가 규칙 범위를 벗어났는지 (_out_of_range의 스칼라 버전)"""
+    if rule['lower'] is not None:
+        if (val < rule['lower']) if rule.get('lower_inclusive', True) else (val <= rule['lower']):
+            return True
+    if rule['upper'] is not None:
+        if (val > rule['upper']) if rule.get('upper_inclusive', True) else (val >= rule['upper']):
+            return True
+    return False
+
+# Parquet 출력 파티션 (car_type=<차종>/device_no=<단말>/month=<YYYY-MM>)
+PARTITION_COLUMNS = ['car_type', 'device_no', 'month']
+CAR_TYPES = ['BONGO3', 'GV60', 'PORTER2']
+UNKNOWN_PARTITION = 'UNKNOWN'
+
+# 타임스탬프 보정 대상 컬럼 (Parquet 출력에서는 문자열이 아닌 timestamp로 저장)
+TIMESTAMP_COLUMNS = ['time', 'msg_time', 'measured_month', 'start_time']
+
+def _part_name(relative_path) -> str:
+    """입력 파일 상대 경로 -> 파티션 안의 Parquet 파일 이름 (디렉토리 구분자는 __)"""
+    return '__'.join(Path(relative_path).with_suffix('').parts) + '.parquet'
+
+class ParquetPartitionSink:
+    """Hive 파티션 Parquet 출력
+    
+    파티션마다 ParquetWriter 하나를 열어 두고 write()마다 row group을 추가한다 (zstd 압축).
+    파티션 컬럼 값은 디렉토리 이름에만 두고 파일에서는 뺀다. 파일은 임시 이름으로 쓰다가
+    close()에서 part_name으로 바꾸므로 중간에 실패한 파일은 읽히지 않는다.
+    입력 파일마다 part_name을 다르게 주면 여러 워커가 같은 파티션에 동시에 써도 충돌하지 않는다.
+    스키마는 첫 청크로 정하고, 이후 청크의 타입이 바뀌어 변환할 수 없으면 그 컬럼을 넓혀
+    (정수 -> float64, 그 외 -> string) 이미 쓴 row group을 다시 쓴다.
+    """
+    
+    def __init__(self, root_dir: str, part_name: str, partition_cols=PARTITION_COLUMNS, compression: str = 'zstd'):
+        self.root_dir = Path(root_dir)
+        self.part_name = part_name
+        self.partition_cols = list(partition_cols)
+        self.compression = compression
+        self.rows = 0
+        self._writers = {}  # 파티션 값 -> (writer, 임시 경로, 최종 경로)
+    
+    def write(self, df: pd.DataFrame):
+        """파티션 컬럼이 있는 청크를 파티션별 row group으로 추가"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        for keys, part in df.groupby(self.partition_cols, sort=False):
+            keys = keys if isinstance(keys, tuple) else (keys,)
+            data = part.drop(columns=self.partition_cols)
+            
+            entry = self._writers.get(keys)
+            if entry is None:
+                table = pa.Table.from_pandas(data, preserve_index=False)
+                # 값이 모두 비어 있는 컬럼은 이후 청크의 문자열을 받을 수 있도록 string으로 고정
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                    for field in table.schema
+                ], metadata=table.schema.metadata)
+                table = table.cast(schema)
+                
+                partition_dir = self.root_dir.joinpath(*[
+                    f"{col}={str(value).replace(os.sep, '_')}" for col, value in zip(self.partition_cols, keys)
+                ])
+                partition_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = partition_dir / f".{self.part_name}.tmp"
+                writer = pq.ParquetWriter(str(tmp_path), schema, compression=self.compression)
+                entry = self._writers[keys] = (writer, tmp_path, partition_dir / self.part_name)
+            else:
+                # 첫 청크 스키마로 맞춤 (없는 컬럼은 null, 스키마에 없는 컬럼은 값을 버리지 않고 오류)
+                names = entry[0].schema.names
+                extra_columns = [col for col in data.columns if col not in names]
+                if extra_columns:
+                    raise ValueError(f"{self.part_name} 스키마에 없는 컬럼: {extra_columns}")
+                table = self._conform(keys, pa.Table.from_pandas(data.reindex(columns=names), preserve_index=False))
+                entry = self._writers[keys]
+            
+            entry[0].write_table(table)
+            self.rows += len(part)
+    
+    def _conform(self, keys, table):
+        """청크를 파티션 writer 스키마로 변환 (변환할 수 없는 컬럼은 스키마를 넓히고 기존 row group 다시 쓰기)"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        
+        writer, tmp_path, final_path = self._writers[keys]
+        schema = writer.schema
+        columns = []
+        widened = {}
+        for field in schema:
+            column = table.column(field.name)
+            if column.type != field.type:
+                try:
+                    column = pc.cast(column, field.type)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                    numeric = pa.types.is_integer(field.type) and (
+                        pa.types.is_integer(column.type) or pa.types.is_floating(column.type))
+                    widened[field.name] = pa.float64() if numeric else pa.string()
+            columns.append(column)
+        
+        if widened:
+            print(f"⚠️ {self.part_name} 타입이 바뀐 컬럼 변환: "
+                  f"{', '.join(f'{name} -> {dtype}' for name, dtype in widened.items())}")
+            schema = pa.schema([
+                field.with_type(widened[field.name]) if field.name in widened else field
+                for field in schema
+            ], metadata=schema.metadata)
+            
+            # 지금까지 쓴 row group을 넓힌 스키마로 옮겨 쓰기
+            writer.close()
+            old_path = tmp_path.with_name(tmp_path.name + '.old')
+            os.replace(tmp_path, old_path)
+            try:
+                writer = pq.ParquetWriter(str(tmp_path), schema, compression=self.compression)
+                self._writers[keys] = (writer, tmp_path, final_path)
+                written = pq.ParquetFile(str(old_path))
+                for i in range(written.num_row_groups):
+                    writer.write_table(written.read_row_group(i).cast(schema))
+            finally:
+                old_path.unlink(missing_ok=True)
+            
+            columns = [pc.cast(column, field.type) for column, field in zip(columns, schema)]
+        
+        return pa.Table.from_arrays(columns, schema=schema)
+    
+    def close(self):
+        """모든 writer를 닫고 최종 파일 이름으로 공개"""
+        for writer, tmp_path, final_path in self._writers.values():
+            writer.close()
+            os.replace(tmp_path, final_path)
+        self._writers = {}
+    
+    def abort(self):
+        """쓰던 임시 파일 삭제"""
+        for writer, tmp_path, _ in self._writers.values():
+            try:
+                writer.close()
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        self._writers = {}
+
 class BasePreprocessor:
     """통합 전처리기"""
     
     def __init__(self):
-        self.checkpoint_file = "processing_checkpoint.json"
-        self.batch_size = 10000  # 배치 크기
+        self.checkpoint_file = "processing_checkpoint.db"
+        self.legacy_checkpoint_file = "processing_checkpoint.json"  # 이전 JSON 체크포인트 (최초 1회 가져옴)
+        self._checkpoint_db = None
+        self.batch_bytes = 64 * 1024 * 1024  # 체크포인트 처리 배치 크기 (바이트)
+        self.range_rejections = {}  # 규칙별 범위 제외 값 수 (파일 단위 누적)
+        self.last_range_rejections = {}
+        self._range_rule_cache = {}
     
     def _fix_year_vectorized(self, s: pd.Series) -> pd.Series:
         """타임스탬프 보정 - 2자리 연도를 4자리로 변환"""
@@ -45,54 +229,252 @@ class BasePreprocessor:
         
         return df
     
-    def load_checkpoint(self):
-        """체크포인트 로드"""
-        if os.path.exists(self.checkpoint_file):
-            with open(self.checkpoint_file, 'r') as f:
-                return json.load(f)
-        return {}
+    def __getstate__(self):
+        # SQLite 연결은 프로세스 간 전달하지 않음 (Ray 워커에서 다시 연결)
+        state = self.__dict__.copy()
+        state['_checkpoint_db'] = None
+        return state
+    
+    def _checkpoint_connection(self):
+        """체크포인트 DB 연결 (SQLite, 파일 키별 행)
+        
+        WAL 모드라 읽기는 쓰기와 동시에 가능하고, 여러 워커 프로세스의 쓰기는 SQLite 잠금으로
+        순서대로 반영된다 (busy_timeout 동안 대기). 같은 머신의 프로세스끼리 공유하는 용도이며
+        네트워크 파일시스템 위에 두지 않는다.
+        """
+        if self._checkpoint_db is None:
+            conn = sqlite3.connect(self.checkpoint_file, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS checkpoints ("
+                    "file_key TEXT PRIMARY KEY, status TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                # 처리 중인 파일의 소유자 (claim_file / release_claim)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS claims ("
+                    "file_key TEXT PRIMARY KEY, owner TEXT NOT NULL, claimed_at REAL NOT NULL)"
+                )
+                # 스트리밍 처리의 GPS 리스트형 컬럼 감지 누적값 (load_gps_list_stats / save_gps_list_stats)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS gps_list_stats ("
+                    "file_path TEXT PRIMARY KEY, signature TEXT NOT NULL, stats TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+            self._checkpoint_db = conn
+            self._import_legacy_checkpoint()
+        return self._checkpoint_db
+    
+    def _import_legacy_checkpoint(self):
+        """이전 JSON 체크포인트를 DB로 가져오기 (DB에 없는 키만)"""
+        try:
+            with open(self.legacy_checkpoint_file, 'r') as f:
+                legacy = json.load(f)
+        except FileNotFoundError:
+            return
+        now = time.time()
+        with self._checkpoint_db as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO checkpoints (file_key, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(key, entry.get('status'), json.dumps(entry), now) for key, entry in legacy.items()]
+            )
+        try:
+            os.replace(self.legacy_checkpoint_file, self.legacy_checkpoint_file + '.imported')
+        except FileNotFoundError:
+            pass  # 다른 워커가 먼저 가져옴
+    
+    def load_checkpoint(self, file_key: str = None):
+        """체크포인트 로드 (file_key가 있으면 해당 파일 항목만, 없으면 전체 {키: 항목})"""
+        conn = self._checkpoint_connection()
+        if file_key is not None:
+            row = conn.execute("SELECT data FROM checkpoints WHERE file_key = ?", (file_key,)).fetchone()
+            return json.loads(row[0]) if row else {}
+        return {key: json.loads(data) for key, data in conn.execute("SELECT file_key, data FROM checkpoints")}
     
     def save_checkpoint(self, checkpoint_data):
-        """체크포인트 저장"""
-        with open(self.checkpoint_file, 'w') as f:
-            json.dump(checkpoint_data, f, indent=2)
+        """체크포인트 저장 ({키: 항목}의 항목만 한 트랜잭션으로 갱신, 다른 키는 그대로)"""
+        now = time.time()
+        with self._checkpoint_connection() as conn:
+            conn.executemany(
+                "INSERT INTO checkpoints (file_key, status, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(file_key) DO UPDATE SET status = excluded.status, data = excluded.data, "
+                "updated_at = excluded.updated_at",
+                [(key, entry.get('status'), json.dumps(entry), now) for key, entry in checkpoint_data.items()]
+            )
     
-    def process_file_with_checkpoint(self, file_path: str, category: str) -> pd.DataFrame:
-        """체크포인트가 있는 파일 처리"""
-        checkpoint = self.load_checkpoint()
-        file_key = f"{category}_{os.path.basename(file_path)}"
+    def checkpoint_key(self, category: str, file_path, root_dir=None) -> str:
+        """파일 체크포인트 키 (<범주>_<root_dir 기준 상대 경로>, root_dir가 없으면 절대 경로)
         
-        # 파일 크기 확인
-        total_rows = sum(1 for _ in open(file_path)) - 1  # 헤더 제외
+        파일명만 쓰면 차종 디렉토리가 다른 같은 이름의 파일이 한 항목을 공유하므로 경로로 구분한다.
+        """
+        if root_dir is not None:
+            relative_path = Path(file_path).relative_to(Path(root_dir))
+        else:
+            relative_path = Path(os.path.abspath(file_path))
+        return f"{category}_{relative_path}"
+    
+    def is_completed(self, file_key: str, file_path: str) -> bool:
+        """파일이 완료 처리됐고 그 뒤 크기가 바뀌지 않았는지"""
+        entry = self.load_checkpoint(file_key)
+        return entry.get('status') == 'completed' and entry.get('total_bytes') == os.path.getsize(file_path)
+    
+    def mark_completed(self, file_key: str, file_path: str, output_path: str):
+        """파일 단위 처리 완료 기록"""
+        self.save_checkpoint({file_key: {
+            'status': 'completed',
+            'total_bytes': os.path.getsize(file_path),
+            'output': output_path
+        }})
+    
+    def _claim_owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+    
+    def _owner_alive(self, owner: str) -> bool:
+        """소유 프로세스가 살아 있는지 (다른 호스트의 소유자는 살아 있다고 봄)"""
+        host, _, pid = owner.rpartition(':')
+        if host != socket.gethostname():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            return True
+        return True
+    
+    def claim_file(self, file_key: str) -> bool:
+        """파일 처리 소유권 획득 (성공하면 True, 다른 실행이 처리 중이면 False)
         
-        if file_key in checkpoint:
-            processed_rows = checkpoint[file_key].get('processed_rows', 0)
-            if processed_rows >= total_rows:
+        INSERT ... ON CONFLICT DO NOTHING으로 한 실행만 행을 만들 수 있다. 이미 있는 행의 소유
+        프로세스가 종료됐으면(중단된 실행) 이전 소유자 조건을 건 UPDATE로 넘겨받으므로,
+        동시에 넘겨받으려는 실행 중에서도 하나만 성공한다.
+        """
+        conn = self._checkpoint_connection()
+        owner = self._claim_owner()
+        while True:
+            with conn:
+                inserted = conn.execute(
+                    "INSERT INTO claims (file_key, owner, claimed_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(file_key) DO NOTHING",
+                    (file_key, owner, time.time())
+                ).rowcount
+            if inserted:
+                return True
+            
+            row = conn.execute("SELECT owner FROM claims WHERE file_key = ?", (file_key,)).fetchone()
+            if row is None:
+                continue  # 그 사이 해제됨, 다시 시도
+            if row[0] == owner:
+                return True
+            if self._owner_alive(row[0]):
+                return False
+            with conn:
+                taken = conn.execute(
+                    "UPDATE claims SET owner = ?, claimed_at = ? WHERE file_key = ? AND owner = ?",
+                    (owner, time.time(), file_key, row[0])
+                ).rowcount
+            if taken:
+                print(f"🔄 {file_key} 중단된 실행({row[0]})의 소유권을 넘겨받음")
+            return bool(taken)
+    
+    def release_claim(self, file_key: str):
+        """파일 처리 소유권 해제 (자신이 소유한 경우만)"""
+        with self._checkpoint_connection() as conn:
+            conn.execute("DELETE FROM claims WHERE file_key = ? AND owner = ?", (file_key, self._claim_owner()))
+    
+    def read_header(self, file_path: str):
+        """CSV 헤더 -> (헤더 문자열, 컬럼 목록, 첫 데이터 행의 바이트 위치)"""
+        with open(file_path, 'rb') as f:
+            line = f.readline()
+        header = line.decode('utf-8-sig').rstrip('\r\n')
+        return header, next(csv.reader([header])), len(line)
+    
+    def iter_csv_batches(self, file_path: str, offset: int, columns: list):
+        """offset 바이트 위치로 바로 이동해 batch_bytes 단위로 읽기 -> (DataFrame, 다음 배치 바이트 위치)
+        
+        블록은 마지막 줄바꿈에서 잘라 행 경계를 맞추고, 남은 조각은 다음 블록 앞에 붙인다.
+        (값 안에 줄바꿈이 있는 CSV는 지원하지 않음)
+        """
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            pending = b''
+            while True:
+                block = f.read(self.batch_bytes)
+                data = pending + block
+                if len(block) < self.batch_bytes:
+                    # 파일 끝: 남은 데이터 전체 (줄바꿈 없이 끝나는 마지막 행 포함)
+                    if data.strip():
+                        yield self._parse_csv_block(data, columns), offset + len(data)
+                    return
+                
+                cut = data.rfind(b'\n') + 1
+                if cut == 0:
+                    pending = data
+                    continue
+                pending = data[cut:]
+                yield self._parse_csv_block(data[:cut], columns), offset + cut
+                offset += cut
+    
+    def _parse_csv_block(self, data: bytes, columns: list) -> pd.DataFrame:
+        return pd.read_csv(io.BytesIO(data), header=None, names=columns, low_memory=False)
+    
+    def remove_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
+        """중복 행 제거"""
+        if df.empty:
+            return df
+        return df.drop_duplicates().reset_index(drop=True)
+    
+    def process_file_with_checkpoint(self, file_path: str, category: str, root_dir: str = None) -> pd.DataFrame:
+        """체크포인트가 있는 파일 처리
+        
+        체크포인트에는 다음 배치의 바이트 위치와 헤더를 저장하고, 이어서 처리할 때는
+        그 위치로 바로 이동하므로 남은 바이트만 읽는다. 헤더가 바뀌었거나 파일이 저장된
+        위치보다 작아졌으면(교체된 파일) 처음부터 다시 처리한다.
+        GPS 리스트형 컬럼 감지 누적값(gps_list_stats)도 같은 항목에 저장해 이어서 처리할 때
+        그대로 쓰므로, 확장 폭을 정하려고 파일 앞부분을 다시 읽지 않는다.
+        체크포인트 키는 process_directory와 같은 checkpoint_key(root_dir 기준 상대 경로)다.
+        """
+        file_key = self.checkpoint_key(category, file_path, root_dir)
+        
+        header, columns, data_start = self.read_header(file_path)
+        total_bytes = os.path.getsize(file_path)
+        
+        if self.is_completed(file_key, file_path):
+            print(f"⏭️ {file_path} 이미 완료됨, 건너뛰기")
+            return pd.DataFrame()
+        
+        entry = self.load_checkpoint(file_key)
+        offset = entry.get('byte_offset')
+        processed_rows = entry.get('processed_rows', 0)
+        list_stats = entry.get('gps_list_stats', {})
+        
+        if offset is not None and entry.get('header') == header and offset <= total_bytes:
+            if offset >= total_bytes:
                 print(f"⏭️ {file_path} 이미 완료됨, 건너뛰기")
                 return pd.DataFrame()
-            print(f"🔄 {file_path} {processed_rows}행부터 이어서 처리")
+            print(f"🔄 {file_path} {offset}바이트({processed_rows}행)부터 이어서 처리")
         else:
+            if entry:
+                print(f"🆕 {file_path} 체크포인트가 현재 파일과 맞지 않아 처음부터 처리")
+            else:
+                print(f"🆕 {file_path} 새로 시작")
+            offset = data_start
             processed_rows = 0
-            print(f"🆕 {file_path} 새로 시작")
+            list_stats = {}
         
         # 배치별 처리
         all_dfs = []
-        batch_start = processed_rows
         
         try:
-            while batch_start < total_rows:
-                batch_end = min(batch_start + self.batch_size, total_rows)
-                
-                # 배치 읽기
-                df_batch = pd.read_csv(file_path, skiprows=batch_start + 1, nrows=self.batch_size, low_memory=False)
-                
-                if df_batch.empty:
-                    break
+            for df_batch, next_offset in self.iter_csv_batches(file_path, offset, columns):
+                rows = len(df_batch)
                 
                 # 전처리
                 df_batch = self.clean_data(df_batch, category)
                 if category == 'gps':
-                    df_batch = self.expand_gps_list_columns(df_batch)
+                    # 이전 배치(이전 실행 포함)까지의 감지 누적값에 이 배치를 더한 폭으로 확장
+                    self._scan_gps_list_chunk(df_batch, list_stats)
+                    df_batch = self.expand_gps_list_columns(df_batch, self._gps_list_spec(list_stats))
                 df_batch = self.validate_physical_ranges(df_batch, category)
                 df_batch = self.convert_data_types(df_batch, category)
                 df_batch = self.remove_duplicates(df_batch)
@@ -100,19 +482,26 @@ class BasePreprocessor:
                 all_dfs.append(df_batch)
                 
                 # 체크포인트 업데이트
-                checkpoint[file_key] = {
-                    'processed_rows': batch_end,
-                    'total_rows': total_rows,
-                    'status': 'in_progress' if batch_end < total_rows else 'completed'
-                }
-                self.save_checkpoint(checkpoint)
+                processed_rows += rows
+                self.save_checkpoint({file_key: {
+                    'byte_offset': next_offset,
+                    'total_bytes': total_bytes,
+                    'header': header,
+                    'processed_rows': processed_rows,
+                    'gps_list_stats': list_stats,
+                    'status': 'in_progress' if next_offset < total_bytes else 'completed'
+                }})
                 
-                print(f"✅ {file_path} {batch_end}/{total_rows} 행 처리 완료")
-                batch_start = batch_end
+                print(f"✅ {file_path} {next_offset}/{total_bytes} 바이트 ({processed_rows}행) 처리 완료")
+            
+            self.print_range_rejections(file_path)
             
             # 모든 배치 합치기
             if all_dfs:
                 result_df = pd.concat(all_dfs, ignore_index=True)
+                if category == 'gps':
+                    # 뒤 배치에서 폭이 늘었거나 새로 감지된 컬럼은 앞 배치 행도 최종 폭으로 맞춤
+                    result_df = self._reexpand_gps_list_columns(result_df, self._gps_list_spec(list_stats))
                 return result_df
             else:
                 return pd.DataFrame()
@@ -121,110 +510,213 @@ class BasePreprocessor:
             print(f"❌ {file_path} 처리 중 오류: {e}")
             return pd.DataFrame()
     
-    def expand_gps_list_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        """GPS 리스트형 컬럼 동적 확장 (NaN 패딩)"""
+    def _scan_gps_list_chunk(self, df: pd.DataFrame, stats: dict):
+        """청크 1개의 리스트형 컬럼 후보 누적 (stats: {컬럼: {'delim': 구분자, 'widths': {구분자: 최대 길이}}})
+        
+        구분자는 결측이 아닌 값 표본의 절반 넘게 포함된 첫 구분자이고, 길이는 구분자별로 모든 값에서 센다
+        (구분자가 뒤 청크에서 감지돼도 앞 청크의 긴 리스트가 폭에 반영되도록).
+        """
+        candidate_delims = [',', '|', ';']
+        for col in df.columns:
+            if df[col].dtype != 'object':
+                continue
+            values = df[col].dropna().astype(str)
+            if values.empty:
+                continue
+            col_stats = stats.setdefault(col, {'delim': None, 'widths': {}})
+            if col_stats['delim'] is None:
+                sample = values.head(50)
+                for delim in candidate_delims:
+                    if sample.str.contains(delim, regex=False).mean() > 0.5:
+                        col_stats['delim'] = delim
+                        break
+            for delim in candidate_delims:
+                width = int(values.str.count(re.escape(delim)).max()) + 1
+                col_stats['widths'][delim] = max(col_stats['widths'].get(delim, 1), width)
+    
+    def _gps_list_spec(self, stats: dict) -> dict:
+        """누적 후보 -> 확장할 컬럼 {컬럼: {'delim': 구분자, 'width': 확장 폭}} (길이 2 이상만)"""
+        list_spec = {}
+        for col, col_stats in stats.items():
+            delim = col_stats['delim']
+            if delim is not None and col_stats['widths'][delim] >= 2:
+                list_spec[col] = {'delim': delim, 'width': col_stats['widths'][delim]}
+        return list_spec
+    
+    def gps_list_stats(self, df: pd.DataFrame, chunk_size: int = 10000) -> dict:
+        """메모리에 있는 df의 리스트형 컬럼 감지 누적값 (스트리밍과 같은 chunk_size 행 단위로 감지)"""
+        stats = {}
+        for start in range(0, len(df), chunk_size):
+            self._scan_gps_list_chunk(df.iloc[start:start + chunk_size], stats)
+        return stats
+    
+    def _gps_list_signature(self, file_path: str) -> str:
+        """저장된 감지 누적값이 같은 파일 내용의 것인지 확인하는 값 (헤더 + 크기)"""
+        return f"{self.read_header(file_path)[0]}|{os.path.getsize(file_path)}"
+    
+    def load_gps_list_stats(self, file_path: str) -> dict:
+        """스트리밍 처리에서 저장한 파일의 감지 누적값 (없거나 파일이 바뀌었으면 빈 dict)"""
+        row = self._checkpoint_connection().execute(
+            "SELECT signature, stats FROM gps_list_stats WHERE file_path = ?", (os.path.abspath(file_path),)
+        ).fetchone()
+        if row is None or row[0] != self._gps_list_signature(file_path):
+            return {}
+        return json.loads(row[1])
+    
+    def save_gps_list_stats(self, file_path: str, stats: dict):
+        """파일의 감지 누적값 저장 (다음 실행이 처음부터 최종 폭으로 확장하도록)"""
+        with self._checkpoint_connection() as conn:
+            conn.execute(
+                "INSERT INTO gps_list_stats (file_path, signature, stats, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(file_path) DO UPDATE SET signature = excluded.signature, stats = excluded.stats, "
+                "updated_at = excluded.updated_at",
+                (os.path.abspath(file_path), self._gps_list_signature(file_path), json.dumps(stats), time.time())
+            )
+    
+    def expand_gps_list_columns(self, df: pd.DataFrame, list_spec: dict = None) -> pd.DataFrame:
+        """GPS 리스트형 컬럼 확장 (NaN 패딩)
+        
+        list_spec({컬럼: {'delim', 'width'}})의 폭으로 컬럼마다 str.split(expand=True)로 한 번만 분리한다.
+        없으면 df 전체에서 감지한다(gps_list_stats). 폭보다 긴 리스트가 있으면 값을 버리지 않고 ValueError.
+        """
         if df.empty:
             return df
         df = df.copy()
-        candidate_delims = [',', '|', ';']
-        object_cols = [c for c in df.columns if df[c].dtype == 'object']
-        cols_to_expand = []
-        for col in object_cols:
-            sample = df[col].dropna().astype(str).head(50)
-            if sample.empty:
+        if list_spec is None:
+            list_spec = self._gps_list_spec(self.gps_list_stats(df))
+        
+        for col, spec in list_spec.items():
+            if col not in df.columns:
                 continue
-            for delim in candidate_delims:
-                if sample.str.contains(delim).mean() > 0.5:
-                    cols_to_expand.append((col, delim))
-                    break
-        for col, delim in cols_to_expand:
+            delim, width = spec['delim'], spec['width']
             parts_series = df[col].astype(str).where(df[col].notna(), None)
-            max_len = parts_series.dropna().apply(lambda x: len(x.split(delim)) if isinstance(x, str) else 0).max()
-            if not max_len or max_len < 2:
-                continue
-            new_cols = [f"{col}_{i+1}" for i in range(max_len)]
-            for i in range(max_len):
-                df[new_cols[i]] = parts_series.apply(
-                    lambda x: (x.split(delim)[i].strip() if isinstance(x, str) and len(x.split(delim)) > i else np.nan)
-                )
+            if parts_series.notna().any():
+                parts = parts_series.str.split(delim, expand=True, regex=False)
+            else:
+                parts = pd.DataFrame(index=df.index)
+            if parts.shape[1] > width:
+                raise ValueError(f"{col} 리스트 길이 {parts.shape[1]}가 확장 폭 {width}보다 깁니다")
+            
+            for i in range(width):
+                if i < parts.shape[1]:
+                    df[f"{col}_{i+1}"] = parts[i].str.strip()
+                else:
+                    # 분리된 값과 같은 object 타입으로 패딩 (Parquet 스키마가 청크마다 같도록)
+                    df[f"{col}_{i+1}"] = pd.Series(np.nan, index=df.index, dtype=object)
             df = df.drop(columns=[col])
         return df
 
+    def _reexpand_gps_list_columns(self, df: pd.DataFrame, list_spec: dict) -> pd.DataFrame:
+        """확장 폭이 다른 배치를 이어 붙인 df를 최종 list_spec으로 맞춤
+        
+        좁은 폭으로 확장된 행은 concat에서 나머지 <컬럼>_<n>이 NaN으로 채워지므로 그대로 두고,
+        감지 전 배치에서 확장되지 않고 남은 원래 컬럼 값만 분리해 <컬럼>_<n>에 채운다.
+        """
+        for col, spec in list_spec.items():
+            if col not in df.columns:
+                continue
+            raw = df.pop(col)
+            mask = raw.notna()
+            expanded = self.expand_gps_list_columns(raw[mask].to_frame(), {col: spec})
+            for i in range(spec['width']):
+                part_col = f"{col}_{i+1}"
+                if part_col not in df.columns:
+                    df[part_col] = pd.Series(np.nan, index=df.index, dtype=object)
+                if part_col in expanded.columns:
+                    df.loc[mask, part_col] = expanded[part_col]
+        return df
+    
+    def _range_rule_columns(self, columns, category: str):
+        """범주의 규칙별 대상 컬럼 [(규칙, 컬럼 목록)] (같은 컬럼 구성이면 캐시 사용)"""
+        key = (category, tuple(columns))
+        if key not in self._range_rule_cache:
+            matched = []
+            for rule in PHYSICAL_RANGE_RULES:
+                if rule['category'] != category:
+                    continue
+                if rule['match'] == 'contains':
+                    cols = [col for col in columns if any(p in col.lower() for p in rule['patterns'])]
+                else:
+                    cols = [col for col in rule['patterns'] if col in columns]
+                if cols:
+                    matched.append((rule, cols))
+            self._range_rule_cache[key] = matched
+        return self._range_rule_cache[key]
+    
     def validate_physical_ranges(self, df: pd.DataFrame, category: str) -> pd.DataFrame:
-        """물리적 범위 검증"""
+        """물리적 범위 검증 (PHYSICAL_RANGE_RULES)
+        
+        숫자(int/float) 컬럼은 한 번에 float64 배열로 모아 규칙별 NumPy 마스크로 검증하고,
+        그 외 컬럼은 값 단위로 같은 규칙을 적용한다. 범위를 벗어난 값은 NaN으로 바꾸고
+        규칙별로 새로 제외한 값 수를 self.last_range_rejections / self.range_rejections에 기록한다.
+        """
+        self.last_range_rejections = {}
         if df.empty:
             return df
             
         df = df.copy()
         
-        if category == 'bms':
-            # SOC, SOH: 0~100%
-            soc_soh_cols = [col for col in df.columns if 'soc' in col.lower() or 'soh' in col.lower()]
-            for col in soc_soh_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val < 0 or val > 100)) else val)
-            
-            # 전압: ≤3000V
-            volt_cols = [col for col in df.columns if '_volt' in col.lower()]
-            for col in volt_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and val > 3000) else val)
-            
-            # 온도: -35~80°C
-            temp_cols = [col for col in df.columns if '_temp' in col.lower()]
-            for col in temp_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val < -35 or val > 80)) else val)
-            
-            # 전류: -500~500A
-            current_cols = [col for col in df.columns if '_current' in col.lower()]
-            for col in current_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val < -500 or val > 500)) else val)
-            
-            # 차량 속도: 0~180km/h
-            speed_cols = [col for col in df.columns if 'emobility_spd' in col.lower()]
-            for col in speed_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val < 0 or val > 180)) else val)
-            
-            # 셀 전압: 0~6V
-            cell_volt_cols = [col for col in df.columns if 'cell_volt_' in col.lower()]
-            for col in cell_volt_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val < 0 or val > 6)) else val)
-            
-            # 누적값: ≤1,000,000
-            cumul_cols = [col for col in df.columns if 'cumul' in col.lower()]
-            for col in cumul_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and val > 1000000) else val)
-            
-            # 주행거리: 0~2,000,000km
-            odo_cols = [col for col in df.columns if 'odometer' in col.lower()]
-            for col in odo_cols:
-                df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and (val <= 0 or val > 2000000)) else val)
+        rule_columns = self._range_rule_columns(df.columns, category)
+        if not rule_columns:
+            return df
         
-        elif category == 'gps':
-            # 위도: -90~90
-            if 'lat' in df.columns:
-                df['lat'] = df['lat'].apply(lambda x: np.nan if pd.notna(x) and (x < -90 or x > 90) else x)
-            
-            # 경도: -180~180
-            if 'lng' in df.columns:
-                df['lng'] = df['lng'].apply(lambda x: np.nan if pd.notna(x) and (x < -180 or x > 180) else x)
-            
-            # 속도: 0~300km/h
-            if 'speed' in df.columns:
-                df['speed'] = df['speed'].apply(lambda x: np.nan if pd.notna(x) and (x < 0 or x > 300) else x)
+        # 숫자 컬럼 / 값 단위 검증 컬럼 분리
+        target_cols = list(dict.fromkeys(col for _, cols in rule_columns for col in cols))
+        numeric_cols = [col for col in target_cols if df[col].dtype.kind in 'if' and isinstance(df[col].dtype, np.dtype)]
+        other_cols = [col for col in target_cols if col not in set(numeric_cols)]
+        counts = {rule['name']: 0 for rule, _ in rule_columns}
+        
+        if numeric_cols:
+            position = {col: i for i, col in enumerate(numeric_cols)}
+            block = df[numeric_cols].to_numpy(dtype='float64', copy=True)
+            rejected = np.zeros(block.shape, dtype=bool)
             
-            # 방향: 0~360
-            if 'direction' in df.columns:
-                df['direction'] = df['direction'].apply(lambda x: np.nan if pd.notna(x) and (x < 0 or x > 360) else x)
+            # 규칙 순서대로 적용 (앞 규칙에서 이미 제외된 값은 뒤 규칙에서 세지 않음)
+            for rule, cols in rule_columns:
+                idx = [position[col] for col in cols if col in position]
+                if not idx:
+                    continue
+                mask = _out_of_range(block[:, idx], rule) & ~rejected[:, idx]
+                counts[rule['name']] += int(mask.sum())
+                rejected[:, idx] |= mask
             
-            # 연료퍼센트: 0~100
-            if 'fuel_pct' in df.columns:
-                df['fuel_pct'] = df['fuel_pct'].apply(lambda x: np.nan if pd.notna(x) and (x < 0 or x > 100) else x)
+            block[rejected] = np.nan
             
-            # HDOP: 0~50
-            if 'hdop' in df.columns:
-                df['hdop'] = df['hdop'].apply(lambda x: np.nan if pd.notna(x) and (x < 0 or x > 50) else x)
+            # float 컬럼과 제외 값이 있는 int 컬럼은 float64로, 나머지 int 컬럼은 int64로
+            has_rejected = rejected.any(axis=0)
+            write_cols = [col for col in numeric_cols if df[col].dtype.kind == 'f' or has_rejected[position[col]]]
+            if write_cols:
+                df[write_cols] = block[:, [position[col] for col in write_cols]]
+            for col in numeric_cols:
+                if col not in write_cols and df[col].dtype != np.int64:
+                    df[col] = df[col].astype('int64')
+        
+        # 문자열/혼합형 컬럼: 값 단위 적용 (bms는 숫자 값만, gps는 결측이 아닌 값만 검사)
+        for rule, cols in rule_columns:
+            for col in cols:
+                if col not in other_cols:
+                    continue
+                before = df[col].isna()
+                if category == 'bms':
+                    df[col] = df[col].map(lambda val: np.nan if (isinstance(val, (int, float)) and _is_out_of_range(val, rule)) else val)
+                else:
+                    df[col] = df[col].map(lambda val: np.nan if pd.notna(val) and _is_out_of_range(val, rule) else val)
+                counts[rule['name']] += int((df[col].isna() & ~before).sum())
+        
+        self.last_range_rejections = counts
+        for name, count in counts.items():
+            self.range_rejections[name] = self.range_rejections.get(name, 0) + count
         
         return df
     
+    def print_range_rejections(self, file_path: str):
+        """파일 처리 중 누적된 규칙별 범위 제외 값 수 출력 후 초기화"""
+        rejections = {name: count for name, count in self.range_rejections.items() if count}
+        if rejections:
+            summary = ', '.join(f"{name} {count}개" for name, count in rejections.items())
+            print(f"🔎 {file_path} 범위 검증 제외: {summary}")
+        self.range_rejections = {}
+    
     def convert_data_types(self, df: pd.DataFrame, category: str) -> pd.DataFrame:
         """데이터 타입 변환 - 우리 코드의 장점"""
         if df.empty:
@@ -264,82 +756,196 @@ class BasePreprocessor:
         
         return df
     
+    def add_partition_columns(self, df: pd.DataFrame, file_path: str = '') -> pd.DataFrame:
+        """Parquet 파티션 컬럼(car_type, device_no, month) 추가
+        
+        car_type은 컬럼이 있으면 그 값, 없으면 파일 경로의 차종 이름을 쓰고,
+        month는 time(없으면 msg_time) 컬럼의 연-월이다. 알 수 없는 값은 UNKNOWN.
+        TIMESTAMP_COLUMNS는 process_file과 같이 _fix_year_vectorized로 변환해, 스트리밍 경로
+        (convert_data_types가 문자열로 둔 값)와 Ray 경로가 같은 timestamp 스키마로 저장되게 한다.
+        """
+        df = df.copy()
+        
+        for col in TIMESTAMP_COLUMNS:
+            if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = self._fix_year_vectorized(df[col])
+        
+        if 'car_type' in df.columns:
+            df['car_type'] = df['car_type'].astype('object').where(df['car_type'].notna(), UNKNOWN_PARTITION).astype(str)
+        else:
+            df['car_type'] = next((ct for ct in CAR_TYPES if ct in str(file_path)), UNKNOWN_PARTITION)
+        
+        if 'device_no' in df.columns:
+            df['device_no'] = df['device_no'].astype('object').where(df['device_no'].notna(), UNKNOWN_PARTITION).astype(str)
+        else:
+            df['device_no'] = UNKNOWN_PARTITION
+        
+        time_col = next((col for col in ['time', 'msg_time'] if col in df.columns), None)
+        if time_col is not None:
+            df['month'] = df[time_col].dt.strftime('%Y-%m').fillna(UNKNOWN_PARTITION)
+        else:
+            df['month'] = UNKNOWN_PARTITION
+        
+        return df
+    
+    def _expand_gps_chunk(self, chunk_df: pd.DataFrame, list_stats: dict, written: bool):
+        """스트리밍 청크의 GPS 리스트 컬럼 확장 -> (확장된 청크, 처음부터 다시 처리해야 하는지)
+        
+        list_stats에 이 청크를 누적한 뒤 그 폭으로 확장한다. 이미 저장한 청크가 있는데 폭이 늘거나
+        새 컬럼이 감지되면 앞 청크와 컬럼이 달라지므로, 누적값을 저장하고 다시 처리하도록 알린다.
+        """
+        list_spec = self._gps_list_spec(list_stats)
+        self._scan_gps_list_chunk(chunk_df, list_stats)
+        new_spec = self._gps_list_spec(list_stats)
+        if written and new_spec != list_spec:
+            return chunk_df, True
+        return self.expand_gps_list_columns(chunk_df, new_spec), False
+    
     def process_file_streaming_append(self, file_path: str, category: str, output_file: str):
-        """스트리밍 방식으로 파일 처리 - append 모드 (헤더 없이)"""
+        """스트리밍 방식으로 파일 처리 - append 모드 (헤더 없이)
+        
+        GPS 리스트 컬럼 폭이 중간에 늘어나면 이 파일이 추가한 부분을 잘라내고 처음부터 다시 처리한다.
+        """
         try:
             chunk_size = 10000  # 1만 행씩 처리
+            list_stats = self.load_gps_list_stats(file_path) if category == 'gps' else None
+            start_size = os.path.getsize(output_file) if os.path.exists(output_file) else 0
             
-            print(f"🔄 {file_path} append 처리 시작")
-            
-            for chunk_df in pd.read_csv(file_path, chunksize=chunk_size, low_memory=False):
-                if chunk_df.empty:
-                    continue
-                
-                # 데이터 정제
-                chunk_df = self.clean_data(chunk_df, category)
-                
-                # GPS 리스트 컬럼 동적 확장
-                if category == 'gps':
-                    chunk_df = self.expand_gps_list_columns(chunk_df)
-                
-                # 물리적 범위 검증
-                chunk_df = self.validate_physical_ranges(chunk_df, category)
-                
-                # 데이터 타입 변환
-                chunk_df = self.convert_data_types(chunk_df, category)
-                                
-                # 헤더 없이 append
-                chunk_df.to_csv(output_file, mode='a', header=False, index=False)
+            while True:
+                print(f"🔄 {file_path} append 처리 시작")
+                restart = False
+                written = False
                 
-                print(f"✅ {file_path} 청크 append 완료 ({len(chunk_df)}행)")
+                for chunk_df in pd.read_csv(file_path, chunksize=chunk_size, low_memory=False):
+                    if chunk_df.empty:
+                        continue
+                    
+                    # 데이터 정제
+                    chunk_df = self.clean_data(chunk_df, category)
+                    
+                    # GPS 리스트 컬럼 확장 (앞 청크까지의 누적 폭)
+                    if category == 'gps':
+                        chunk_df, restart = self._expand_gps_chunk(chunk_df, list_stats, written)
+                        if restart:
+                            break
+                    
+                    # 물리적 범위 검증
+                    chunk_df = self.validate_physical_ranges(chunk_df, category)
+                    
+                    # 데이터 타입 변환
+                    chunk_df = self.convert_data_types(chunk_df, category)
+                                    
+                    # 헤더 없이 append
+                    chunk_df.to_csv(output_file, mode='a', header=False, index=False)
+                    written = True
+                    
+                    print(f"✅ {file_path} 청크 append 완료 ({len(chunk_df)}행)")
+                    
+                    # 메모리에서 청크 해제
+                    del chunk_df
                 
-                # 메모리에서 청크 해제
-                del chunk_df
+                if not restart:
+                    break
+                self.save_gps_list_stats(file_path, list_stats)
+                with open(output_file, 'r+b') as f:
+                    f.truncate(start_size)
+                self.range_rejections = {}
+                print(f"🔄 {file_path} GPS 리스트 컬럼 폭이 늘어나 처음부터 다시 처리")
             
+            if category == 'gps':
+                self.save_gps_list_stats(file_path, list_stats)
+            self.print_range_rejections(file_path)
             print(f"✅ {file_path} append 처리 완료")
             
         except Exception as e:
             print(f"❌ {file_path} append 처리 중 오류: {e}")
     
-    def process_file_streaming(self, file_path: str, category: str, output_file: str):
-        """스트리밍 방식으로 파일 처리 - 메모리 효율적"""
+    def process_file_streaming(self, file_path: str, category: str, output_file: str,
+                               output_format: str = 'csv', part_name: str = None):
+        """스트리밍 방식으로 파일 처리 - 메모리 효율적
+        
+        output_format='parquet'이면 output_file을 파티션 루트 디렉토리로 보고
+        ParquetPartitionSink로 청크마다 row group을 추가한다 (파일 이름: part_name, 기본 <입력 파일명>.parquet).
+        GPS 리스트 컬럼 폭은 파일을 미리 읽지 않고 청크마다 누적해 정한다. 저장한 청크가 있는데 폭이
+        늘어나면 누적값을 저장하고 처음부터 다시 처리하며, 다음 실행은 저장된 최종 폭으로 시작한다.
+        """
+        sink = None
         try:
             chunk_size = 10000  # 1만 행씩 처리
-            is_first_chunk = True
+            list_stats = self.load_gps_list_stats(file_path) if category == 'gps' else None
             
-            print(f"🔄 {file_path} 스트리밍 처리 시작")
-            
-            for chunk_df in pd.read_csv(file_path, chunksize=chunk_size, low_memory=False):
-                if chunk_df.empty:
-                    continue
-                
-                # 데이터 정제
-                chunk_df = self.clean_data(chunk_df, category)
-                
-                # GPS 리스트 컬럼 동적 확장
-                if category == 'gps':
-                    chunk_df = self.expand_gps_list_columns(chunk_df)
+            while True:
+                is_first_chunk = True
+                restart = False
+                if output_format == 'parquet':
+                    sink = ParquetPartitionSink(output_file, part_name or f"{Path(file_path).stem}.parquet")
                 
-                # 물리적 범위 검증
-                chunk_df = self.validate_physical_ranges(chunk_df, category)
+                print(f"🔄 {file_path} 스트리밍 처리 시작")
                 
-                # 데이터 타입 변환
-                chunk_df = self.convert_data_types(chunk_df, category)
-                
-                # 첫 번째 청크는 헤더와 함께 저장, 이후는 헤더 없이 append
-                chunk_df.to_csv(output_file, mode='a' if not is_first_chunk else 'w', 
-                               header=is_first_chunk, index=False)
-                
-                is_first_chunk = False
-                print(f"✅ {file_path} 청크 처리 완료 ({len(chunk_df)}행)")
+                for chunk_df in pd.read_csv(file_path, chunksize=chunk_size, low_memory=False):
+                    if chunk_df.empty:
+                        continue
+                    
+                    # 데이터 정제
+                    chunk_df = self.clean_data(chunk_df, category)
+                    
+                    # GPS 리스트 컬럼 확장 (앞 청크까지의 누적 폭)
+                    if category == 'gps':
+                        chunk_df, restart = self._expand_gps_chunk(chunk_df, list_stats, not is_first_chunk)
+                        if restart:
+                            break
+                    
+                    # 물리적 범위 검증
+                    chunk_df = self.validate_physical_ranges(chunk_df, category)
+                    
+                    # 데이터 타입 변환
+                    chunk_df = self.convert_data_types(chunk_df, category)
+                    
+                    if sink is not None:
+                        # Parquet: 파티션별 row group 추가
+                        sink.write(self.add_partition_columns(chunk_df, file_path))
+                    else:
+                        # 이후 청크는 첫 청크(헤더) 컬럼 순서로 맞춤 (헤더에 없는 컬럼은 값을 버리지 않고 오류)
+                        if is_first_chunk:
+                            header_columns = list(chunk_df.columns)
+                        elif list(chunk_df.columns) != header_columns:
+                            extra_columns = [col for col in chunk_df.columns if col not in header_columns]
+                            if extra_columns:
+                                raise ValueError(f"헤더에 없는 컬럼: {extra_columns}")
+                            chunk_df = chunk_df.reindex(columns=header_columns)
+                        
+                        # 첫 번째 청크는 헤더와 함께 저장, 이후는 헤더 없이 append
+                        chunk_df.to_csv(output_file, mode='a' if not is_first_chunk else 'w', 
+                                       header=is_first_chunk, index=False)
+                    
+                    is_first_chunk = False
+                    print(f"✅ {file_path} 청크 처리 완료 ({len(chunk_df)}행)")
+                    
+                    # 메모리에서 청크 해제
+                    del chunk_df
                 
-                # 메모리에서 청크 해제
-                del chunk_df
+                if not restart:
+                    break
+                self.save_gps_list_stats(file_path, list_stats)
+                if sink is not None:
+                    sink.abort()
+                    sink = None
+                self.range_rejections = {}
+                print(f"🔄 {file_path} GPS 리스트 컬럼 폭이 늘어나 처음부터 다시 처리")
             
+            if sink is not None:
+                sink.close()
+            if category == 'gps':
+                self.save_gps_list_stats(file_path, list_stats)
+            self.print_range_rejections(file_path)
             print(f"✅ {file_path} 스트리밍 처리 완료")
+            return True
             
         except Exception as e:
+            if sink is not None:
+                sink.abort()
             print(f"❌ {file_path} 스트리밍 처리 중 오류: {e}")
+            return False
     
     def process_file(self, file_path: str, category: str) -> pd.DataFrame:
         """파일 처리 메인 함수"""
@@ -350,18 +956,19 @@ class BasePreprocessor:
             # 데이터 정제
             df = self.clean_data(df, category)
             
-            # GPS 리스트 컬럼 동적 확장 (정제 직후 적용)
+            # GPS 리스트 컬럼 확장 (정제 직후 적용, 읽어 둔 df 전체 기준 폭)
             if category == 'gps':
                 df = self.expand_gps_list_columns(df)
             
             # 물리적 범위 검증
             df = self.validate_physical_ranges(df, category)
+            self.print_range_rejections(file_path)
             
             # 데이터 타입 변환
             df = self.convert_data_types(df, category)
             
             # 타임스탬프 보정
-            for dt_col in ['time', 'msg_time', 'measured_month', 'start_time']:
+            for dt_col in TIMESTAMP_COLUMNS:
                 if dt_col in df.columns:
                     df[dt_col] = self._fix_year_vectorized(df[dt_col])
             
@@ -371,11 +978,23 @@ class BasePreprocessor:
             print(f"Error processing {file_path}: {e}")
             return pd.DataFrame()
     
-    def save_data(self, df: pd.DataFrame, category: str, output_dir: str):
-        """통합 데이터 저장"""
+    def save_data(self, df: pd.DataFrame, category: str, output_dir: str, output_format: str = 'csv'):
+        """통합 데이터 저장 (output_format='parquet'이면 <output_dir>/<category>/ 아래 파티션 Parquet)"""
         if df.empty:
             return
         
+        if output_format == 'parquet':
+            output_path = Path(output_dir) / category
+            sink = ParquetPartitionSink(output_path, f"{category}.parquet")
+            try:
+                sink.write(self.add_partition_columns(df))
+                sink.close()
+            except Exception:
+                sink.abort()
+                raise
+            print(f"✅ {category} 통합 데이터 저장 완료: {output_path} (Parquet {sink.rows}행)")
+            return
+        
         # 저장 경로 생성
         output_path = Path(output_dir) / f"{category}.csv"
         
@@ -383,11 +1002,18 @@ class BasePreprocessor:
         df.to_csv(output_path, mode='w', header=True, index=False)
         print(f"✅ {category} 통합 데이터 저장 완료: {output_path}")
 
-    def process_directory(self, root_dir: str, output_dir: str, use_ray: bool = True):
-        """splited_data 구조를 유지하면서 개별 파일 전처리"""
+    def process_directory(self, root_dir: str, output_dir: str, use_ray: bool = True, output_format: str = 'csv'):
+        """splited_data 구조를 유지하면서 개별 파일 전처리
+        
+        파일마다 완료 여부를 체크포인트 DB에 기록하므로, 다시 실행하면 이미 완료된 파일은 건너뛴다.
+        동시에 여러 번 실행하면 claim_file로 소유권을 얻은 실행만 파일을 처리하고 나머지는 건너뛴다.
+        output_format='parquet'이면 <output_dir>/<category>/car_type=/device_no=/month= 파티션에
+        입력 파일마다 Parquet 파일 하나(<상대 경로>.parquet)를 쓴다.
+        """
         root = Path(root_dir)
         output = Path(output_dir)
         output.mkdir(parents=True, exist_ok=True)
+        checkpoint_file = os.path.abspath(self.checkpoint_file)
 
         categories = ['bms', 'gps']
 
@@ -398,55 +1024,107 @@ class BasePreprocessor:
                     ray.init(ignore_reinit_error=True, logging_level=30)
 
                 @ray.remote
-                def _process_file_with_structure(file_path: str, category: str, root_dir: str, output_dir: str):
+                def _process_file_with_structure(file_path: str, category: str, root_dir: str, output_dir: str,
+                                                 checkpoint_file: str, output_format: str):
                     inst = BasePreprocessor()
-                    df = inst.process_file(file_path, category)
+                    inst.checkpoint_file = checkpoint_file
+                    file_key = inst.checkpoint_key(category, file_path, root_dir)
                     
-                    if df.empty:
-                        return {"status": "empty", "path": file_path}
-                    
-                    # 원본 구조 유지하면서 출력 경로 생성
-                    relative_path = Path(file_path).relative_to(Path(root_dir))
-                    output_path = Path(output_dir) / relative_path
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    df.to_csv(output_path, index=False)
-                    return {"status": "success", "path": str(relative_path)}
+                    # 다른 실행이 처리 중인 파일은 건너뜀 (소유권을 얻은 뒤 완료 여부 다시 확인)
+                    if not inst.claim_file(file_key):
+                        return {"status": "claimed", "path": file_path}
+                    try:
+                        if inst.is_completed(file_key, file_path):
+                            return {"status": "skipped", "path": file_path}
+                        df = inst.process_file(file_path, category)
+                        
+                        if df.empty:
+                            return {"status": "empty", "path": file_path}
+                        
+                        relative_path = Path(file_path).relative_to(Path(root_dir))
+                        if output_format == 'parquet':
+                            # 범주별 파티션 루트에 입력 파일 단위 Parquet 파일
+                            output_path = Path(output_dir) / category
+                            sink = ParquetPartitionSink(output_path, _part_name(relative_path))
+                            try:
+                                sink.write(inst.add_partition_columns(df, file_path))
+                                sink.close()
+                            except Exception:
+                                sink.abort()
+                                raise
+                        else:
+                            # 원본 구조 유지하면서 출력 경로 생성
+                            output_path = Path(output_dir) / relative_path
+                            output_path.parent.mkdir(parents=True, exist_ok=True)
+                            df.to_csv(output_path, index=False)
+                        inst.mark_completed(file_key, file_path, str(output_path))
+                        return {"status": "success", "path": str(relative_path)}
+                    finally:
+                        inst.release_claim(file_key)
 
                 for category in categories:
                     file_paths = [str(p) for p in root.rglob(f"**/{category}/**/*.csv")]
+                    file_paths = [
+                        p for p in file_paths
+                        if not self.is_completed(self.checkpoint_key(category, p, root), p)
+                    ]
                     if not file_paths:
                         continue
                     
                     print(f"🔄 {category} 파일 {len(file_paths)}개 처리 시작...")
                     
                     # Ray 병렬 처리
-                    futures = [_process_file_with_structure.remote(p, category, str(root), str(output)) for p in file_paths]
+                    futures = [
+                        _process_file_with_structure.remote(p, category, str(root), str(output), checkpoint_file, output_format)
+                        for p in file_paths
+                    ]
                     results = ray.get(futures)
                     
                     success_count = sum(1 for r in results if r["status"] == "success")
                     empty_count = sum(1 for r in results if r["status"] == "empty")
+                    claimed_count = sum(1 for r in results if r["status"] in ("claimed", "skipped"))
                     
-                    print(f"✅ {category} 완료: 성공 {success_count}개, 빈파일 {empty_count}개")
+                    print(f"✅ {category} 완료: 성공 {success_count}개, 빈파일 {empty_count}개, "
+                          f"다른 실행에서 처리 {claimed_count}개")
                     
             else:
                 for category in categories:
                     # file_paths = list(root.rglob(f"**/{category}/**/*.csv"))
                     file_paths = list(root.rglob("*.csv"))
+                    if output_format == 'parquet':
+                        # 범주별 파티션 루트에 쓰므로 다른 범주 파일이 중복 기록되지 않게 Ray 경로와 같은 기준으로 선택
+                        file_paths = list(root.rglob(f"**/{category}/**/*.csv"))
                     if not file_paths:
                         continue
                     
                     for file_path in file_paths:
                         # 원본 구조 유지하면서 출력 경로 생성
                         relative_path = file_path.relative_to(root)
-                        output_path = output / relative_path
-                        
-                        # 출력 디렉토리 생성
-                        output_path.parent.mkdir(parents=True, exist_ok=True)
+                        output_path = output / category if output_format == 'parquet' else output / relative_path
+                        file_key = self.checkpoint_key(category, file_path, root)
+                        if self.is_completed(file_key, str(file_path)):
+                            print(f"⏭️ {relative_path} 이미 완료됨, 건너뛰기")
+                            continue
                         
-                        # 스트리밍 방식으로 전처리 후 저장
-                        self.process_file_streaming(str(file_path), category, str(output_path))
-                        print(f"✅ {relative_path} 전처리 완료")
+                        # 다른 실행이 처리 중인 파일은 건너뜀 (소유권을 얻은 뒤 완료 여부 다시 확인)
+                        if not self.claim_file(file_key):
+                            print(f"⏭️ {relative_path} 다른 실행에서 처리 중, 건너뛰기")
+                            continue
+                        try:
+                            if self.is_completed(file_key, str(file_path)):
+                                print(f"⏭️ {relative_path} 이미 완료됨, 건너뛰기")
+                                continue
+                            
+                            # 출력 디렉토리 생성
+                            output_path.parent.mkdir(parents=True, exist_ok=True)
+                            
+                            # 스트리밍 방식으로 전처리 후 저장
+                            if self.process_file_streaming(str(file_path), category, str(output_path),
+                                                           output_format, _part_name(relative_path)):
+                                self.mark_completed(file_key, str(file_path), str(output_path))
+                                print(f"✅ {relative_path} 전처리 완료")
+                        finally:
+                            self.release_claim(file_key)
                         
         except Exception as e:
             print(f"❌ 디렉터리 처리 오류: {e}")
@@ -458,5 +1136,6 @@ if __name__ == "__main__":
     bp.process_directory(
         "splited_data",  # 입력 폴더
         "final_data",    # 출력 폴더
-        use_ray=False  # Ray 병렬처리 사용 여부
+        use_ray=False,  # Ray 병렬처리 사용 여부
+        output_format="csv"  # 'parquet': car_type/device_no/month 파티션 Parquet
     )
\ No newline at end of file
@@ -12,6 +12,71 @@ from pathlib import Path
 from datetime import datetime
 from multiprocessing import Pool, cpu_count
 
+def new_column_info(dtype):
+    """컬럼별 누적 통계 초기값"""
+    return {
+        'dtype': str(dtype),
+        'total_count': 0,
+        'non_null_count': 0,
+        'null_count': 0,
+        'unique_values': set(),
+        'min_val': None,
+        'max_val': None,
+        'zero_count': 0,
+        'negative_count': 0
+    }
+
+def update_column_stats(columns_info, chunk):
+    """청크 1개의 컬럼별 통계를 누적합니다."""
+    # 각 컬럼별 통계 누적 (기존 컬럼 + 새로 추가된 컬럼)
+    for col in chunk.columns:
+        if col in columns_info:
+            col_data = chunk[col]
+            col_info = columns_info[col]
+            
+            # 기본 통계
+            col_info['total_count'] += len(col_data)
+            col_info['non_null_count'] += col_data.count()
+            col_info['null_count'] += col_data.isnull().sum()
+            
+            # 고유값 수집 (메모리 절약을 위해 set 사용)
+            if col_data.dtype == 'object':
+                col_info['unique_values'].update(col_data.dropna().astype(str))
+            else:
+                col_info['unique_values'].update(col_data.dropna())
+            
+            # 숫자형 데이터 통계
+            if pd.api.types.is_numeric_dtype(col_data):
+                non_null_data = col_data.dropna()
+                if len(non_null_data) > 0:
+                    if col_info['min_val'] is None:
+                        col_info['min_val'] = non_null_data.min()
+                        col_info['max_val'] = non_null_data.max()
+                    else:
+                        col_info['min_val'] = min(col_info['min_val'], non_null_data.min())
+                        col_info['max_val'] = max(col_info['max_val'], non_null_data.max())
+                    
+                    col_info['zero_count'] += (non_null_data == 0).sum()
+                    col_info['negative_count'] += (non_null_data < 0).sum()
+
+def finalize_column_stats(columns_info):
+    """누적 통계를 최종 컬럼별 통계로 정리합니다."""
+    final_stats = {}
+    for col, col_info in columns_info.items():
+        final_stats[col] = {
+            'dtype': col_info['dtype'],
+            'total_count': col_info['total_count'],
+            'non_null_count': col_info['non_null_count'],
+            'null_count': col_info['null_count'],
+            'null_percentage': (col_info['null_count'] / col_info['total_count']) * 100 if col_info['total_count'] > 0 else 0,
+            'unique_count': len(col_info['unique_values']),
+            'min_val': col_info['min_val'],
+            'max_val': col_info['max_val'],
+            'zero_count': col_info['zero_count'],
+            'negative_count': col_info['negative_count']
+        }
+    return final_stats
+
 def analyze_csv_file(file_path, show_columns=True):
     """CSV 파일의 전체 데이터를 로드해서 기본 특성을 분석합니다."""
     print(f"\n{'='*60}")
@@ -43,53 +108,13 @@ def analyze_csv_file(file_path, show_columns=True):
             print(f"(컬럼 목록은 첫 번째 파일과 동일)")
         
         for col in columns:
-            columns_info[col] = {
-                'dtype': str(first_chunk[col].dtype),
-                'total_count': 0,
-                'non_null_count': 0,
-                'null_count': 0,
-                'unique_values': set(),
-                'min_val': None,
-                'max_val': None,
-                'zero_count': 0,
-                'negative_count': 0
-            }
+            columns_info[col] = new_column_info(first_chunk[col].dtype)
         
         # 청크별로 전체 데이터 처리
         chunk_iter = pd.read_csv(file_path, chunksize=chunk_size)
         for chunk_num, chunk in enumerate(chunk_iter):
             total_rows += len(chunk)
-                        
-            # 각 컬럼별 통계 누적 (기존 컬럼 + 새로 추가된 컬럼)
-            for col in chunk.columns:
-                if col in columns_info:
-                    col_data = chunk[col]
-                    col_info = columns_info[col]
-                    
-                    # 기본 통계
-                    col_info['total_count'] += len(col_data)
-                    col_info['non_null_count'] += col_data.count()
-                    col_info['null_count'] += col_data.isnull().sum()
-                    
-                    # 고유값 수집 (메모리 절약을 위해 set 사용)
-                    if col_data.dtype == 'object':
-                        col_info['unique_values'].update(col_data.dropna().astype(str))
-                    else:
-                        col_info['unique_values'].update(col_data.dropna())
-                    
-                    # 숫자형 데이터 통계
-                    if pd.api.types.is_numeric_dtype(col_data):
-                        non_null_data = col_data.dropna()
-                        if len(non_null_data) > 0:
-                            if col_info['min_val'] is None:
-                                col_info['min_val'] = non_null_data.min()
-                                col_info['max_val'] = non_null_data.max()
-                            else:
-                                col_info['min_val'] = min(col_info['min_val'], non_null_data.min())
-                                col_info['max_val'] = max(col_info['max_val'], non_null_data.max())
-                            
-                            col_info['zero_count'] += (non_null_data == 0).sum()
-                            col_info['negative_count'] += (non_null_data < 0).sum()
+            update_column_stats(columns_info, chunk)
             
             # 진행 상황 출력
             if (chunk_num + 1) % 10 == 0:
@@ -98,20 +123,7 @@ def analyze_csv_file(file_path, show_columns=True):
         print(f"전체 데이터 행 수: {total_rows:,}")
         
         # 최종 통계 정리
-        final_stats = {}
-        for col, col_info in columns_info.items():
-            final_stats[col] = {
-                'dtype': col_info['dtype'],
-                'total_count': col_info['total_count'],
-                'non_null_count': col_info['non_null_count'],
-                'null_count': col_info['null_count'],
-                'null_percentage': (col_info['null_count'] / col_info['total_count']) * 100 if col_info['total_count'] > 0 else 0,
-                'unique_count': len(col_info['unique_values']),
-                'min_val': col_info['min_val'],
-                'max_val': col_info['max_val'],
-                'zero_count': col_info['zero_count'],
-                'negative_count': col_info['negative_count']
-            }
+        final_stats = finalize_column_stats(columns_info)
         
         return final_stats, total_rows, columns
         
@@ -120,6 +132,66 @@ def analyze_csv_file(file_path, show_columns=True):
         print(f"파일 경로: {file_path}")
         return None, 0, []
 
+def analyze_parquet_file(file_path, show_columns=True):
+    """Parquet 파일(파티션 조각)을 row group 단위로 읽어 기본 특성을 분석합니다."""
+    import pyarrow.parquet as pq
+    
+    print(f"\n{'='*60}")
+    print(f"파일 분석: {os.path.basename(file_path)}")
+    print(f"{'='*60}")
+    
+    try:
+        # 파일 크기 확인
+        file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
+        print(f"파일 크기: {file_size:.2f} MB")
+        
+        # 컬럼 정보는 스키마에서 확인 (데이터 파싱 없음)
+        parquet_file = pq.ParquetFile(file_path)
+        schema = parquet_file.schema_arrow
+        columns = schema.names
+        print(f"총 컬럼 수: {len(columns)}, row group 수: {parquet_file.num_row_groups}")
+        
+        if show_columns:
+            print(f"\n컬럼 목록:")
+            for i, col in enumerate(columns):
+                print(f"{i+1:3d}. {col}")
+        else:
+            print(f"(컬럼 목록은 첫 번째 파일과 동일)")
+        
+        empty_df = schema.empty_table().to_pandas()
+        columns_info = {col: new_column_info(empty_df[col].dtype) for col in columns}
+        
+        total_rows = 0
+        for chunk_num, batch in enumerate(parquet_file.iter_batches(batch_size=10000)):
+            chunk = batch.to_pandas()
+            total_rows += len(chunk)
+            update_column_stats(columns_info, chunk)
+            
+            # 진행 상황 출력
+            if (chunk_num + 1) % 10 == 0:
+                print(f"처리된 청크: {chunk_num + 1}, 누적 행 수: {total_rows:,}")
+        
+        print(f"전체 데이터 행 수: {total_rows:,}")
+        
+        return finalize_column_stats(columns_info), total_rows, columns
+        
+    except Exception as e:
+        print(f"파일 읽기 오류: {e}")
+        print(f"파일 경로: {file_path}")
+        return None, 0, []
+
+def analyze_file(file_path, show_columns=True):
+    """확장자에 따라 CSV / Parquet 분석"""
+    if Path(file_path).suffix == '.parquet':
+        return analyze_parquet_file(file_path, show_columns)
+    return analyze_csv_file(file_path, show_columns)
+
+def get_file_key(file_path, base_path=None):
+    """결과 키 (CSV: 파일명, Parquet: 파티션마다 같은 파일명이 있으므로 base_path 기준 상대 경로)"""
+    if Path(file_path).suffix == '.parquet' and base_path is not None:
+        return str(Path(file_path).relative_to(base_path))
+    return Path(file_path).name
+
 def analyze_column_stats(df, column_name):
     """특정 컬럼의 기본 통계 정보를 분석합니다."""
     if column_name not in df.columns:
@@ -341,8 +413,9 @@ def main():
         return
     
     # 실제 존재하는 파일들 찾기
-    bms_files = list(base_path.glob("bms/**/*.csv"))
-    gps_files = list(base_path.glob("gps/**/*.csv"))
+    # (전처리 Parquet 출력: bms|gps/car_type=/device_no=/month=/*.parquet)
+    bms_files = list(base_path.glob("bms/**/*.csv")) + list(base_path.glob("bms/**/*.parquet"))
+    gps_files = list(base_path.glob("gps/**/*.csv")) + list(base_path.glob("gps/**/*.parquet"))
     
     print("데이터 컬럼 분석 시작")
     print("="*60)
@@ -365,9 +438,9 @@ def main():
             file_size = file_path.stat().st_size / (1024 * 1024)  # MB
             # 첫 번째 파일에서만 컬럼 목록 상세 출력
             show_columns = (i == 0)
-            stats, total_rows, columns = analyze_csv_file(file_path, show_columns)
+            stats, total_rows, columns = analyze_file(file_path, show_columns)
             if stats is not None:
-                file_name = file_path.name
+                file_name = get_file_key(file_path, base_path)
                 
                 file_result = {
                     'file_size': file_size,
@@ -385,9 +458,9 @@ def main():
             file_size = file_path.stat().st_size / (1024 * 1024)  # MB
             # 첫 번째 파일에서만 컬럼 목록 상세 출력
             show_columns = (i == 0)
-            stats, total_rows, columns = analyze_csv_file(file_path, show_columns)
+            stats, total_rows, columns = analyze_file(file_path, show_columns)
             if stats is not None:
-                file_name = file_path.name
+                file_name = get_file_key(file_path, base_path)
                 
                 file_result = {
                     'file_size': file_size,
@@ -400,12 +473,12 @@ def main():
     
     # 2차 분석: 차종별로 1차 결과들을 집계
     print(f"\n🔍 2차 분석: 차종별 통계 집계")
-    grouped_data = analyze_by_cartype_and_type(all_results['files'], bms_files + gps_files)
+    grouped_data = analyze_by_cartype_and_type(all_results['files'], bms_files + gps_files, base_path)
     
     # 결과 저장
     save_analysis_results(all_results)
 
-def analyze_by_cartype_and_type(files_data, file_paths):
+def analyze_by_cartype_and_type(files_data, file_paths, base_path=None):
     """2차 분석: 차종별로 1차 결과들을 집계합니다."""
     print(f"\n{'='*60}")
     print("2차 분석: 차종별 통계 집계")
@@ -417,7 +490,7 @@ def analyze_by_cartype_and_type(files_data, file_paths):
     # 파일 경로와 데이터 매핑
     file_path_map = {}
     for file_path in file_paths:
-        file_path_map[file_path.name] = file_path
+        file_path_map[get_file_key(file_path, base_path)] = file_path
     
     for file_name, file_data in files_data.items():
         # 파일명에서 차종과 타입 추출
@@ -428,7 +501,7 @@ def analyze_by_cartype_and_type(files_data, file_paths):
         else:
             continue
             
-        # 경로에서 차종 추출 (예: .../BONGO3/bms_xxx.csv)
+        # 경로에서 차종 추출 (예: .../BONGO3/bms_xxx.csv, .../car_type=BONGO3/...)
         file_path = file_path_map.get(file_name)
         cartype = 'UNKNOWN'
         if file_path: